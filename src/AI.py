@@ -3,16 +3,21 @@ import numpy as np
 from xgboost import XGBClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score
-import matplotlib.pyplot as plt
-import seaborn as sns
 from tqdm import tqdm
 import argparse
+import glob
 import os
-import tkinter as tk
-from tkinter import filedialog
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import instrumentation
+
+# matplotlib, tkinter and scipy are imported inside the functions that use them, so
+# batch runs on headless hosts never load a GUI toolkit
 
 def analyze_feature_significance(df, target_col='Win', test_size=0.2, n_permutations=100, 
-                                 random_state=42, xgb_params=None):
+                                 random_state=42, xgb_params=None, mode='legacy', n_jobs=None,
+                                 batch_size=100, alpha=0.05, confidence=0.99):
     """
     Analyze the statistical significance of features in predicting a binary outcome.
     
@@ -30,11 +35,29 @@ def analyze_feature_significance(df, target_col='Win', test_size=0.2, n_permutat
         Random seed for reproducibility
     xgb_params : dict, default=None
         Additional parameters for XGBClassifier
+    mode : str, default='legacy'
+        'legacy' shuffles a copy of the test frame and calls predict once per
+        permutation and feature. 'fast' shuffles a reusable NumPy buffer holding up
+        to batch_size stacked copies of the test set, predicts each batch in one
+        call, and spreads features across n_jobs processes, each feature with its
+        own Generator seeded from random_state
+    n_jobs : int, default=None
+        Worker processes for mode='fast' (default: CPU count)
+    batch_size : int, default=100
+        Permuted copies of the test set per predict call in mode='fast'; in
+        mode='adaptive', also how often the stopping rule is checked
+    alpha : float, default=0.05
+        Significance threshold
+    confidence : float, default=0.99
+        In mode='adaptive' (the fast path with early stopping), a feature stops
+        permuting once this Clopper-Pearson interval for its p-value lies entirely
+        above or below alpha; n_permutations becomes the per-feature cap
         
     Returns:
     --------
     pandas.DataFrame
-        DataFrame containing feature names, importance scores, p-values, and significance flags
+        DataFrame containing feature names, importance scores, p-values, and significance flags.
+        In mode='adaptive' an N_Permutations column gives the permutations each feature used.
     """
     # Check if target column exists
     if target_col not in df.columns:
@@ -85,29 +108,40 @@ def analyze_feature_significance(df, target_col='Win', test_size=0.2, n_permutat
     # Permutation test for statistical significance
     print(f"Running {n_permutations} permutations to determine statistical significance...")
     p_values = {}
-    permutation_importances = {feature: [] for feature in X.columns}
-    
-    for _ in tqdm(range(n_permutations), desc="Calculating permutation importance"):
-        for feature in X.columns:
-            # Create a copy of test data
-            X_test_permuted = X_test.copy()
-            
-            # Permute single feature
-            X_test_permuted[feature] = np.random.permutation(X_test_permuted[feature].values)
-            
-            # Predict with permuted feature
-            y_pred_permuted = model.predict(X_test_permuted)
-            permuted_accuracy = accuracy_score(y_test, y_pred_permuted)
-            
-            # Store importance drop
-            importance_drop = baseline_accuracy - permuted_accuracy
-            permutation_importances[feature].append(importance_drop)
+    if mode in ('fast', 'adaptive'):
+        if mode == 'adaptive':
+            batch_size = min(batch_size, 25)
+        permutation_importances = fast_permutation_importances(
+            model, X_test, y_test, baseline_accuracy, n_permutations, random_state, n_jobs, batch_size,
+            importances=importance_dict if mode == 'adaptive' else None, alpha=alpha, confidence=confidence
+        )
+    elif mode == 'legacy':
+        permutation_importances = {feature: [] for feature in X.columns}
+        
+        for _ in tqdm(range(n_permutations), desc="Calculating permutation importance"):
+            for feature in X.columns:
+                # Create a copy of test data
+                X_test_permuted = X_test.copy()
+                
+                # Permute single feature
+                X_test_permuted[feature] = np.random.permutation(X_test_permuted[feature].values)
+                
+                # Predict with permuted feature
+                y_pred_permuted = model.predict(X_test_permuted)
+                permuted_accuracy = accuracy_score(y_test, y_pred_permuted)
+                
+                # Store importance drop
+                importance_drop = baseline_accuracy - permuted_accuracy
+                permutation_importances[feature].append(importance_drop)
+    else:
+        raise ValueError(f"Unknown mode '{mode}', expected 'legacy', 'fast' or 'adaptive'")
     
     # Calculate p-values based on permutation test
     for feature in X.columns:
         # Count how many times permutation importance was >= actual importance
         count_greater_equal = sum(1 for x in permutation_importances[feature] if x >= importance_dict[feature])
-        p_values[feature] = (count_greater_equal + 1) / (n_permutations + 1)  # Add 1 for Laplace smoothing
+        n_used = len(permutation_importances[feature])
+        p_values[feature] = (count_greater_equal + 1) / (n_used + 1)  # Add 1 for Laplace smoothing
     
     # Create results DataFrame
     results = pd.DataFrame({
@@ -117,13 +151,140 @@ def analyze_feature_significance(df, target_col='Win', test_size=0.2, n_permutat
     })
     
     # Add significance flag
-    results['Significant'] = results['p_value'] < 0.05
+    results['Significant'] = results['p_value'] < alpha
+    if mode == 'adaptive':
+        results['N_Permutations'] = [len(permutation_importances[feature]) for feature in importance_dict.keys()]
     
     # Sort by importance
     results = results.sort_values('XGBoost_Importance', ascending=False).reset_index(drop=True)
     
     return results
 
+# Per-worker state for fast permutation importance, set once by the pool initializer
+_permutation_state = {}
+
+def _init_permutation_worker(model, X_values, y_values, batch_size, single_thread):
+    """Hold the model, test data and a stacked copy buffer for this worker"""
+    if single_thread:
+        # Processes already provide the parallelism; avoid oversubscribing cores
+        model.set_params(n_jobs=1)
+    _permutation_state.update(
+        model=model,
+        X=X_values,
+        y=y_values,
+        copies=batch_size,
+        buffer=np.tile(X_values, (batch_size, 1)),
+    )
+
+def p_value_decided(count, n, alpha=0.05, confidence=0.99):
+    """
+    Sequential Monte Carlo stopping rule for a permutation p-value.
+    
+    Returns True once the Clopper-Pearson interval for the exceedance probability,
+    given count exceedances in n permutations, lies entirely above or below alpha.
+    """
+    from scipy.stats import beta
+    
+    if n == 0:
+        return False
+    tail = (1 - confidence) / 2
+    lower = beta.ppf(tail, count, n - count + 1) if count > 0 else 0.0
+    upper = beta.ppf(1 - tail, count + 1, n - count) if count < n else 1.0
+    return upper < alpha or lower > alpha
+
+def _feature_permutation_drops(feature_idx, seed_sequence, n_permutations, baseline_accuracy,
+                               importance=None, alpha=0.05, confidence=0.99):
+    """
+    Accuracy drops from n_permutations shuffles of one feature.
+    
+    The feature's column is overwritten in place in the stacked buffer, one batch of
+    permuted copies per predict call, and restored before returning so the buffer
+    can be reused for the next feature. When importance is given, stops early as
+    soon as p_value_decided says the p-value is clearly on one side of alpha.
+    """
+    state = _permutation_state
+    X_values, y_values, buffer = state['X'], state['y'], state['buffer']
+    n_rows = len(X_values)
+    column = X_values[:, feature_idx]
+    rng = np.random.default_rng(seed_sequence)
+    
+    drops = []
+    done = 0
+    while done < n_permutations:
+        copies = min(state['copies'], n_permutations - done)
+        rows = copies * n_rows
+        buffer[:rows, feature_idx] = rng.permuted(np.tile(column, (copies, 1)), axis=1).ravel()
+        y_pred = state['model'].predict(buffer[:rows]).reshape(copies, n_rows)
+        permuted_accuracy = (y_pred == y_values).mean(axis=1)
+        drops.extend((baseline_accuracy - permuted_accuracy).tolist())
+        done += copies
+        if importance is not None:
+            count = sum(1 for x in drops if x >= importance)
+            if p_value_decided(count, done, alpha, confidence):
+                break
+    
+    buffer[:, feature_idx] = np.tile(column, state['copies'])
+    return drops
+
+def fast_permutation_importances(model, X_test, y_test, baseline_accuracy, n_permutations=100,
+                                 random_state=42, n_jobs=None, batch_size=100, importances=None,
+                                 alpha=0.05, confidence=0.99):
+    """
+    Permutation accuracy drops for every feature, batched and spread across processes.
+    
+    Each feature draws from its own Generator spawned from random_state, so results
+    do not depend on n_jobs. Passing importances (feature -> observed importance)
+    enables early stopping per feature.
+    
+    Returns:
+    --------
+    dict
+        Feature name -> list of accuracy drops (n_permutations of them unless a
+        feature stopped early)
+    """
+    features = list(X_test.columns)
+    X_values = X_test.to_numpy()
+    y_values = np.asarray(y_test)
+    batch_size = max(1, min(batch_size, n_permutations))
+    seed_sequences = np.random.SeedSequence(random_state).spawn(len(features))
+    n_jobs = max(1, min(n_jobs or os.cpu_count() or 1, len(features)))
+    
+    feature_importances = [importances[feature] if importances else None for feature in features]
+    args = (range(len(features)), seed_sequences, [n_permutations] * len(features),
+            [baseline_accuracy] * len(features), feature_importances, [alpha] * len(features),
+            [confidence] * len(features))
+    if n_jobs == 1:
+        _init_permutation_worker(model, X_values, y_values, batch_size, single_thread=False)
+        drops = list(map(_feature_permutation_drops, *args))
+    else:
+        with ProcessPoolExecutor(n_jobs, initializer=_init_permutation_worker,
+                                 initargs=(model, X_values, y_values, batch_size, True)) as pool:
+            drops = list(pool.map(_feature_permutation_drops, *args))
+    return dict(zip(features, drops))
+
+def compare_permutation_modes(df, target_col='Win', n_permutations=100, random_state=42, n_jobs=None):
+    """
+    Time analyze_feature_significance in legacy, fast and adaptive mode on the same data.
+    
+    Returns:
+    --------
+    pandas.DataFrame
+        One row per mode with wall time and the number of significant features
+    """
+    timings = []
+    for mode in ['legacy', 'fast', 'adaptive']:
+        start = time.perf_counter()
+        results = analyze_feature_significance(df, target_col=target_col, n_permutations=n_permutations,
+                                               random_state=random_state, mode=mode, n_jobs=n_jobs)
+        timings.append({
+            'mode': mode,
+            'seconds': time.perf_counter() - start,
+            'significant_features': int(results['Significant'].sum()),
+        })
+    timings = pd.DataFrame(timings)
+    timings['speedup'] = timings['seconds'].iloc[0] / timings['seconds']
+    return timings
+
 def plot_feature_significance(results, figsize=(12, 8), save_path=None):
     """
     Plot feature importance and significance.
@@ -137,6 +298,8 @@ def plot_feature_significance(results, figsize=(12, 8), save_path=None):
     save_path : str, default=None
         Path to save the figure. If None, the figure is displayed
     """
+    import matplotlib.pyplot as plt
+    
     # Create figure with two subplots
     fig, (ax1, ax2) = plt.subplots(2, 1, figsize=figsize)
     
@@ -167,8 +330,111 @@ def plot_feature_significance(results, figsize=(12, 8), save_path=None):
     
     return fig
 
+def _init_plot_worker():
+    """Use a non-interactive backend in the background plotting process"""
+    os.environ['MPLBACKEND'] = 'Agg'
+
+def _render_plot(results, save_path):
+    """Render and save one dataset's plot, then free the figure"""
+    import matplotlib.pyplot as plt
+    
+    fig = plot_feature_significance(results, save_path=save_path)
+    plt.close(fig)
+    return save_path
+
+def _analyze_dataset(file_path, output_dir, target_col, test_size, n_permutations, random_state, mode):
+    """Run analyze_feature_significance on one CSV file and save its results"""
+    start = time.perf_counter()
+    df = pd.read_csv(file_path)
+    results = analyze_feature_significance(
+        df,
+        target_col=target_col,
+        test_size=test_size,
+        n_permutations=n_permutations,
+        random_state=random_state,
+        mode=mode,
+        n_jobs=1  # Datasets already run in parallel
+    )
+    base_name = os.path.splitext(os.path.basename(file_path))[0]
+    csv_output = os.path.join(output_dir or os.path.dirname(file_path), f"{base_name}_feature_significance.csv")
+    results.to_csv(csv_output, index=False)
+    return {
+        'dataset': file_path,
+        'rows': len(df),
+        'features': len(results),
+        'significant': int(results['Significant'].sum()),
+        'seconds': time.perf_counter() - start,
+        'csv_output': csv_output,
+        'results': results,
+    }
+
+def batch_mode(pattern, output_dir=None, target_col='Win', test_size=0.2, n_permutations=100,
+               random_state=42, mode='fast', n_workers=None, plots=True):
+    """
+    Analyze every CSV matched by a directory or glob pattern in a process pool.
+    
+    Plots are rendered with the Agg backend in a separate background process as
+    each dataset finishes, so no GUI toolkit is needed.
+    
+    Returns:
+    --------
+    pandas.DataFrame
+        One row per dataset with rows, features, significant count and wall time
+    """
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, '*.csv')
+    # Results are written next to their datasets by default, so never analyze an earlier run's tables
+    files = sorted(path for path in glob.glob(pattern) if not path.endswith('_feature_significance.csv'))
+    if not files:
+        raise ValueError(f"No CSV files match '{pattern}'")
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    
+    n_workers = max(1, min(n_workers or os.cpu_count() or 1, len(files)))
+    summary = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(n_workers) as pool, \
+            ProcessPoolExecutor(1, initializer=_init_plot_worker) as plot_pool:
+        futures = {
+            pool.submit(_analyze_dataset, file_path, output_dir, target_col, test_size, n_permutations,
+                        random_state, mode): file_path
+            for file_path in files
+        }
+        plot_futures = []
+        for future in as_completed(futures):
+            try:
+                outcome = future.result()
+            except Exception as e:
+                print(f"Error analyzing {futures[future]}: {e}")
+                summary.append({'dataset': futures[future], 'error': str(e)})
+                continue
+            print(f"Finished {outcome['dataset']} in {outcome['seconds']:.2f}s")
+            instrumentation.rows_read(outcome['rows'], outcome['dataset'])
+            instrumentation.rows_written(outcome['features'], outcome['csv_output'])
+            if plots:
+                plot_path = os.path.splitext(outcome['csv_output'])[0] + '.png'
+                plot_futures.append(plot_pool.submit(_render_plot, outcome.pop('results'), plot_path))
+            else:
+                outcome.pop('results')
+            summary.append(outcome)
+        for plot_future in plot_futures:
+            plot_future.result()
+    total_seconds = time.perf_counter() - start
+    
+    summary = pd.DataFrame(summary)
+    print("\nBatch summary:")
+    print(summary.drop(columns=['csv_output'], errors='ignore').to_string(index=False))
+    completed = summary['seconds'].notna().sum() if 'seconds' in summary else 0
+    total_rows = summary['rows'].sum() if 'rows' in summary else 0
+    print(f"\n{completed} dataset(s) in {total_seconds:.2f}s on {n_workers} worker(s): "
+          f"{completed / total_seconds * 60:.1f} datasets/minute, {total_rows / total_seconds:,.0f} rows/second")
+    return summary
+
 def select_file():
     """Open a file dialog to select a CSV file"""
+    import tkinter as tk
+    from tkinter import filedialog
+    
     root = tk.Tk()
     root.withdraw()  # Hide the main window
     file_path = filedialog.askopenfilename(
@@ -255,8 +521,26 @@ def command_line_mode():
     parser.add_argument('--plot', type=str, help='Output plot file (default: based on input filename)')
     parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
     parser.add_argument('--interactive', action='store_true', help='Run in interactive mode')
+    parser.add_argument('--mode', type=str, choices=['legacy', 'fast', 'adaptive'], default='legacy',
+                        help='Permutation test implementation; adaptive stops each feature once its '
+                             'p-value is clearly above or below 0.05, with --permutations as the cap '
+                             '(default: legacy)')
+    parser.add_argument('--jobs', type=int, help='Worker processes for --mode fast/adaptive (default: CPU count)')
+    parser.add_argument('--compare-modes', action='store_true',
+                        help='Time the legacy, fast and adaptive permutation tests on this file and exit')
+    parser.add_argument('--batch', type=str, metavar='PATTERN',
+                        help='Analyze every CSV in a directory or matching a glob pattern, headless and in parallel '
+                             '(earlier *_feature_significance.csv results are skipped)')
+    parser.add_argument('--output-dir', type=str, help='Output directory for --batch (default: next to each file)')
+    parser.add_argument('--workers', type=int, help='Worker processes for --batch (default: CPU count)')
+    parser.add_argument('--no-plots', action='store_true', help='Skip plots in --batch mode')
     args = parser.parse_args()
     
+    if args.batch:
+        batch_mode(args.batch, args.output_dir, args.target, args.test_size, args.permutations, args.seed,
+                   args.mode, args.workers, not args.no_plots)
+        return
+    
     # If interactive flag is set or no CSV file is provided, run in interactive mode
     if args.interactive or not args.csv_file:
         interactive_mode()
@@ -280,6 +564,7 @@ def command_line_mode():
     # Load and analyze data
     print(f"Loading data from {args.csv_file}...")
     df = pd.read_csv(args.csv_file)
+    instrumentation.rows_read(len(df), args.csv_file)
     
     print(f"Data shape: {df.shape}")
     print(f"Columns: {', '.join(df.columns)}")
@@ -289,6 +574,12 @@ def command_line_mode():
     if missing_count > 0:
         print(f"Warning: Dataset contains {missing_count} missing values. Consider preprocessing.")
     
+    if args.compare_modes:
+        timings = compare_permutation_modes(df, args.target, args.permutations, args.seed, args.jobs)
+        print("\nPermutation test timings:")
+        print(timings.to_string(index=False))
+        return
+    
     # Analyze feature significance
     try:
         results = analyze_feature_significance(
@@ -296,7 +587,9 @@ def command_line_mode():
             target_col=args.target, 
             test_size=args.test_size, 
             n_permutations=args.permutations,
-            random_state=args.seed
+            random_state=args.seed,
+            mode=args.mode,
+            n_jobs=args.jobs
         )
     except Exception as e:
         print(f"Error during analysis: {e}")
@@ -308,6 +601,7 @@ def command_line_mode():
     
     # Save results
     results.to_csv(args.output, index=False)
+    instrumentation.rows_written(len(results), args.output)
     print(f"Results saved to {args.output}")
     
     # Plot and save results
@@ -0,0 +1,21 @@
+import pandas as pd
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from columnStore import read_table, write_table
+
+df = read_table('./data/merged_team_games.npz', ['team', 'opponent_team', 'team_score', 'opponent_team_score',
+                                                  'Possessions', 'numwins', 'games_played', 'eFG%', 'PEM', 'REBF',
+                                                  'Point_Differential'])
+
+df['ORtg'] = (df['team_score'] / df['Possessions']) * 100
+df['DRtg'] = (df['opponent_team_score'] / df['Possessions']) * 100
+df['NRtg'] = df['ORtg'] - df['DRtg']
+
+df['WinPct'] = df['numwins'] / df['games_played']
+df['WinPct'] = (df['WinPct'] - 0.5) * 20
+
+
+df = df[['team', 'opponent_team', 'eFG%', 'PEM', 'REBF', 'NRtg', 'WinPct', 'Point_Differential']].copy()
+write_table(df, './data/SHAP/RaptorMerged.npz')
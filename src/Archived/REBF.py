@@ -0,0 +1,91 @@
+import pandas as pd
+import xgboost as xgb
+from sklearn.model_selection import train_test_split, GridSearchCV
+import shap
+import numpy as np
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Archived from src/SHAP/, whose shared modules it still uses
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'SHAP'))
+from columnStore import read_table, write_table
+from tuning import add_tuning_arguments, tune_from_args
+from shapWeights import add_shap_arguments, shap_values_from_args
+from teamForm import attach_form
+
+# Step 1: Load and Preprocess the Data
+# Example: Drop columns that are identifiers or not useful
+important = ['Point_Differential','DREB', 'OREB', 'F_tech', 'F_personal', 'Possessions']
+
+# Define the target and feature set
+target = "Point_Differential"
+# Assume you want to keep all remaining numeric columns as features
+features = [col for col in important if col != target and col != 'Possessions']
+
+parser = argparse.ArgumentParser(description='SHAP-weighted REBF')
+parser.add_argument('--form', type=str, nargs='?', const='data/team_form.npz',
+                    help='Also train on the rolling/EWM form of the model inputs from this table '
+                         '(default when given without a path: data/team_form.npz)')
+add_tuning_arguments(parser)
+add_shap_arguments(parser)
+args = parser.parse_args()
+
+# Only the model columns and the columns kept in RaptorMerged are read
+raptor_columns = ['team', 'opponent_team', 'eFG%', 'PEM', 'REBF', 'NRtg', 'WinPct', 'Point_Differential']
+df = read_table("./data/merged_team_games.npz", important + [col for col in raptor_columns if col not in important]
+                + (['game_id'] if args.form else []))
+
+# Form columns are extra model inputs only; the composite weights below use `features`
+form_features = []
+if args.form:
+    df, form_features = attach_form(df, args.form, important)
+
+X = df[features + form_features]
+y = df[target]
+
+# Step 2: Split Data into Training and Testing Sets
+X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+X_train_optuna, X_val_optuna, y_train_optuna, y_val_optuna = train_test_split(X_train, y_train, test_size=0.2, random_state=42)
+
+# Steps 3-4: Bayesian Optimization, with parallel, pruned and resumable trials (see tuning.py)
+study = tune_from_args('rebf', args, X_train_optuna, y_train_optuna, X_val_optuna, y_val_optuna)
+best_params = study.best_params
+
+
+model = xgb.XGBRegressor(random_state=42, **best_params)
+model.fit(X_train, y_train)
+
+# Step 4: Initialize the SHAP Explainer and Calculate SHAP Values
+# Path-dependent TreeSHAP by default, cached by model and data (see shapWeights.py)
+shap_result = shap_values_from_args(args, model, X_test, background=X_train)
+
+feature_names = X_train.columns
+shap_dict = shap_result.importances()
+
+
+# Normalize SHAP importances so that weights sum to 1 in each group
+num_total = sum(shap_dict[feat] for feat in features)
+numerator_weights = {feat: shap_dict[feat] / num_total for feat in features}
+
+
+print(numerator_weights)
+
+df["REBF"] = (
+    numerator_weights['DREB'] * df["DREB"]/df["Possessions"] + 
+    numerator_weights['OREB'] * df["OREB"]/df['Possessions'] -
+    (numerator_weights['F_tech'] + numerator_weights['F_personal'])*(df['F_tech'] + df['F_personal'])/df['Possessions']
+)
+
+df = df[raptor_columns].copy()
+write_table(df, './data/SHAP/RaptorMerged.npz')
+
+# df.to_csv('./data/SHAP/RaptorMerged.csv', sep='\t', index=False)
+
+# # Step 5: Visualize the SHAP Values
+# # Summary plot: shows overall feature importance and effect direction
+# shap.summary_plot(shap_values, X_test)
+
+# # Optional: Dependence plot for a specific feature (e.g., 'FGM_2')
+# shap.dependence_plot("FGM_2", shap_values.values, X_test)
@@ -1,7 +1,13 @@
 import pandas as pd
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import instrumentation
+from columnStore import read_table
 
 # Load your DataFrames
-df = pd.read_csv('./data/SHAP/RaptorMerged.csv', sep='\t')
+df = read_table('./data/SHAP/RaptorMerged.npz', ['team', 'Raptor_Score'])
 df2 = pd.read_csv('./data/team_region_groups.csv', sep='\t')
 
 # Get the unique team names from df2
@@ -36,4 +42,5 @@ df_results['Rank'] = df_results.groupby('Region')['Avg RaptorScore'].rank(method
 # Convert rank to int while safely handling NaNs
 df_results['Rank'] = df_results['Rank'].fillna(0).astype(int)
 
-df_results.to_csv('./output/SHAPRanking.csv', sep='\t', index=False)
\ No newline at end of file
+df_results.to_csv('./output/SHAPRanking.csv', sep='\t', index=False)
+instrumentation.rows_written(len(df_results), './output/SHAPRanking.csv')
\ No newline at end of file
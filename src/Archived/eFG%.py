@@ -0,0 +1,95 @@
+import pandas as pd
+import xgboost as xgb
+from sklearn.model_selection import train_test_split
+import shap
+import numpy as np
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Archived from src/SHAP/, whose shared modules it still uses
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'SHAP'))
+from columnStore import read_table, write_table
+from tuning import add_tuning_arguments, tune_from_args
+from shapWeights import add_shap_arguments, shap_values_from_args
+from teamForm import attach_form
+
+# Step 1: Load and Preprocess the Data
+# Example: Drop columns that are identifiers or not useful
+important = ['FGM_2', 'FGA_2', 'FGM_3', 'FGA_3', 'FTM', 'FTA', 'Point_Differential']
+target = "Point_Differential"
+features = [col for col in important if col != target]
+
+parser = argparse.ArgumentParser(description='SHAP-weighted eFG%')
+parser.add_argument('--form', type=str, nargs='?', const='data/team_form.npz',
+                    help='Also train on the rolling/EWM form of the model inputs from this table '
+                         '(default when given without a path: data/team_form.npz)')
+add_tuning_arguments(parser)
+add_shap_arguments(parser)
+args = parser.parse_args()
+
+# Only the model columns and the columns kept in RaptorMerged are read
+raptor_columns = ['team', 'opponent_team', 'eFG%', 'PEM', 'REBF', 'NRtg', 'WinPct', 'Point_Differential']
+df = read_table("./data/merged_team_games.npz", important + [col for col in raptor_columns if col not in important]
+                + (['game_id'] if args.form else []))
+
+# Form columns are extra model inputs only; the composite weights below use `features`
+form_features = []
+if args.form:
+    df, form_features = attach_form(df, args.form, important)
+
+X = df[features + form_features]
+y = df[target]
+
+# Step 2: Split Data into Training and Testing Sets
+X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+X_train_optuna, X_val_optuna, y_train_optuna, y_val_optuna = train_test_split(X_train, y_train, test_size=0.2, random_state=42)
+
+# Steps 3-4: Bayesian Optimization, with parallel, pruned and resumable trials (see tuning.py)
+study = tune_from_args('efg', args, X_train_optuna, y_train_optuna, X_val_optuna, y_val_optuna)
+
+# Step 5: Train the Best Model from Bayesian Optimization
+best_params = study.best_params
+best_model = xgb.XGBRegressor(**best_params)
+best_model.fit(X_train, y_train)
+
+
+# Step 6: Calculate SHAP Values (path-dependent TreeSHAP by default, cached; see shapWeights.py)
+shap_result = shap_values_from_args(args, best_model, X_test, background=X_train)
+shap_values = shap_result.explanation(X_test)
+
+feature_names = X_train.columns
+shap_dict = shap_result.importances()
+
+# Define feature groups for numerator and denominator
+numerator_features = ['FGM_2', 'FGM_3', 'FTM']
+denom_features = ['FGA_2', 'FGA_3', 'FTA']
+
+# Normalize SHAP importances so that weights sum to 1 in each group
+num_total = sum(shap_dict[feat] for feat in numerator_features)
+numerator_weights = {feat: shap_dict[feat] / num_total for feat in numerator_features}
+
+denom_total = sum(shap_dict[feat] for feat in denom_features)
+denom_weights = {feat: shap_dict[feat] / denom_total for feat in denom_features}
+
+print("Numerator Weights:", numerator_weights)
+print("Denominator Weights:", denom_weights)
+
+# Step 7: Compute eFG% using SHAP-Derived Weights
+df["eFG%"] = (
+    numerator_weights['FGM_2'] * df["FGM_2"] + 
+    numerator_weights['FGM_3'] * df["FGM_3"] + 
+    numerator_weights['FTM'] * df["FTM"]/
+    (denom_weights['FGA_2'] * df["FGA_2"] +
+    denom_weights['FGA_3'] * df["FGA_3"] +
+    denom_weights['FTA'] * df["FTA"] )
+)
+
+# Step 8: Save Processed Data
+df = df[raptor_columns].copy()
+write_table(df, './data/SHAP/RaptorMerged.npz')
+
+# Step 9: Visualize SHAP Values
+shap.summary_plot(shap_values, X_test)
+shap.dependence_plot("FGM_2", shap_values.values, X_test)
\ No newline at end of file
@@ -1,12 +1,23 @@
 import pandas as pd
 import xgboost as xgb
-from sklearn.model_selection import train_test_split, GridSearchCV
-import shap
+from sklearn.model_selection import train_test_split
 import numpy as np
-import optuna
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from columnStore import read_table, write_table
+from tuning import add_tuning_arguments, tune_from_args
+from shapWeights import add_shap_arguments, shap_values_from_args
+
+parser = argparse.ArgumentParser(description='SHAP-weighted Raptor_Score')
+add_tuning_arguments(parser)
+add_shap_arguments(parser)
+args = parser.parse_args()
 
 # Step 1: Load and Preprocess the Data
-df = pd.read_csv("./data/SHAP/RaptorMerged.csv", sep="\t")
+df = read_table("./data/SHAP/RaptorMerged.npz")
 
 # Example: Drop columns that are identifiers or not useful
 important = ['WinPct','eFG%', 'PEM', 'REBF', 'NRtg']
@@ -23,36 +34,8 @@ y = df[target]
 X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 X_train_optuna, X_val_optuna, y_train_optuna, y_val_optuna = train_test_split(X_train, y_train, test_size=0.2, random_state=42)
 
-# Step 3: Define Bayesian Optimization Objective Function
-def objective(trial):
-    """Objective function for Optuna to optimize XGBoost hyperparameters."""
-    params = {
-        'n_estimators': trial.suggest_int('n_estimators', 50, 500),
-        'learning_rate': trial.suggest_float('learning_rate', 0.01, 0.3),
-        'max_depth': trial.suggest_int('max_depth', 3, 10),
-        'subsample': trial.suggest_float('subsample', 0.5, 1.0),
-        'colsample_bytree': trial.suggest_float('colsample_bytree', 0.5, 1.0),
-        'min_child_weight': trial.suggest_int('min_child_weight', 1, 10),
-        'gamma': trial.suggest_float('gamma', 0, 5),
-        'reg_alpha': trial.suggest_float('reg_alpha', 0, 1),
-        'reg_lambda': trial.suggest_float('reg_lambda', 0, 1),
-        'random_state': 42,
-        'eval_metric': 'rmse',
-        'early_stopping_rounds': 10
-    }
-
-    model = xgb.XGBRegressor(**params)
-    model.fit(X_train_optuna, y_train_optuna, eval_set=[(X_val_optuna, y_val_optuna)], verbose=False,)
-    
-    # Evaluate using Mean Squared Error
-    predictions = model.predict(X_val_optuna)
-    mse = np.mean((y_val_optuna - predictions) ** 2)
-    
-    return mse  # Minimize MSE
-
-# Step 4: Run Bayesian Optimization
-study = optuna.create_study(direction='minimize')  # Minimize MSE
-study.optimize(objective, n_trials=50)  # Run 50 trials
+# Steps 3-4: Bayesian Optimization, with parallel, pruned and resumable trials (see tuning.py)
+study = tune_from_args('raptor', args, X_train_optuna, y_train_optuna, X_val_optuna, y_val_optuna)
 best_params = study.best_params
 
 
@@ -60,13 +43,11 @@ model = xgb.XGBRegressor( **best_params)
 model.fit(X_train, y_train)
 
 # Step 4: Initialize the SHAP Explainer and Calculate SHAP Values
-# For tree-based models, TreeExplainer is efficient.
-explainer = shap.Explainer(model, X_train)
-shap_values = explainer(X_test)
+# Path-dependent TreeSHAP by default, cached by model and data (see shapWeights.py)
+shap_result = shap_values_from_args(args, model, X_test, background=X_train)
 
 feature_names = X_train.columns
-shap_importances = np.abs(shap_values.values).mean(axis=0)
-shap_dict = dict(zip(feature_names, shap_importances))
+shap_dict = shap_result.importances()
 
 
 # Normalize SHAP importances so that weights sum to 1 in each group
@@ -82,7 +63,7 @@ df["Raptor_Score"] = (
     numerator_weights['NRtg'] * df["NRtg"]
 )
 
-df.to_csv('./data/SHAP/RaptorMerged.csv', sep='\t', index=False)
+write_table(df, './data/SHAP/RaptorMerged.npz')
 
 
 # df.to_csv('./data/SHAP/RaptorMerged.csv', sep='\t', index=False)
@@ -0,0 +1,245 @@
+"""
+Bootstrap confidence intervals for SHAP-derived weights and the rankings they produce.
+
+The model's hyperparameters are tuned once (or read from the stored study; see
+tuning.py) and the point-estimate weights come from the single 80/20 split
+the scripts use. Each bootstrap resample then refits the model on rows drawn
+with replacement and takes mean |SHAP| on the rows it left out. The feature
+matrix and target live in one shared-memory block that every worker process
+maps, so no worker copies the data; each worker trains with one thread and
+resamples are handed out in batches, so throughput grows with the number of
+cores.
+
+For every weight the output gives percentile intervals. For every team it gives
+the region rank under the point-estimate weights, how often a resample's
+weights change that rank, and the rank interval. Ranks are by the team's
+average of the bootstrapped column, as rankingBuilder.py ranks by Raptor_Score.
+"""
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+import optuna
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from sklearn.model_selection import train_test_split
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import instrumentation
+from columnStore import read_table
+from tuning import add_tuning_arguments, tune_from_args
+from shapWeights import shap_values
+from compositeBuilder import SPECS, CompositeSpec, DEFAULT_GAMES, DEFAULT_OUTPUT
+
+
+def raptor_formula(df, w):
+    return w['eFG%'] * df['eFG%'] + w['PEM'] * df['PEM'] + w['REBF'] * df['REBF'] + w['NRtg'] * df['NRtg']
+
+
+# Raptor_Score as RaptorV1.py builds it, from the composites in RaptorMerged
+RAPTOR_SPEC = CompositeSpec('raptor', 'Raptor_Score', ['eFG%', 'PEM', 'REBF', 'NRtg'], raptor_formula,
+                            target='WinPct')
+MODELS = {spec.key: spec for spec in [RAPTOR_SPEC] + SPECS if spec.features}
+
+
+class SharedArray:
+    """A numpy array in a named shared-memory block."""
+
+    def __init__(self, array=None, name=None, shape=None, dtype=np.float64):
+        if array is not None:
+            array = np.ascontiguousarray(array)
+            self.shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            self.array = np.ndarray(array.shape, array.dtype, buffer=self.shm.buf)
+            self.array[...] = array
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.array = np.ndarray(shape, dtype, buffer=self.shm.buf)
+
+    def handle(self):
+        """What a worker needs to map the block: (name, shape, dtype)."""
+        return self.shm.name, self.array.shape, self.array.dtype.str
+
+    def close(self, unlink=False):
+        del self.array
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+_shared = {}
+
+
+def _init_worker(x_handle, y_handle, features, params):
+    name, shape, dtype = x_handle
+    _shared['X'] = SharedArray(name=name, shape=shape, dtype=dtype)
+    name, shape, dtype = y_handle
+    _shared['y'] = SharedArray(name=name, shape=shape, dtype=dtype)
+    _shared['features'] = features
+    _shared['params'] = params
+
+
+def resample_importances(seeds):
+    """
+    Mean |SHAP| per feature for each bootstrap seed, from a model fitted on the
+    resampled rows and explained on the out-of-bag rows.
+
+    Returns:
+        tuple: (numpy.ndarray of shape (len(seeds), features), instrumentation
+               counters added)
+    """
+    counted = instrumentation.counters()
+    X, y = _shared['X'].array, _shared['y'].array
+    n = len(y)
+    importances = np.empty((len(seeds), X.shape[1]))
+    for i, seed in enumerate(seeds):
+        rng = np.random.default_rng(seed)
+        rows = rng.integers(0, n, n)
+        out_of_bag = np.ones(n, dtype=bool)
+        out_of_bag[rows] = False
+        model = xgb.XGBRegressor(**_shared['params'], random_state=int(seed), n_jobs=1)
+        model.fit(X[rows], y[rows])
+        explained = pd.DataFrame(X[out_of_bag], columns=_shared['features'])
+        importances[i] = shap_values(model, explained, cache_dir=None).mean_abs
+    return importances, instrumentation.since(counted)
+
+
+def bootstrap_importances(X, y, params, resamples=200, workers=None, seed=42):
+    """
+    Mean |SHAP| importances over `resamples` bootstrap refits, spread over
+    `workers` processes that share X and y.
+
+    Returns:
+        numpy.ndarray: (resamples, features)
+    """
+    workers = workers or os.cpu_count() or 1
+    seeds = np.random.SeedSequence(seed).generate_state(resamples)
+    batches = [batch for batch in np.array_split(seeds, min(resamples, workers * 4)) if len(batch)]
+    shared_X = SharedArray(X.to_numpy(dtype=np.float64))
+    shared_y = SharedArray(np.asarray(y, dtype=np.float64))
+    context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+    try:
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(shared_X.handle(), shared_y.handle(), list(X.columns), params)) as pool:
+            results = list(pool.map(resample_importances, batches))
+        for _, counts in results:
+            instrumentation.merge(counts)
+        instrumentation.count('bootstrap_resamples', resamples)
+        return np.vstack([importances for importances, _ in results])
+    finally:
+        shared_X.close(unlink=True)
+        shared_y.close(unlink=True)
+
+
+def interval_table(estimate, samples, level=0.95):
+    """Point estimate, bootstrap mean and percentile interval of every weight."""
+    tail = (1 - level) / 2 * 100
+    lower, upper = np.percentile(samples, [tail, 100 - tail], axis=0)
+    return pd.DataFrame({'feature': list(estimate), 'estimate': list(estimate.values()),
+                         'mean': samples.mean(axis=0), 'std': samples.std(axis=0, ddof=1),
+                         'lower': lower, 'upper': upper})
+
+
+def region_ranks(team_scores, team_regions):
+    """
+    Rank teams within each region from highest to lowest score, tied scores
+    sharing the lower rank, for every row of a (samples, teams) score matrix.
+    """
+    ranks = np.zeros(team_scores.shape, dtype=int)
+    for region in np.unique(team_regions):
+        members = np.flatnonzero(team_regions == region)
+        scores = team_scores[:, members]
+        # rank = 1 + number of teams in the region with a strictly higher score
+        ranks[:, members] = 1 + (scores[:, None, :] > scores[:, :, None]).sum(axis=2)
+    return ranks
+
+
+def rank_stability(spec, df, estimate, weight_samples, regions, level=0.95):
+    """
+    Region rank of every team under the point-estimate weights, how often the
+    bootstrap weights change it, and the bootstrap rank interval.
+    """
+    region_table = regions[['team', 'region']].drop_duplicates('team')
+    df = df[df['team'].isin(region_table['team'])]
+    codes, teams = pd.factorize(df['team'].astype(str))
+    counts = np.bincount(codes, minlength=len(teams))
+    team_regions = region_table.set_index('team').loc[teams, 'region'].to_numpy()
+
+    def team_means(weights):
+        values = np.asarray(spec.formula(df, weights), dtype=float)
+        valid = ~np.isnan(values)
+        return np.bincount(codes[valid], values[valid], len(teams)) / np.maximum(
+            np.bincount(codes[valid], minlength=len(teams)), 1)
+
+    features = list(estimate)
+    base = region_ranks(team_means(estimate)[None, :], team_regions)[0]
+    samples = region_ranks(np.vstack([team_means(dict(zip(features, row))) for row in weight_samples]),
+                           team_regions)
+    tail = (1 - level) / 2 * 100
+    lower, upper = np.percentile(samples, [tail, 100 - tail], axis=0)
+    table = pd.DataFrame({'team': teams, 'region': team_regions, 'games': counts, 'rank': base,
+                          'rank_changed': (samples != base).mean(axis=0), 'rank_median': np.median(samples, axis=0),
+                          'rank_lower': lower, 'rank_upper': upper})
+    return table.sort_values(['region', 'rank', 'team']).reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Bootstrap intervals for SHAP-derived weights and region ranks')
+    parser.add_argument('--model', type=str, default='raptor', choices=list(MODELS),
+                        help='Weights to bootstrap: raptor (RaptorV1.py) or a composite (default: raptor)')
+    parser.add_argument('--resamples', type=int, default=200, help='Bootstrap resamples (default: 200)')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: every core)')
+    parser.add_argument('--level', type=float, default=0.95, help='Interval coverage (default: 0.95)')
+    parser.add_argument('--seed', type=int, default=42, help='Resampling seed (default: 42)')
+    parser.add_argument('--regions', type=str, default='data/team_region_groups.csv',
+                        help='Team/region table (default: data/team_region_groups.csv)')
+    parser.add_argument('--output', type=str, default='output/bootstrap_weights.csv',
+                        help='Weight intervals (default: output/bootstrap_weights.csv)')
+    parser.add_argument('--ranks', type=str, default='output/bootstrap_ranks.csv',
+                        help='Rank stability per team (default: output/bootstrap_ranks.csv)')
+    add_tuning_arguments(parser)
+    args = parser.parse_args()
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+
+    spec = MODELS[args.model]
+    source = DEFAULT_OUTPUT if spec is RAPTOR_SPEC else DEFAULT_GAMES
+    df = read_table(source, list(dict.fromkeys(['team'] + spec.features + spec.columns + [spec.target])))
+    df = df.dropna(subset=spec.features + [spec.target]).reset_index(drop=True)
+    X, y = df[spec.features], df[spec.target]
+
+    # Point estimate: the single split and tuned parameters the scripts use
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    X_train_optuna, X_val_optuna, y_train_optuna, y_val_optuna = train_test_split(X_train, y_train, test_size=0.2,
+                                                                                  random_state=42)
+    params = tune_from_args(spec.key, args, X_train_optuna, y_train_optuna, X_val_optuna, y_val_optuna).best_params
+    model = xgb.XGBRegressor(random_state=42, **params)
+    model.fit(X_train, y_train)
+    estimate = spec.weights(shap_values(model, X_test, cache_dir=None).importances())
+
+    start = time.perf_counter()
+    importances = bootstrap_importances(X, y, params, args.resamples, args.workers, args.seed)
+    seconds = time.perf_counter() - start
+    weight_samples = np.array([[weights[feat] for feat in spec.features] for weights in
+                               (spec.weights(dict(zip(spec.features, row))) for row in importances)])
+    print(f"{args.resamples} resamples of {len(df)} rows in {seconds:.1f}s with "
+          f"{args.workers or os.cpu_count()} worker(s) ({args.resamples / seconds:.1f} resamples/s)")
+
+    intervals = interval_table(estimate, weight_samples, args.level)
+    print(intervals.to_string(index=False, float_format='{:.4f}'.format))
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    intervals.to_csv(args.output, sep='\t', index=False)
+    instrumentation.rows_written(len(intervals), args.output)
+    print(f"Weight intervals saved to {args.output}")
+
+    if os.path.exists(args.regions):
+        ranks = rank_stability(spec, df, estimate, weight_samples, pd.read_csv(args.regions, sep='\t'), args.level)
+        ranks.to_csv(args.ranks, sep='\t', index=False)
+        instrumentation.rows_written(len(ranks), args.ranks)
+        changed = ranks[ranks['rank_changed'] > 0]
+        print(f"{len(changed)} of {len(ranks)} teams change region rank in at least one resample; "
+              f"median change rate {ranks['rank_changed'].median():.1%}. Saved to {args.ranks}")
+    else:
+        print(f"No region table at {args.regions}; rank stability skipped")
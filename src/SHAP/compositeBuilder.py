@@ -0,0 +1,278 @@
+"""
+SHAP-weighted composite metrics for RaptorMerged, built from declared specs.
+
+Each composite is a CompositeSpec: the model inputs whose mean |SHAP| become
+its weights, how those weights are normalized, and the formula that combines
+the inputs into one column. Specs without inputs (NRtg, WinPct) are plain
+formulas. The team-game table is read once; the model specs are then tuned,
+trained and explained concurrently in a process pool (forked workers share the
+parent's copy of the data), and every column is written to RaptorMerged in a
+single write. With enough cores the whole set takes about as long as the
+slowest composite.
+
+Adding a composite means adding a formula and a spec to SPECS.
+"""
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+import optuna
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Callable
+from sklearn.model_selection import train_test_split
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import instrumentation
+from columnStore import read_table, write_table
+from tuning import add_tuning_arguments, tune
+from shapWeights import add_shap_arguments, shap_values
+from teamForm import attach_form
+
+DEFAULT_GAMES = 'data/merged_team_games.npz'
+DEFAULT_OUTPUT = 'data/SHAP/RaptorMerged.npz'
+KEY_COLUMNS = ['game_id', 'team', 'opponent_team']
+# A team-game row; how rows of an earlier RaptorMerged are matched to the games
+ROW_KEYS = ['game_id', 'team']
+TARGET = 'Point_Differential'
+
+
+@dataclass
+class CompositeSpec:
+    """
+    One composite column of RaptorMerged.
+
+    `formula(df, weights)` returns the column; `weights` maps each feature to
+    its mean |SHAP| normalized to sum to 1 within its group (by default all
+    features form one group). `columns` are any other columns the formula
+    reads. A spec without features is computed directly, with empty weights.
+    """
+    key: str
+    column: str
+    features: list
+    formula: Callable
+    groups: list = None
+    columns: list = field(default_factory=list)
+    target: str = TARGET
+
+    def weights(self, importances):
+        weights = {}
+        for group in self.groups or [self.features]:
+            total = sum(importances[feat] for feat in group)
+            weights.update({feat: importances[feat] / total for feat in group})
+        return {feat: weights[feat] for feat in self.features}
+
+
+def efg_formula(df, w):
+    # Weighted makes over weighted attempts (eFG%.py divided only the FTM term)
+    return (
+        (w['FGM_2'] * df['FGM_2'] + w['FGM_3'] * df['FGM_3'] + w['FTM'] * df['FTM']) /
+        (w['FGA_2'] * df['FGA_2'] + w['FGA_3'] * df['FGA_3'] + w['FTA'] * df['FTA'])
+    )
+
+
+def pem_formula(df, w):
+    return (
+        w['AST%'] * df['AST%'] +
+        w['BLK%'] * df['BLK%'] +
+        w['TOV%'] * df['TOV%'] -
+        w['TOV_team%'] * df['TOV_team%'] -
+        w['STL%'] * df['STL%']
+    )
+
+
+def rebf_formula(df, w):
+    return (
+        w['DREB'] * df['DREB'] / df['Possessions'] +
+        w['OREB'] * df['OREB'] / df['Possessions'] -
+        (w['F_tech'] + w['F_personal']) * (df['F_tech'] + df['F_personal']) / df['Possessions']
+    )
+
+
+def nrtg_formula(df, w):
+    # ORtg - DRtg
+    return (df['team_score'] - df['opponent_team_score']) / df['Possessions'] * 100
+
+
+def winpct_formula(df, w):
+    return (df['numwins'] / df['games_played'] - 0.5) * 20
+
+
+SPECS = [
+    CompositeSpec('efg', 'eFG%', ['FGM_2', 'FGA_2', 'FGM_3', 'FGA_3', 'FTM', 'FTA'], efg_formula,
+                  groups=[['FGM_2', 'FGM_3', 'FTM'], ['FGA_2', 'FGA_3', 'FTA']]),
+    CompositeSpec('pem', 'PEM', ['AST%', 'BLK%', 'TOV%', 'TOV_team%', 'STL%'], pem_formula),
+    CompositeSpec('rebf', 'REBF', ['DREB', 'OREB', 'F_tech', 'F_personal'], rebf_formula, columns=['Possessions']),
+    CompositeSpec('nrtg', 'NRtg', [], nrtg_formula, columns=['team_score', 'opponent_team_score', 'Possessions']),
+    CompositeSpec('winpct', 'WinPct', [], winpct_formula, columns=['numwins', 'games_played']),
+]
+
+
+def spec_columns(specs):
+    """Every column the specs read, in first-use order."""
+    columns = list(KEY_COLUMNS) + [TARGET]
+    for spec in specs:
+        columns += [col for col in spec.features + spec.columns + [spec.target] if col not in columns]
+    return columns
+
+
+_games = None
+
+
+def _init_worker(games):
+    global _games
+    _games = games
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+
+
+def build_composite(spec, settings):
+    """
+    Tune, train and explain one spec's model on the shared table, as the
+    per-composite scripts did, and return its column and weights.
+
+    Returns:
+        dict: key, column, values, weights, seconds, best_mse and the
+              instrumentation counters it added
+    """
+    start = time.perf_counter()
+    counted = instrumentation.counters()
+    df = _games
+    # Form columns are named <stat>_last<N> and <stat>_ewm<halflife>
+    form_features = [col for col in settings['form_columns']
+                     if col.rsplit('_', 1)[0] in spec.features + [spec.target]]
+    X = df[spec.features + form_features]
+    y = df[spec.target]
+
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    X_train_optuna, X_val_optuna, y_train_optuna, y_val_optuna = train_test_split(X_train, y_train, test_size=0.2,
+                                                                                  random_state=42)
+    study = tune(spec.key, X_train_optuna, y_train_optuna, X_val_optuna, y_val_optuna, trials=settings['trials'],
+                 timeout=settings['timeout'], jobs=settings['jobs'], storage=settings['storage'],
+                 fresh=settings['fresh'], prune=settings['prune'], threads=settings['threads'])
+
+    model = xgb.XGBRegressor(random_state=42, n_jobs=settings['jobs'] * settings['threads'], **study.best_params)
+    model.fit(X_train, y_train)
+    result = shap_values(model, X_test, X_train, method=settings['shap_method'],
+                         background_size=settings['background_size'], background_method=settings['background'],
+                         cache_dir=settings['shap_cache'])
+
+    weights = spec.weights(result.importances())
+    return {'key': spec.key, 'column': spec.column, 'values': np.asarray(spec.formula(df, weights)),
+            'weights': weights, 'seconds': time.perf_counter() - start, 'best_mse': study.best_value,
+            'counters': instrumentation.since(counted)}
+
+
+def previous_columns(raptor, previous):
+    """
+    An earlier RaptorMerged table's rows in the order of `raptor`'s, matched by
+    (game_id, team), or None with a warning when they cannot all be matched.
+    """
+    missing_keys = [key for key in ROW_KEYS if key not in previous]
+    if missing_keys:
+        print(f"Warning: the existing table has no {', '.join(missing_keys)} column; columns not rebuilt are left "
+              f"empty")
+        return None
+    keys = pd.MultiIndex.from_frame(raptor[ROW_KEYS].astype(str))
+    previous_keys = pd.MultiIndex.from_frame(previous[ROW_KEYS].astype(str))
+    if keys.has_duplicates or previous_keys.has_duplicates:
+        print("Warning: (game_id, team) is not unique; columns not rebuilt are left empty")
+        return None
+    unmatched = (~keys.isin(previous_keys)).sum()
+    if unmatched or len(previous_keys) != len(keys):
+        print(f"Warning: the existing table does not have the same team-games ({unmatched} of {len(keys)} not "
+              f"found, {len(previous_keys)} rows); columns not rebuilt are left empty")
+        return None
+    return previous.set_axis(previous_keys).reindex(keys).reset_index(drop=True)
+
+
+def build(games, specs, settings, workers=None):
+    """
+    Build every spec's column. Model specs run concurrently in `workers`
+    processes that share `games`.
+
+    Returns:
+        tuple: (dict column -> values, list of per-spec results in completion order)
+    """
+    columns, results = {}, []
+    model_specs = [spec for spec in specs if spec.features]
+    for spec in specs:
+        if not spec.features:
+            columns[spec.column] = np.asarray(spec.formula(games, {}))
+    if not model_specs:
+        return columns, results
+
+    workers = workers or min(len(model_specs), os.cpu_count() or 1)
+    context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker, initargs=(games,)) as pool:
+        futures = [pool.submit(build_composite, spec, settings) for spec in model_specs]
+        for future in as_completed(futures):
+            result = future.result()
+            instrumentation.merge(result['counters'])
+            columns[result['column']] = result['values']
+            results.append(result)
+            print(f"{result['column']}: {result['seconds']:.1f}s, best MSE {result['best_mse']:.4f}, "
+                  f"weights {({feat: round(float(w), 4) for feat, w in result['weights'].items()})}")
+    return columns, results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='SHAP-weighted composites (eFG%, PEM, REBF) plus NRtg and WinPct '
+                                                 'for RaptorMerged')
+    parser.add_argument('--games', type=str, default=DEFAULT_GAMES, help=f'Team-game table (default: {DEFAULT_GAMES})')
+    parser.add_argument('--output', type=str, default=DEFAULT_OUTPUT, help=f'Output table (default: {DEFAULT_OUTPUT})')
+    parser.add_argument('--only', type=str, action='append', choices=[spec.key for spec in SPECS],
+                        help='Build only this composite (repeatable); the other columns are kept from --output, '
+                             'matched by game_id and team')
+    parser.add_argument('--workers', type=int, help='Composites built at once (default: one per core, at most '
+                                                    'one per composite)')
+    parser.add_argument('--form', type=str, nargs='?', const='data/team_form.npz',
+                        help='Also train on the rolling/EWM form of the model inputs from this table '
+                             '(default when given without a path: data/team_form.npz)')
+    add_tuning_arguments(parser)
+    add_shap_arguments(parser)
+    args = parser.parse_args()
+
+    specs = [spec for spec in SPECS if not args.only or spec.key in args.only]
+    start = time.perf_counter()
+    games = read_table(args.games, spec_columns(specs))
+
+    # Form columns are extra model inputs only; the composite weights use each spec's features
+    form_columns = []
+    if args.form:
+        games, form_columns = attach_form(games, args.form, [col for col in spec_columns(specs)
+                                                             if col not in KEY_COLUMNS])
+
+    # Cores are split between concurrent composites, then between each one's parallel trials
+    n_models = sum(bool(spec.features) for spec in specs)
+    workers = args.workers or max(1, min(n_models, os.cpu_count() or 1))
+    jobs = args.jobs or max(1, (os.cpu_count() or 1) // workers)
+    settings = {'form_columns': form_columns, 'trials': args.trials, 'timeout': args.timeout, 'jobs': jobs,
+                'threads': max(1, (os.cpu_count() or 1) // (workers * jobs)), 'storage': args.storage or None,
+                'fresh': args.fresh, 'prune': not args.no_prune, 'shap_method': args.shap_method,
+                'background_size': args.background_size, 'background': args.background,
+                'shap_cache': args.shap_cache or None}
+    columns, results = build(games, specs, settings, workers)
+
+    raptor = games[KEY_COLUMNS].copy()
+    previous = None
+    if args.only and os.path.exists(args.output):
+        previous = previous_columns(raptor, read_table(args.output))
+    for spec in SPECS:
+        if spec.column in columns:
+            raptor[spec.column] = columns[spec.column]
+        elif previous is not None and spec.column in previous:
+            raptor[spec.column] = previous[spec.column].to_numpy()
+        else:
+            raptor[spec.column] = np.nan
+    raptor[TARGET] = games[TARGET].to_numpy()
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    write_table(raptor, args.output)
+    total = time.perf_counter() - start
+    slowest = max((result['seconds'] for result in results), default=0.0)
+    print(f"Built {', '.join(spec.column for spec in specs)} in {total:.1f}s with {workers} worker(s) "
+          f"(slowest composite {slowest:.1f}s); saved to {args.output}")
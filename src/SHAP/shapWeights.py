@@ -0,0 +1,247 @@
+"""
+SHAP values and mean-|SHAP| importances for the SHAP weight models.
+
+The default is path-dependent TreeSHAP, computed by XGBoost itself
+(`pred_contribs`): it needs no background data and gives the same values as
+`shap.TreeExplainer(model, feature_perturbation='tree_path_dependent')`.
+When interventional semantics are wanted, the background is bounded to a
+sample (or k-means centers) of `background_size` rows, as `shap.Explainer`
+does with its default 100-row masker.
+
+Rows are explained in chunks; the mean-|SHAP| accumulators are updated per
+chunk and each chunk is written straight to a memory-mapped .npy file, so
+memory does not grow with the number of rows. The matrix is cached under
+data/shap_cache/ by a key over the model, the data and the settings, and a
+rerun with the same model and rows only reads the cached importances.
+"""
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import instrumentation
+
+DEFAULT_CACHE_DIR = 'data/shap_cache'
+METHODS = ('tree_path_dependent', 'interventional')
+
+
+def model_hash(model):
+    """Hash of a fitted XGBoost model's trees and parameters."""
+    booster = model.get_booster() if hasattr(model, 'get_booster') else model
+    return hashlib.sha256(bytes(booster.save_raw('ubj'))).hexdigest()
+
+
+def frame_hash(X):
+    """Hash of a frame's values and column names."""
+    digest = hashlib.sha256(pd.util.hash_pandas_object(pd.DataFrame(X), index=False).to_numpy().tobytes())
+    digest.update(','.join(map(str, pd.DataFrame(X).columns)).encode())
+    return digest.hexdigest()
+
+
+def bounded_background(X, size=100, method='sample', seed=42):
+    """
+    At most `size` background rows: a random sample, or k-means centers.
+
+    Returns:
+        pandas.DataFrame
+    """
+    if len(X) <= size:
+        return X
+    if method == 'sample':
+        return X.sample(size, random_state=seed)
+    if method == 'kmeans':
+        from sklearn.cluster import KMeans
+        values = X.to_numpy(dtype=float)
+        filled = np.where(np.isnan(values), np.nanmean(values, axis=0), values)
+        centers = KMeans(n_clusters=size, n_init=1, random_state=seed).fit(filled).cluster_centers_
+        return pd.DataFrame(centers, columns=X.columns)
+    raise ValueError(f"Unknown background method '{method}'; use 'sample' or 'kmeans'")
+
+
+class ShapResult:
+    """SHAP matrix (possibly memory-mapped), base value and mean-|SHAP| per feature."""
+
+    def __init__(self, values, base_value, feature_names, mean_abs, cached=False):
+        self.values = values
+        self.base_value = base_value
+        self.feature_names = list(feature_names)
+        self.mean_abs = np.asarray(mean_abs, dtype=float)
+        self.cached = cached
+
+    def importances(self):
+        """feature -> mean |SHAP|, like the dicts the scripts build."""
+        return dict(zip(self.feature_names, self.mean_abs))
+
+    def explanation(self, X):
+        """A shap.Explanation for the summary and dependence plots."""
+        import shap
+        return shap.Explanation(values=np.asarray(self.values), base_values=np.full(len(X), self.base_value),
+                                data=X.to_numpy(), feature_names=self.feature_names)
+
+
+def _path_dependent(model, chunk):
+    contributions = model.get_booster().predict(xgb.DMatrix(chunk), pred_contribs=True)
+    return contributions[:, :-1], float(contributions[0, -1])
+
+
+def shap_values(model, X, background=None, method='tree_path_dependent', background_size=100,
+                background_method='sample', chunk_rows=4096, cache_dir=DEFAULT_CACHE_DIR, seed=42):
+    """
+    SHAP values of a fitted XGBoost model on the rows of X.
+
+    Args:
+        model: Fitted xgboost.XGBRegressor
+        X (pandas.DataFrame): Rows to explain, with the model's feature columns
+        background (pandas.DataFrame, optional): Rows to draw the interventional
+                                                 background from (e.g. X_train)
+        method (str): 'tree_path_dependent' or 'interventional'
+        background_size (int): Background rows for the interventional method
+        background_method (str): 'sample' or 'kmeans'
+        chunk_rows (int): Rows explained at a time
+        cache_dir (str, optional): SHAP matrix cache; None disables it
+        seed (int): Seed for the background sample
+
+    Returns:
+        ShapResult
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown SHAP method '{method}'; use one of {', '.join(METHODS)}")
+    if method == 'interventional':
+        if background is None:
+            raise ValueError("The interventional method needs background rows")
+        background = bounded_background(background, background_size, background_method, seed)
+
+    settings = {'method': method}
+    if method == 'interventional':
+        settings.update(background=frame_hash(background))
+    key = hashlib.sha256(json.dumps([model_hash(model), frame_hash(X), settings]).encode()).hexdigest()[:20]
+    matrix_path = os.path.join(cache_dir, f'{key}.npy') if cache_dir else None
+    meta_path = os.path.join(cache_dir, f'{key}.json') if cache_dir else None
+    if cache_dir and os.path.exists(meta_path) and os.path.exists(matrix_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        instrumentation.count('shap_cache_hits')
+        return ShapResult(np.load(matrix_path, mmap_mode='r'), meta['base_value'], meta['features'],
+                          meta['mean_abs'], cached=True)
+
+    n_rows, n_features = X.shape
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = matrix_path + '.tmp.npy'
+        values = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=(n_rows, n_features))
+    else:
+        values = np.empty((n_rows, n_features), dtype=np.float32)
+
+    base_value = None
+    if method == 'interventional':
+        import shap
+        explainer = shap.TreeExplainer(model, data=background, feature_perturbation='interventional')
+        base_value = float(np.ravel(explainer.expected_value)[0])
+
+    abs_sum = np.zeros(n_features)
+    for start in range(0, n_rows, chunk_rows):
+        chunk = X.iloc[start:start + chunk_rows]
+        if method == 'tree_path_dependent':
+            chunk_values, base_value = _path_dependent(model, chunk)
+        else:
+            chunk_values = explainer.shap_values(chunk)
+        abs_sum += np.abs(chunk_values).sum(axis=0)
+        values[start:start + len(chunk)] = chunk_values
+    mean_abs = abs_sum / max(n_rows, 1)
+    instrumentation.count('shap_rows_explained', n_rows)
+
+    if cache_dir:
+        values.flush()
+        del values
+        os.replace(tmp_path, matrix_path)
+        with open(meta_path, 'w') as f:
+            json.dump({'base_value': base_value, 'features': list(map(str, X.columns)),
+                       'mean_abs': mean_abs.tolist(), 'rows': n_rows, **settings}, f)
+        values = np.load(matrix_path, mmap_mode='r')
+    return ShapResult(values, base_value, X.columns, mean_abs)
+
+
+def add_shap_arguments(parser):
+    """The SHAP options every SHAP weight script accepts."""
+    parser.add_argument('--shap-method', type=str, default='tree_path_dependent', choices=METHODS,
+                        help='TreeSHAP variant (default: tree_path_dependent, no background needed)')
+    parser.add_argument('--background-size', type=int, default=100,
+                        help='Background rows for --shap-method interventional (default: 100)')
+    parser.add_argument('--background', type=str, default='sample', choices=['sample', 'kmeans'],
+                        help='How the interventional background is bounded (default: sample)')
+    parser.add_argument('--shap-cache', type=str, default=DEFAULT_CACHE_DIR,
+                        help=f"SHAP matrix cache directory, '' to disable (default: {DEFAULT_CACHE_DIR})")
+    return parser
+
+
+def shap_values_from_args(args, model, X, background=None):
+    """`shap_values` with the options added by add_shap_arguments, reporting the time taken."""
+    start = time.perf_counter()
+    result = shap_values(model, X, background, method=args.shap_method, background_size=args.background_size,
+                         background_method=args.background, cache_dir=args.shap_cache or None)
+    print(f"SHAP values for {len(X)} rows ({args.shap_method}) "
+          f"{'read from cache' if result.cached else 'computed'} in {time.perf_counter() - start:.2f}s")
+    return result
+
+
+def normalized(importances):
+    total = sum(importances.values())
+    return {feature: value / total for feature, value in importances.items()}
+
+
+if __name__ == "__main__":
+    from sklearn.model_selection import train_test_split
+    from columnStore import read_table
+    import shap
+    import shutil
+
+    parser = argparse.ArgumentParser(description='Compare the SHAP weight engine with shap.Explainer')
+    parser.add_argument('--games', type=str, default='data/merged_team_games.npz',
+                        help='Team-game table (default: data/merged_team_games.npz)')
+    parser.add_argument('--features', type=str, nargs='+', default=['AST%', 'BLK%', 'TOV%', 'TOV_team%', 'STL%'],
+                        help='Model inputs (default: the PEM inputs)')
+    parser.add_argument('--target', type=str, default='Point_Differential', help='Model target')
+    parser.add_argument('--output', type=str, help='Also write the results as JSON')
+    args = parser.parse_args()
+
+    df = read_table(args.games, args.features + [args.target])
+    X_train, X_test, y_train, y_test = train_test_split(df[args.features], df[args.target], test_size=0.2,
+                                                        random_state=42)
+    model = xgb.XGBRegressor(n_estimators=300, max_depth=6, learning_rate=0.05, random_state=42)
+    model.fit(X_train, y_train)
+
+    start = time.perf_counter()
+    explanation = shap.Explainer(model, X_train)(X_test)
+    current_s = time.perf_counter() - start
+    current = normalized(dict(zip(args.features, np.abs(explanation.values).mean(axis=0))))
+    print(f"shap.Explainer(model, X_train): {current_s:.2f}s")
+
+    cache_dir = os.path.join('output', 'shap_cache_benchmark')
+    results = {'rows': len(X_test), 'current_seconds': current_s, 'current_weights': current, 'methods': {}}
+    for method in METHODS:
+        start = time.perf_counter()
+        result = shap_values(model, X_test, X_train, method=method, cache_dir=None)
+        seconds = time.perf_counter() - start
+        shap_values(model, X_test, X_train, method=method, cache_dir=cache_dir)
+        start = time.perf_counter()
+        shap_values(model, X_test, X_train, method=method, cache_dir=cache_dir)
+        cached_s = time.perf_counter() - start
+
+        weights = normalized(result.importances())
+        diff = max(abs(weights[feature] - current[feature]) for feature in args.features)
+        results['methods'][method] = {'seconds': seconds, 'cached_seconds': cached_s, 'weights': weights,
+                                      'max_weight_difference': diff}
+        print(f"{method}: {seconds:.2f}s ({current_s / seconds:.1f}x faster), cached {cached_s * 1000:.1f}ms; "
+              f"largest weight difference {diff:.4f}")
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+        print(f"Results saved to {args.output}")
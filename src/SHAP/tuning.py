@@ -0,0 +1,242 @@
+"""
+Shared XGBoost hyperparameter tuning for the SHAP weight models.
+
+Trials run in parallel threads (XGBoost releases the GIL while it trains),
+each with an equal share of the cores, and train natively on matrices built
+once per split (see xgbTraining.py). Trials whose validation RMSE falls
+behind the median of earlier trials at the same boosting round are pruned.
+Studies are stored in a local SQLite database, so an interrupted run resumes
+where it stopped and finished studies can be inspected with optuna-dashboard
+or `optuna.load_study`. The budget is a trial count, a wall-clock limit, or
+both.
+"""
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+import optuna
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import instrumentation
+from xgbTraining import SplitCache, split_threads, train, validation_mse
+
+DEFAULT_STORAGE = 'sqlite:///data/optuna.db'
+
+
+def suggest_params(trial):
+    """The search space of the original per-script objective functions."""
+    return {
+        'n_estimators': trial.suggest_int('n_estimators', 50, 500),
+        'learning_rate': trial.suggest_float('learning_rate', 0.01, 0.3),
+        'max_depth': trial.suggest_int('max_depth', 3, 10),
+        'subsample': trial.suggest_float('subsample', 0.5, 1.0),
+        'colsample_bytree': trial.suggest_float('colsample_bytree', 0.5, 1.0),
+        'min_child_weight': trial.suggest_int('min_child_weight', 1, 10),
+        'gamma': trial.suggest_float('gamma', 0, 5),
+        'reg_alpha': trial.suggest_float('reg_alpha', 0, 1),
+        'reg_lambda': trial.suggest_float('reg_lambda', 0, 1),
+    }
+
+
+class PruningCallback(xgb.callback.TrainingCallback):
+    """
+    Reports the validation RMSE every `report_every` boosting rounds and stops
+    pruned trials. Each report is a write to the study storage, so reporting
+    every round would cost more than pruning saves.
+    """
+
+    def __init__(self, trial, data_name='validation_0', metric='rmse', report_every=20):
+        self.trial = trial
+        self.data_name = data_name
+        self.metric = metric
+        self.report_every = report_every
+
+    def after_iteration(self, model, epoch, evals_log):
+        if epoch % self.report_every:
+            return False
+        self.trial.report(evals_log[self.data_name][self.metric][-1], epoch)
+        if self.trial.should_prune():
+            raise optuna.TrialPruned(f"Pruned at boosting round {epoch}")
+        return False
+
+
+def make_objective(X_train, y_train, X_val, y_val, threads=1, prune=True, seed=42):
+    """
+    Objective returning the validation MSE of one XGBoost model. The split's
+    matrices are built once here and shared by every trial.
+    """
+    cache = SplitCache(X_train, y_train, X_val, y_val, threads)
+
+    def objective(trial):
+        params = dict(suggest_params(trial), random_state=seed, eval_metric='rmse')
+        booster = train(params, cache, threads, callbacks=[PruningCallback(trial)] if prune else None)
+        return validation_mse(booster, cache)
+    return objective
+
+
+def data_fingerprint(*frames):
+    """Short hash of the training data, so a study is only resumed on the same data."""
+    digest = hashlib.sha256()
+    for frame in frames:
+        digest.update(pd.util.hash_pandas_object(pd.DataFrame(frame), index=False).to_numpy().tobytes())
+        digest.update(','.join(map(str, pd.DataFrame(frame).columns)).encode())
+    return digest.hexdigest()[:12]
+
+
+def open_storage(url):
+    """
+    Optuna storage for a URL. SQLite databases get a long busy timeout, since
+    several processes (see compositeBuilder.py) may write to one file at once.
+    """
+    if not url:
+        return None
+    if url.startswith('sqlite:///'):
+        os.makedirs(os.path.dirname(url[len('sqlite:///'):]) or '.', exist_ok=True)
+        return optuna.storages.RDBStorage(url, engine_kwargs={'connect_args': {'timeout': 60}})
+    return url
+
+
+def tune(name, X_train, y_train, X_val, y_val, trials=50, timeout=None, jobs=None, storage=DEFAULT_STORAGE,
+         fresh=False, prune=True, seed=42, threads=None):
+    """
+    Tune XGBoost hyperparameters for one model.
+
+    The study is named `<name>-<data fingerprint>`. Rerunning with the same data
+    loads it and only runs the trials still missing from `trials`, unless `fresh`
+    discards it first.
+
+    Args:
+        name (str): Model name, e.g. 'pem'
+        X_train, y_train, X_val, y_val: Tuning data, as in the original scripts
+        trials (int): Total finished (complete or pruned) trials wanted; 0 for no
+                      limit, with `timeout`
+        timeout (float, optional): Wall-clock budget in seconds for this run
+        jobs (int, optional): Parallel trials (default: every core)
+        storage (str, optional): Optuna storage URL, or None for an in-memory study
+        fresh (bool): Delete a stored study of the same name first
+        prune (bool): Prune trials on intermediate validation RMSE
+        seed (int): Sampler and model seed
+        threads (int, optional): XGBoost threads per trial (default: the cores
+                                 divided evenly between parallel trials)
+
+    Returns:
+        optuna.Study
+    """
+    if not trials and not timeout:
+        raise ValueError("Tuning needs a trial count, a timeout or both")
+    jobs, default_threads = split_threads(jobs)
+    threads = threads or default_threads
+    study_name = f'{name}-{data_fingerprint(X_train, y_train, X_val, y_val)}'
+    storage = open_storage(storage)
+    if storage and fresh:
+        try:
+            optuna.delete_study(study_name=study_name, storage=storage)
+        except KeyError:
+            pass
+
+    pruner = optuna.pruners.MedianPruner(n_startup_trials=5, n_warmup_steps=20) if prune \
+        else optuna.pruners.NopPruner()
+    study = optuna.create_study(study_name=study_name, storage=storage, direction='minimize',
+                                sampler=optuna.samplers.TPESampler(seed=seed), pruner=pruner, load_if_exists=True)
+    finished = [t for t in study.trials if t.state in (optuna.trial.TrialState.COMPLETE,
+                                                       optuna.trial.TrialState.PRUNED)]
+    remaining = max(trials - len(finished), 0) if trials else None
+    if finished:
+        print(f"Resuming study '{study_name}': {len(finished)} trial(s) already finished"
+              + (f", {remaining} to run" if remaining is not None else ''))
+    if remaining is None or remaining > 0:
+        before = len(study.trials)
+        study.optimize(make_objective(X_train, y_train, X_val, y_val, threads, prune, seed),
+                       n_trials=remaining, timeout=timeout, n_jobs=jobs)
+        ran = study.trials[before:]
+        instrumentation.count('optuna_trials', len(ran))
+        instrumentation.count('optuna_trials_pruned', sum(t.state == optuna.trial.TrialState.PRUNED for t in ran))
+    instrumentation.count('optuna_trials_resumed', len(finished))
+    return study
+
+
+def add_tuning_arguments(parser):
+    """The tuning options every SHAP weight script accepts."""
+    parser.add_argument('--trials', type=int, default=50,
+                        help='Total tuning trials, 0 for no limit with --timeout (default: 50)')
+    parser.add_argument('--timeout', type=float, help='Wall-clock tuning budget in seconds')
+    parser.add_argument('--jobs', type=int, help='Parallel trials (default: every core)')
+    parser.add_argument('--storage', type=str, default=DEFAULT_STORAGE,
+                        help=f"Optuna storage URL, or '' for in-memory (default: {DEFAULT_STORAGE})")
+    parser.add_argument('--fresh', action='store_true', help='Discard a stored study for the same data first')
+    parser.add_argument('--no-prune', action='store_true', help='Run every trial to completion')
+    return parser
+
+
+def tune_from_args(name, args, X_train, y_train, X_val, y_val):
+    """`tune` with the options added by add_tuning_arguments, reporting the result."""
+    start = time.perf_counter()
+    study = tune(name, X_train, y_train, X_val, y_val, trials=args.trials, timeout=args.timeout, jobs=args.jobs,
+                 storage=args.storage or None, fresh=args.fresh, prune=not args.no_prune)
+    states = pd.Series([t.state.name for t in study.trials]).value_counts().to_dict()
+    print(f"Tuned {name} in {time.perf_counter() - start:.1f}s: best MSE {study.best_value:.4f}; "
+          f"trials {states}")
+    return study
+
+
+def serial_baseline(X_train, y_train, X_val, y_val, trials=50, seed=42):
+    """The original loop: one in-memory study, one trial at a time, no pruning."""
+    def objective(trial):
+        model = xgb.XGBRegressor(**suggest_params(trial), random_state=seed, eval_metric='rmse',
+                                 early_stopping_rounds=10)
+        model.fit(X_train, y_train, eval_set=[(X_val, y_val)], verbose=False)
+        return float(np.mean((np.asarray(y_val) - model.predict(X_val)) ** 2))
+
+    study = optuna.create_study(direction='minimize', sampler=optuna.samplers.TPESampler(seed=seed))
+    study.optimize(objective, n_trials=trials)
+    return study
+
+
+if __name__ == "__main__":
+    from sklearn.model_selection import train_test_split
+    from columnStore import read_table
+
+    parser = argparse.ArgumentParser(description='Compare parallel pruned tuning with the serial 50-trial loop')
+    parser.add_argument('--games', type=str, default='data/merged_team_games.npz',
+                        help='Team-game table (default: data/merged_team_games.npz)')
+    parser.add_argument('--features', type=str, nargs='+', default=['AST%', 'BLK%', 'TOV%', 'TOV_team%', 'STL%'],
+                        help='Model inputs (default: the PEM inputs)')
+    parser.add_argument('--target', type=str, default='Point_Differential', help='Model target')
+    parser.add_argument('--output', type=str, help='Also write the results as JSON')
+    add_tuning_arguments(parser)
+    args = parser.parse_args()
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+
+    df = read_table(args.games, args.features + [args.target])
+    X_train, X_test, y_train, y_test = train_test_split(df[args.features], df[args.target], test_size=0.2,
+                                                        random_state=42)
+    X_tr, X_val, y_tr, y_val = train_test_split(X_train, y_train, test_size=0.2, random_state=42)
+
+    start = time.perf_counter()
+    serial = serial_baseline(X_tr, y_tr, X_val, y_val, args.trials)
+    serial_s = time.perf_counter() - start
+    print(f"Serial loop: {serial_s:.1f}s, best MSE {serial.best_value:.4f}")
+
+    start = time.perf_counter()
+    # Always a fresh study, so stored trials do not flatter the timing
+    tuned = tune('benchmark', X_tr, y_tr, X_val, y_val, trials=args.trials, timeout=args.timeout, jobs=args.jobs,
+                 storage=args.storage or None, fresh=True, prune=not args.no_prune)
+    tuned_s = time.perf_counter() - start
+    pruned = sum(t.state == optuna.trial.TrialState.PRUNED for t in tuned.trials)
+    print(f"Tuned: {tuned_s:.1f}s with {args.jobs or os.cpu_count()} parallel trial(s), {pruned} of "
+          f"{len(tuned.trials)} pruned, best MSE {tuned.best_value:.4f}")
+    print(f"Speedup {serial_s / tuned_s:.2f}x; best MSE {tuned.best_value / serial.best_value - 1:+.2%} "
+          f"relative to the serial loop")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'cores': os.cpu_count(), 'jobs': args.jobs or os.cpu_count(), 'trials': args.trials,
+                       'serial_seconds': serial_s, 'serial_best_mse': serial.best_value,
+                       'tuned_seconds': tuned_s, 'tuned_best_mse': tuned.best_value, 'pruned': pruned,
+                       'speedup': serial_s / tuned_s}, f, indent=1)
+        print(f"Results saved to {args.output}")
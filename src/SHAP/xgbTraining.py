@@ -0,0 +1,192 @@
+"""
+XGBoost training on quantized matrices built once per data split.
+
+XGBRegressor.fit converts and quantizes its pandas input on every call, so each
+tuning trial re-did the same work on X_train_optuna and X_val_optuna.
+SplitCache builds the training QuantileDMatrix once, builds the validation
+matrix against the training bins, and keeps the raw validation array for
+predictions. `train` then runs the native API with the `hist` method, taking
+XGBRegressor-style parameters (as suggested by tuning.suggest_params).
+Results match XGBRegressor with the same parameters.
+
+Threads are set explicitly: `split_threads` divides the cores between
+parallel trials and the threads each trial's trees use, so parallel trials
+do not each start one thread per core.
+"""
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+import argparse
+import json
+import os
+import sys
+import time
+
+# XGBRegressor argument -> native parameter
+NATIVE_NAMES = {'learning_rate': 'eta', 'reg_alpha': 'alpha', 'reg_lambda': 'lambda', 'random_state': 'seed',
+                'n_jobs': 'nthread'}
+
+
+def split_threads(jobs=None, cores=None):
+    """
+    (parallel trials, threads per trial) for `cores` cores. By default every
+    core runs its own trial with one thread.
+    """
+    cores = cores or os.cpu_count() or 1
+    jobs = max(1, jobs or cores)
+    return jobs, max(1, cores // jobs)
+
+
+class SplitCache:
+    """Training and validation matrices of one fixed split, built once."""
+
+    def __init__(self, X_train, y_train, X_val, y_val, threads=None, max_bin=256):
+        self.threads = threads or os.cpu_count() or 1
+        self.max_bin = max_bin
+        self.dtrain = xgb.QuantileDMatrix(X_train, y_train, nthread=self.threads, max_bin=max_bin)
+        self.dval = xgb.QuantileDMatrix(X_val, y_val, nthread=self.threads, max_bin=max_bin, ref=self.dtrain)
+        self.X_val = np.asarray(X_val, dtype=np.float32)
+        self.y_val = np.asarray(y_val, dtype=float)
+
+
+def native_params(params, threads=1):
+    """Split XGBRegressor-style parameters into (native params, boosting rounds)."""
+    params = dict(params)
+    rounds = params.pop('n_estimators', 100)
+    native = {'objective': 'reg:squarederror', 'tree_method': 'hist', 'nthread': threads}
+    native.update({NATIVE_NAMES.get(name, name): value for name, value in params.items()})
+    return native, rounds
+
+
+def train(params, cache, threads=1, early_stopping_rounds=10, callbacks=None, eval_name='validation_0'):
+    """
+    Train a booster on a SplitCache, evaluating on its validation matrix.
+
+    Args:
+        params (dict): XGBRegressor-style parameters, e.g. from suggest_params,
+                       with eval_metric and random_state if wanted
+        cache (SplitCache): Matrices to train and evaluate on
+        threads (int): Threads for this model's trees
+        early_stopping_rounds (int, optional): Stop after this many rounds
+                                               without improvement
+        callbacks (list, optional): xgboost.callback.TrainingCallback objects
+        eval_name (str): Name of the validation set in the evaluation log (the
+                         name XGBRegressor gives its first eval_set)
+
+    Returns:
+        xgboost.Booster
+    """
+    native, rounds = native_params(params, threads)
+    return xgb.train(native, cache.dtrain, num_boost_round=rounds, evals=[(cache.dval, eval_name)],
+                     early_stopping_rounds=early_stopping_rounds, callbacks=callbacks, verbose_eval=False)
+
+
+def predict_val(booster, cache):
+    """Validation predictions up to the best iteration, as XGBRegressor.predict gives."""
+    best = getattr(booster, 'best_iteration', None)
+    iteration_range = (0, best + 1) if best is not None else (0, 0)
+    return booster.inplace_predict(cache.X_val, iteration_range=iteration_range)
+
+
+def validation_mse(booster, cache):
+    return float(np.mean((cache.y_val - predict_val(booster, cache)) ** 2))
+
+
+def synthetic_copy(X, y, factor, seed=42):
+    """
+    `factor` stacked copies of X and y, each row jittered by 1% of its
+    column's standard deviation so the copies are not exact duplicates.
+    """
+    rng = np.random.default_rng(seed)
+    values = np.tile(X.to_numpy(dtype=float), (factor, 1))
+    values += rng.normal(0, 0.01, values.shape) * np.nan_to_num(X.std().to_numpy())
+    return pd.DataFrame(values, columns=X.columns), pd.Series(np.tile(np.asarray(y, dtype=float), factor),
+                                                              name=getattr(y, 'name', None))
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from sklearn.model_selection import train_test_split
+    from columnStore import read_table
+    from tuning import suggest_params
+    import optuna
+
+    class TimedRegressor(xgb.XGBRegressor):
+        """XGBRegressor that adds the time fit spends building its matrices to `matrix_seconds`."""
+        matrix_seconds = 0.0
+
+        def _create_dmatrix(self, ref, **kwargs):
+            start = time.perf_counter()
+            try:
+                return super()._create_dmatrix(ref, **kwargs)
+            finally:
+                TimedRegressor.matrix_seconds += time.perf_counter() - start
+
+    # The hook is private to xgboost; without it the old path's matrix time is not measured
+    timed = hasattr(xgb.XGBRegressor, '_create_dmatrix')
+
+    parser = argparse.ArgumentParser(description='Per-trial overhead of XGBRegressor.fit vs cached native training')
+    parser.add_argument('--games', type=str, default='data/merged_team_games.npz',
+                        help='Team-game table (default: data/merged_team_games.npz)')
+    parser.add_argument('--features', type=str, nargs='+', default=['AST%', 'BLK%', 'TOV%', 'TOV_team%', 'STL%'],
+                        help='Model inputs (default: the PEM inputs)')
+    parser.add_argument('--target', type=str, default='Point_Differential', help='Model target')
+    parser.add_argument('--trials', type=int, default=10, help='Trials timed per data size (default: 10)')
+    parser.add_argument('--scale', type=int, nargs='+', default=[1, 100],
+                        help='Data sizes as multiples of the table (default: 1 100)')
+    parser.add_argument('--max-rounds', type=int, default=500,
+                        help='Cap on sampled n_estimators, to keep large scales short (default: 500)')
+    parser.add_argument('--jobs', type=int, help='Parallel trials the threads are split for (default: every core)')
+    parser.add_argument('--output', type=str, help='Also write the results as JSON')
+    args = parser.parse_args()
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+
+    df = read_table(args.games, args.features + [args.target]).dropna()
+    jobs, threads = split_threads(args.jobs)
+    sampler = optuna.create_study(sampler=optuna.samplers.RandomSampler(seed=42))
+    trial_params = []
+    for _ in range(args.trials):
+        params = suggest_params(sampler.ask())
+        params['n_estimators'] = min(params['n_estimators'], args.max_rounds)
+        trial_params.append(dict(params, random_state=42, eval_metric='rmse'))
+
+    results = {'cores': os.cpu_count(), 'jobs': jobs, 'threads': threads, 'trials': args.trials, 'scales': {}}
+    for factor in args.scale:
+        X, y = synthetic_copy(df[args.features], df[args.target], factor) if factor > 1 \
+            else (df[args.features], df[args.target])
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+        X_tr, X_val, y_tr, y_val = train_test_split(X_train, y_train, test_size=0.2, random_state=42)
+
+        TimedRegressor.matrix_seconds = 0.0
+        start = time.perf_counter()
+        before_mse = []
+        for params in trial_params:
+            model = TimedRegressor(**params, early_stopping_rounds=10, n_jobs=threads)
+            model.fit(X_tr, y_tr, eval_set=[(X_val, y_val)], verbose=False)
+            before_mse.append(float(np.mean((np.asarray(y_val) - model.predict(X_val)) ** 2)))
+        before_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        cache = SplitCache(X_tr, y_tr, X_val, y_val, threads)
+        build_s = time.perf_counter() - start
+        after_mse = [validation_mse(train(params, cache, threads), cache) for params in trial_params]
+        after_s = time.perf_counter() - start
+        # Matrix construction is the per-trial overhead XGBRegressor.fit repeats
+        overhead_before = TimedRegressor.matrix_seconds / args.trials if timed else None
+        overhead_after = build_s / args.trials
+
+        difference = max(abs(a - b) / b for a, b in zip(after_mse, before_mse))
+        results['scales'][factor] = {'rows': len(X_tr), 'before_seconds': before_s, 'after_seconds': after_s,
+                                     'matrix_seconds': build_s,
+                                     'overhead_per_trial_before': overhead_before,
+                                     'overhead_per_trial_after': overhead_after,
+                                     'max_relative_mse_difference': difference}
+        built = f"{overhead_before:.3f}s/trial" if timed else "not measured"
+        print(f"{factor}x ({len(X_tr)} training rows): XGBRegressor {before_s / args.trials:.3f}s/trial, "
+              f"cached native {after_s / args.trials:.3f}s/trial ({before_s / after_s:.2f}x); matrix build "
+              f"{built} in XGBRegressor.fit, {build_s:.3f}s once cached; largest MSE difference {difference:.2e}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+        print(f"Results saved to {args.output}")
@@ -0,0 +1,248 @@
+"""
+Single entry point for the prediction pipeline.
+
+    bbpredict [--root DIR] <command> [command options]
+
+Each command runs one of the pipeline scripts as if it were started with
+`python <script>`, so a command only imports the libraries its own script
+needs. Scripts read and write paths relative to the project root; `--root`
+(default: the checkout this file lives in) selects it, so bbpredict works from
+any working directory. Path arguments given relative to the caller's directory
+are resolved before switching to the root.
+
+Every command runs inside an instrumentation.StageRun, which appends its time,
+memory, row counts and counters to output/metrics/stages.jsonl; `--profile`
+also profiles it. These options are passed on to the commands a command
+starts (the pipeline's stages) through environment variables.
+"""
+import argparse
+import os
+import re
+import runpy
+import subprocess
+import sys
+
+import instrumentation
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# command -> (script relative to the project root, help text, needs the ML stack)
+COMMANDS = {
+    'ingest': ('src/streamIngest.py', 'Stream raw game files into per-season partitions', False),
+    'features': ('src/featureEngineering.py', 'Opponent columns, Win, Possessions and rate columns', False),
+    'averages': ('src/teamAggregates.py', 'Per-team stat averages, optionally split by home/away or month', False),
+    'form': ('src/teamForm.py', 'Leak-free rolling and EWM team-form features', False),
+    'composites': ('src/SHAP/compositeBuilder.py', 'SHAP-weighted eFG%, PEM and REBF plus NRtg and WinPct', True),
+    'raptor': ('src/SHAP/RaptorV1.py', 'SHAP-weighted Raptor_Score', True),
+    'bootstrap': ('src/SHAP/bootstrapWeights.py', 'Bootstrap intervals for SHAP weights and region ranks', True),
+    'tune-benchmark': ('src/SHAP/tuning.py', 'Parallel pruned tuning vs the serial 50-trial loop', True),
+    'train-benchmark': ('src/SHAP/xgbTraining.py', 'Trial time of XGBRegressor.fit vs cached native training', True),
+    'shap-benchmark': ('src/SHAP/shapWeights.py', 'SHAP weight engine vs shap.Explainer: time and weights', True),
+    'elo': ('src/eloEngine.py', 'Elo ratings from team-game rows', False),
+    'elo-state': ('src/eloCheckpoint.py', 'Incremental, checkpointed Elo ratings', False),
+    'elo-sweep': ('src/eloSweep.py', 'Elo parameter sweep', False),
+    'rank': ('src/rankingBuilder.py', 'Region rankings from any score sources', False),
+    'predict': ('src/predictwinners.py', 'Matchup win probabilities', False),
+    'matrix': ('src/probabilityMatrix.py', 'All-pairs probability matrix', False),
+    'simulate': ('src/tournamentSim.py', 'Monte Carlo tournament odds', False),
+    'serve': ('src/predictionServer.py', 'Local prediction server', False),
+    'significance': ('src/AI.py', 'XGBoost feature significance', True),
+    'pipeline': ('src/pipelineDag.py', 'Run stages in dependency order with cached outputs', False),
+    'synthetic': ('src/syntheticSeason.py', 'Synthetic seasons shaped like the raw game file', False),
+    'benchmark': ('src/benchmarkSuite.py', 'Time and peak memory of every stage at 1x/10x/100x synthetic data', False),
+    'metrics': ('src/instrumentation.py', 'Recorded time, memory, rows and counters of the last run', False),
+}
+
+# Libraries that commands marked as not needing the ML stack must never import
+HEAVY_MODULES = ('shap', 'optuna', 'xgboost', 'sklearn')
+
+_PATH_SUFFIX = re.compile(r'\.[A-Za-z][A-Za-z0-9]*$')
+
+
+def _absolutize_paths(args, cwd):
+    """
+    Resolve arguments that look like paths against the caller's directory.
+
+    An argument is treated as a path when it exists relative to `cwd`, or contains
+    a path separator, or ends in a file extension such as .csv or .json; in a
+    NAME=PATH value only the path part is resolved. Option names, numbers, URLs and
+    team names are left unchanged.
+    """
+    resolved = []
+    for arg in args:
+        value = arg
+        prefix = ''
+        if arg.startswith('-'):
+            if '=' not in arg:
+                resolved.append(arg)
+                continue
+            prefix, _, value = arg.partition('=')
+            prefix += '='
+        if '://' in value:
+            # URLs such as the Optuna storage sqlite:///data/optuna.db
+            resolved.append(arg)
+            continue
+        name, sep, location = value.partition('=')
+        if sep and os.sep not in name:
+            # NAME=PATH specifications such as rankingBuilder's --source
+            prefix += name + sep
+            value = location
+        looks_like_path = (os.path.exists(os.path.join(cwd, value)) or os.sep in value
+                           or bool(_PATH_SUFFIX.search(value)))
+        if value and looks_like_path and not os.path.isabs(value):
+            value = os.path.normpath(os.path.join(cwd, value))
+        resolved.append(prefix + value)
+    return resolved
+
+
+def run_command(command, args, root=PROJECT_ROOT):
+    """
+    Run a pipeline script in this process with the project root as working directory.
+    """
+    script = os.path.join(root, COMMANDS[command][0])
+    args = _absolutize_paths(args, os.getcwd())
+    os.chdir(root)
+    sys.argv = [script] + args
+    # Same import path as `python <script>`: the script's own directory comes first
+    sys.path.insert(0, os.path.dirname(script))
+    runpy.run_path(script, run_name='__main__')
+
+
+def _import_statements(script):
+    """Source of the top-level import statements (including guarded ones) of a script."""
+    import ast
+
+    with open(script) as f:
+        source = f.read()
+    tree = ast.parse(source)
+    nodes = [node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom, ast.Try))]
+    nodes = [node for node in nodes if not isinstance(node, ast.Try)
+             or any(isinstance(child, (ast.Import, ast.ImportFrom)) for child in node.body)]
+    return '\n'.join(ast.get_source_segment(source, node) for node in nodes)
+
+
+def import_time_report(command, root=PROJECT_ROOT):
+    """
+    Measure what a command imports with `python -X importtime`.
+
+    Only the script's top-level import statements are executed, so nothing is
+    read or written.
+
+    Returns:
+        dict: total_seconds, the set of top-level packages imported, and the slowest
+              top-level imports as (package, cumulative seconds) pairs
+    """
+    script = os.path.join(root, COMMANDS[command][0])
+    # The script's directory first, as for `python <script>`; src/ too, which the SHAP scripts add themselves
+    code = (f"import sys\nsys.path.insert(0, {os.path.join(root, 'src')!r})\n"
+            f"sys.path.insert(0, {os.path.dirname(script)!r})\n" + _import_statements(script))
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                               capture_output=True, text=True, cwd=root)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Imports for '{command}' failed:\n{completed.stderr[-2000:]}")
+
+    total_us = 0
+    packages = set()
+    top_level = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        total_us += int(self_us)
+        packages.add(name.strip().split('.')[0])
+        # Top-level imports are the ones with no extra indentation
+        if name.startswith(' ') and not name.startswith('  '):
+            top_level.append((name.strip(), int(cumulative_us) / 1e6))
+    top_level.sort(key=lambda item: item[1], reverse=True)
+    return {'total_seconds': total_us / 1e6, 'packages': packages, 'slowest': top_level[:10]}
+
+
+def importtime_main(argv):
+    """`bbpredict importtime`: import-time regression check for one or all commands"""
+    parser = argparse.ArgumentParser(prog='bbpredict importtime',
+                                     description='Report import time per command and fail on regressions')
+    parser.add_argument('commands', nargs='*', help='Commands to check (default: all)')
+    parser.add_argument('--budget', type=float, default=1.0,
+                        help='Maximum import seconds for commands that do not need the ML stack (default: 1.0)')
+    parser.add_argument('--verbose', action='store_true', help='List the slowest imports of each command')
+    parser.add_argument('--root', type=str, default=PROJECT_ROOT, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    failures = []
+    print(f"{'command':<18} {'import s':>9}  notes")
+    for command in args.commands or COMMANDS:
+        report = import_time_report(command, args.root)
+        heavy = COMMANDS[command][2]
+        notes = []
+        if not heavy:
+            leaked = sorted(set(HEAVY_MODULES) & report['packages'])
+            if leaked:
+                notes.append(f"imports {', '.join(leaked)}")
+            if report['total_seconds'] > args.budget:
+                notes.append(f"over {args.budget:.2f}s budget")
+            if notes:
+                failures.append(command)
+        print(f"{command:<18} {report['total_seconds']:>9.3f}  {'; '.join(notes) or ('ML stack' if heavy else 'ok')}")
+        if args.verbose:
+            for name, seconds in report['slowest']:
+                print(f"{'':<20}{seconds:>7.3f}  {name}")
+
+    if failures:
+        print(f"\nImport-time check failed for: {', '.join(failures)}")
+        return 1
+    return 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = argparse.ArgumentParser(
+        prog='bbpredict',
+        description='Basketball prediction pipeline',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='commands:\n' + '\n'.join(f"  {name:<18} {info[1]}" for name, info in COMMANDS.items())
+               + '\n  importtime         Import-time report and regression check',
+    )
+    parser.add_argument('--root', type=str, default=os.environ.get('BBPREDICT_ROOT', PROJECT_ROOT),
+                        help='Project root holding data/ and output/ (default: this checkout)')
+    parser.add_argument('--metrics', type=str, default=os.environ.get('BBPREDICT_METRICS'),
+                        help=f"File the run's metrics are appended to, '' to disable "
+                             f"(default: <root>/{instrumentation.DEFAULT_METRICS})")
+    parser.add_argument('--profile', action='store_true', default=bool(os.environ.get('BBPREDICT_PROFILE')),
+                        help='Profile the command and print its hot spots')
+    parser.add_argument('--profiler', type=str, choices=instrumentation.PROFILERS,
+                        default=os.environ.get('BBPREDICT_PROFILE') or 'cprofile',
+                        help='cprofile (every call) or sample (stack samples, lower overhead) (default: cprofile)')
+    parser.add_argument('--profile-dir', type=str, default=os.environ.get('BBPREDICT_PROFILE_DIR'),
+                        help=f'Where profiles are written (default: <root>/{instrumentation.DEFAULT_PROFILE_DIR})')
+    parser.add_argument('--profile-interval', type=float,
+                        default=float(os.environ.get('BBPREDICT_PROFILE_INTERVAL', 0.005)),
+                        help='Seconds between stack samples with --profile sample (default: 0.005)')
+    parser.add_argument('--trace-memory', action='store_true', default=bool(os.environ.get('BBPREDICT_TRACE_MEMORY')),
+                        help='Also record the tracemalloc peak (slows allocation-heavy stages)')
+    parser.add_argument('command', choices=list(COMMANDS) + ['importtime'], metavar='command')
+    parser.add_argument('args', nargs=argparse.REMAINDER, help='Options passed to the command')
+    args = parser.parse_args(argv)
+
+    if args.command == 'importtime':
+        return importtime_main(args.args + ['--root', args.root])
+    root = os.path.abspath(args.root)
+    metrics = os.path.join(root, instrumentation.DEFAULT_METRICS) if args.metrics is None \
+        else os.path.abspath(args.metrics) if args.metrics else None
+    profile_dir = os.path.abspath(args.profile_dir or os.path.join(root, instrumentation.DEFAULT_PROFILE_DIR))
+    # Commands started by this one (pipeline stages) record and profile the same way
+    os.environ['BBPREDICT_METRICS'] = metrics or ''
+    os.environ['BBPREDICT_PROFILE_DIR'] = profile_dir
+    os.environ['BBPREDICT_PROFILE_INTERVAL'] = str(args.profile_interval)
+    if args.profile:
+        os.environ['BBPREDICT_PROFILE'] = args.profiler
+    if args.trace_memory:
+        os.environ['BBPREDICT_TRACE_MEMORY'] = '1'
+
+    with instrumentation.StageRun(args.command, args.args, metrics, args.profile and args.profiler, profile_dir,
+                                  args.profile_interval, args.trace_memory):
+        run_command(args.command, args.args, root)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
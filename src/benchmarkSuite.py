@@ -0,0 +1,258 @@
+"""
+Scaling benchmarks for the pipeline stages on synthetic seasons.
+
+For each scale the suite generates that many seasons of synthetic games
+(syntheticSeason.py) in a scratch project root, then runs the stages in
+pipeline order, each as its own process, as `bbpredict` would. Each stage gets
+its wall time, CPU time and peak resident memory (from the process's own
+rusage, so one stage's peak does not hide another's). A child's peak starts
+from the parent's at exec, so the suite itself loads no data: generating the
+games and preparing stage inputs also run in child processes. Results are
+written as JSON together with the commit and machine they were measured on.
+`--compare` reports the ratio to an earlier result file and fails on
+regressions.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from bbpredict import COMMANDS, PROJECT_ROOT
+
+DEFAULT_OUTPUT_DIR = 'output/benchmarks'
+
+
+@dataclass
+class BenchStage:
+    """
+    One timed step: a bbpredict command and its arguments, run in the scratch
+    root. `prepare(root, settings)` runs first, untimed, to write any input
+    the command needs that an earlier stage does not.
+    """
+    name: str
+    command: str
+    args: Callable
+    prepare: Callable = None
+
+
+def _merged_csv(root, settings):
+    # The raw file joined to its regions: the input layout featureEngineering.py expects
+    import pandas as pd
+    from columnStore import write_table
+    games = pd.read_csv(os.path.join(root, 'data/games_synthetic.csv'), na_values=['NA'])
+    regions = pd.read_csv(os.path.join(root, 'data/team_region_groups.csv'), sep='\t')
+    write_table(games.merge(regions, on='team', how='left'), os.path.join(root, 'data/merged_team_games.csv'))
+
+
+def _matchups(root, settings):
+    import numpy as np
+    import pandas as pd
+    teams = pd.read_csv(os.path.join(root, 'data/team_region_groups.csv'), sep='\t')['team'].to_numpy()
+    rng = np.random.default_rng(settings['seed'])
+    n = settings['matchups']
+    pd.DataFrame({'team1': rng.choice(teams, n), 'team2': rng.choice(teams, n)}).to_csv(
+        os.path.join(root, 'data/matchups.csv'), index=False)
+
+
+def _significance_csv(root, settings):
+    # AI.py uses every column but the target as a feature, so it gets the numeric ones
+    from columnStore import read_table
+    df = read_table(os.path.join(root, 'data/merged_team_games.npz'))
+    numeric = df.select_dtypes('number').drop(columns=['team_score', 'opponent_team_score', 'Point_Differential',
+                                                       'numwins'], errors='ignore')
+    numeric.dropna().to_csv(os.path.join(root, 'data/significance.csv'), index=False)
+
+
+def _tuning(settings):
+    return ['--trials', str(settings['trials']), '--storage', '', '--shap-cache', '']
+
+
+STAGES = [
+    BenchStage('ingest', 'ingest', lambda s: ['data/games_synthetic.csv', '--output-dir', 'data/seasons']),
+    BenchStage('features', 'features', lambda s: ['--input', 'data/merged_team_games.csv',
+                                                  '--output', 'data/merged_team_games.npz'], _merged_csv),
+    BenchStage('averages', 'averages', lambda s: ['--rebuild']),
+    BenchStage('elo', 'elo', lambda s: ['--games', 'data/merged_team_games.npz',
+                                        '--output', 'data/merged_team_games_with_elo.npz']),
+    BenchStage('composite-efg', 'composites', lambda s: ['--only', 'efg'] + _tuning(s)),
+    BenchStage('composite-pem', 'composites', lambda s: ['--only', 'pem'] + _tuning(s)),
+    BenchStage('composite-rebf', 'composites', lambda s: ['--only', 'rebf'] + _tuning(s)),
+    BenchStage('composite-nrtg-winpct', 'composites', lambda s: ['--only', 'nrtg', '--only', 'winpct']),
+    BenchStage('raptor', 'raptor', _tuning),
+    BenchStage('rank-shap', 'rank', lambda s: ['--source', 'Avg RaptorScore=data/SHAP/RaptorMerged.npz:Raptor_Score',
+                                               '--output', 'output/shapRankings.csv']),
+    BenchStage('elo-rank', 'rank', lambda s: ['--source', 'elo=data/merged_team_games_with_elo.npz:final_elo',
+                                              '--output', 'output/eloRankings.csv']),
+    BenchStage('predict', 'predict', lambda s: ['--batch', 'data/matchups.csv', '--output', 'output/predictions.csv'],
+               _matchups),
+    BenchStage('significance', 'significance',
+               lambda s: ['data/significance.csv', '--mode', 'fast', '--permutations', str(s['permutations']),
+                          '--output', 'output/significance.csv', '--plot', 'output/significance.png'],
+               _significance_csv),
+]
+
+
+def measure(command, root, log_path):
+    """
+    Run a command in `root` and measure it.
+
+    Returns:
+        dict: seconds, cpu_seconds, peak_rss_mb, returncode and log
+    """
+    env = dict(os.environ, MPLBACKEND='Agg')
+    with open(log_path, 'w') as log:
+        start = time.perf_counter()
+        process = subprocess.Popen(command, cwd=root, stdout=log, stderr=subprocess.STDOUT, env=env)
+        # wait4 gives this child's own rusage; ru_maxrss is KB on Linux and bytes on macOS
+        _, status, usage = os.wait4(process.pid, 0)
+        seconds = time.perf_counter() - start
+    peak = usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    return {'seconds': seconds, 'cpu_seconds': usage.ru_utime + usage.ru_stime, 'peak_rss_mb': peak,
+            'returncode': os.waitstatus_to_exitcode(status), 'log': log_path}
+
+
+def run_stage(stage, root, settings, log_dir):
+    """Prepare (in a child process, untimed) and run one stage in its own process."""
+    if stage.prepare:
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--prepare', stage.name, '--root', root,
+                        '--settings', json.dumps(settings)], check=True)
+    script = os.path.join(PROJECT_ROOT, COMMANDS[stage.command][0])
+    return measure([sys.executable, script] + stage.args(settings), root, os.path.join(log_dir, f'{stage.name}.log'))
+
+
+def run_scale(scale, settings, stages, work_dir):
+    """Generate `scale` seasons in a scratch root and run the stages on them."""
+    root = os.path.join(work_dir, f'{scale}x')
+    shutil.rmtree(root, ignore_errors=True)
+    for sub in ('data', 'output', 'logs'):
+        os.makedirs(os.path.join(root, sub), exist_ok=True)
+
+    generated = measure([sys.executable, os.path.join(PROJECT_ROOT, COMMANDS['synthetic'][0]),
+                         '--teams', str(settings['teams']), '--games-per-team', str(settings['games_per_team']),
+                         '--seasons', str(scale), '--seed', str(settings['seed']),
+                         '--output', 'data/games_synthetic.csv', '--regions', 'data/team_region_groups.csv'],
+                        root, os.path.join(root, 'logs', 'generate.log'))
+    if generated['returncode']:
+        raise RuntimeError(f"Generating {scale} season(s) failed; see {generated['log']}")
+    rows = 2 * (settings['teams'] // 2) * settings['games_per_team'] * scale
+    result = {'seasons': scale, 'rows': rows, 'generate': generated, 'stages': {}}
+    print(f"{scale}x: {rows} rows ({scale} season(s)) generated in {generated['seconds']:.1f}s")
+
+    for stage in stages:
+        measured = run_stage(stage, root, settings, os.path.join(root, 'logs'))
+        result['stages'][stage.name] = measured
+        status = 'ok' if measured['returncode'] == 0 else f"FAILED ({measured['returncode']}), see {measured['log']}"
+        print(f"  {stage.name:<22} {measured['seconds']:>9.2f}s {measured['peak_rss_mb']:>9.0f} MB  {status}")
+    return result
+
+
+def git_revision():
+    """(commit, whether the worktree has uncommitted changes), or (None, None) outside git."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=PROJECT_ROOT, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=PROJECT_ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def compare(results, baseline, tolerance=1.2, min_seconds=1.0):
+    """
+    Ratio of every stage's time and peak memory to a baseline result file.
+    Stages that took under `min_seconds` in the baseline are too noisy for their
+    time to count as a regression.
+
+    Returns:
+        list: (scale, stage, metric, ratio) for each ratio above `tolerance`
+    """
+    regressions = []
+    print(f"Compared with {baseline.get('commit') or 'unknown commit'} ({baseline.get('timestamp')}):")
+    for scale, result in results['scales'].items():
+        old_scale = baseline['scales'].get(scale)
+        if not old_scale:
+            continue
+        for name, measured in result['stages'].items():
+            old = old_scale['stages'].get(name)
+            if not old or old['returncode'] or measured['returncode']:
+                continue
+            ratios = {metric: measured[metric] / old[metric] for metric in ('seconds', 'peak_rss_mb') if old[metric]}
+            flags = [metric for metric, ratio in ratios.items() if ratio > tolerance
+                     and (metric != 'seconds' or old['seconds'] >= min_seconds)]
+            regressions += [(scale, name, metric, ratios[metric]) for metric in flags]
+            print(f"  {scale:>4}x {name:<22} time {ratios.get('seconds', float('nan')):>5.2f}x  "
+                  f"memory {ratios.get('peak_rss_mb', float('nan')):>5.2f}x{'  REGRESSION' if flags else ''}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Time and peak memory of every stage on synthetic seasons')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100],
+                        help='Data sizes in seasons (default: 1 10 100)')
+    parser.add_argument('--stages', type=str, nargs='+', choices=[stage.name for stage in STAGES],
+                        help='Stages to run, in pipeline order (default: all); later stages need the outputs '
+                             'of earlier ones')
+    parser.add_argument('--teams', type=int, default=350, help='Teams (default: 350)')
+    parser.add_argument('--games-per-team', type=int, default=30, help='Games per team per season (default: 30)')
+    parser.add_argument('--trials', type=int, default=10, help='Tuning trials per SHAP model (default: 10)')
+    parser.add_argument('--permutations', type=int, default=20,
+                        help='Permutations for the significance stage (default: 20)')
+    parser.add_argument('--matchups', type=int, default=10000, help='Matchups in the prediction batch (default: 10000)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
+    parser.add_argument('--work-dir', type=str, default=os.path.join(DEFAULT_OUTPUT_DIR, 'work'),
+                        help=f'Scratch roots, one per scale (default: {DEFAULT_OUTPUT_DIR}/work)')
+    parser.add_argument('--keep', action='store_true', help='Keep the scratch roots')
+    parser.add_argument('--output', type=str,
+                        help=f'Result file (default: {DEFAULT_OUTPUT_DIR}/<commit>-<time>.json)')
+    parser.add_argument('--compare', type=str, metavar='BASELINE', help='Earlier result file to compare with')
+    parser.add_argument('--tolerance', type=float, default=1.2,
+                        help='Ratio above which --compare reports a regression (default: 1.2)')
+    parser.add_argument('--min-seconds', type=float, default=1.0,
+                        help='Stages faster than this in the baseline are not checked for time (default: 1.0)')
+    # Used by the suite itself to prepare a stage's inputs in a child process
+    parser.add_argument('--prepare', type=str, help=argparse.SUPPRESS)
+    parser.add_argument('--root', type=str, help=argparse.SUPPRESS)
+    parser.add_argument('--settings', type=str, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.prepare:
+        next(stage for stage in STAGES if stage.name == args.prepare).prepare(args.root, json.loads(args.settings))
+        sys.exit(0)
+
+    stages = [stage for stage in STAGES if not args.stages or stage.name in args.stages]
+    settings = {'teams': args.teams, 'games_per_team': args.games_per_team, 'trials': args.trials,
+                'permutations': args.permutations, 'matchups': args.matchups, 'seed': args.seed}
+    work_dir = os.path.abspath(args.work_dir)
+    commit, dirty = git_revision()
+    results = {'commit': commit, 'dirty': dirty, 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+               'python': platform.python_version(), 'platform': platform.platform(), 'cores': os.cpu_count(),
+               'settings': settings, 'scales': {}}
+    for scale in args.scales:
+        results['scales'][str(scale)] = run_scale(scale, settings, stages, work_dir)
+    failed = [name for result in results['scales'].values() for name, measured in result['stages'].items()
+              if measured['returncode']]
+    if failed:
+        print(f"{len(failed)} stage run(s) failed; logs kept under {work_dir}")
+    elif not args.keep:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = args.output or os.path.join(DEFAULT_OUTPUT_DIR,
+                                         f"{(commit or 'nogit')[:10]}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=1)
+    print(f"Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.min_seconds)
+        if regressions:
+            print(f"{len(regressions)} regression(s) above {args.tolerance:.2f}x")
+            sys.exit(1)
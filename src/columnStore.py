@@ -0,0 +1,259 @@
+import numpy as np
+import pandas as pd
+import argparse
+import json
+import os
+import time
+
+import instrumentation
+
+# Storage format by file extension. .npz is the default for pipeline intermediates;
+# .parquet needs pyarrow (or fastparquet); .csv is tab-separated like every other
+# table in data/ and output/.
+FORMATS = {'.npz': 'npz', '.parquet': 'parquet', '.csv': 'csv'}
+
+
+def table_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in FORMATS:
+        raise ValueError(f"Unsupported table format '{ext}' for {path}; use one of {', '.join(FORMATS)}")
+    return FORMATS[ext]
+
+
+def resolve_table(path):
+    """
+    The path itself if it exists, else a sibling with the same name in another format.
+
+    This lets a stage that reads `RaptorMerged.npz` start from a checked-in
+    `RaptorMerged.csv` before any stage has written the binary version.
+    """
+    if os.path.exists(path):
+        return path
+    stem = os.path.splitext(path)[0]
+    for ext in FORMATS:
+        if os.path.exists(stem + ext):
+            return stem + ext
+    return path
+
+
+def _encode_column(series, key):
+    """Arrays and schema entry for one column."""
+    dtype = series.dtype
+    if isinstance(dtype, np.dtype) and dtype.kind in 'biufcmM':
+        return {key: series.to_numpy()}, {'kind': 'array', 'dtype': str(dtype)}
+
+    if not isinstance(dtype, pd.CategoricalDtype) and dtype != object \
+            and pd.api.types.is_extension_array_dtype(dtype) and hasattr(dtype, 'numpy_dtype'):
+        # Nullable Int64 / Float64 / boolean: values plus a missing-value mask
+        mask = series.isna().to_numpy()
+        values = series.to_numpy(dtype=dtype.numpy_dtype, na_value=0)
+        return {key: values, f'{key}_mask': mask}, {'kind': 'masked', 'dtype': str(dtype)}
+
+    inferred = pd.api.types.infer_dtype(series, skipna=True)
+    if inferred == 'boolean' and series.isna().any():
+        # True/False/NaN columns such as notD1_incomplete read back as object from CSV
+        return _encode_column(series.astype('boolean'), key)
+
+    # Strings: dictionary-encoded as int32 codes (-1 for missing) plus the distinct values
+    if isinstance(dtype, pd.CategoricalDtype):
+        codes, uniques = series.cat.codes.to_numpy(), series.cat.categories
+    else:
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    categories = np.asarray(uniques, dtype=str) if len(uniques) else np.array([], dtype='<U1')
+    return ({key: codes.astype(np.int32), f'{key}_categories': categories},
+            {'kind': 'strings', 'dtype': 'category' if isinstance(dtype, pd.CategoricalDtype) else str(dtype)})
+
+
+def _decode_column(data, key, entry, categorical):
+    if entry['kind'] == 'array':
+        return data[key]
+    if entry['kind'] == 'masked':
+        values = pd.Series(data[key], dtype=entry['dtype'])
+        values[data[f'{key}_mask']] = pd.NA
+        return values
+
+    codes = data[key]
+    categories = data[f'{key}_categories']
+    if categorical or entry['dtype'] == 'category':
+        return pd.Categorical.from_codes(codes, categories=pd.Index(categories))
+    values = categories.astype(object)[codes] if len(categories) else np.full(len(codes), np.nan, dtype=object)
+    values[codes < 0] = np.nan
+    return pd.Series(values, dtype=None if entry['dtype'] == 'category' else entry['dtype'])
+
+
+def table_columns(path):
+    """Column names of a table without reading its data."""
+    path = resolve_table(path)
+    fmt = table_format(path)
+    if fmt == 'npz':
+        with np.load(path, allow_pickle=False) as data:
+            return [column['name'] for column in json.loads(str(data['schema']))['columns']]
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.read_schema(path).names
+    return list(pd.read_csv(path, sep='\t', nrows=0).columns)
+
+
+def _has_pyarrow():
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def read_table(path, columns=None, categorical=False):
+    """
+    Read a table, or only some of its columns.
+
+    With .npz and .parquet files, only the requested columns are read from disk;
+    every column comes back with the dtype it was written with.
+
+    Args:
+        path (str): Table path; if it does not exist, a sibling in another
+                    format is read instead (see resolve_table)
+        columns (list, optional): Columns to read, in the order returned
+        categorical (bool): Return string columns of .npz tables as categoricals
+                            instead of materializing every string
+
+    Returns:
+        pandas.DataFrame
+    """
+    path = resolve_table(path)
+    fmt = table_format(path)
+    if fmt == 'csv':
+        df = pd.read_csv(path, sep='\t', usecols=columns)
+        df = df[columns] if columns is not None else df
+        instrumentation.rows_read(len(df), path)
+        return df
+    if fmt == 'parquet':
+        df = pd.read_parquet(path, columns=columns)
+        instrumentation.rows_read(len(df), path)
+        return df
+
+    with np.load(path, allow_pickle=False) as data:
+        schema = json.loads(str(data['schema']))
+        entries = {column['name']: column for column in schema['columns']}
+        missing = [name for name in (columns or []) if name not in entries]
+        if missing:
+            raise KeyError(f"{path} has no column(s) {', '.join(missing)}")
+        names = columns if columns is not None else list(entries)
+        frame = {name: _decode_column(data, entries[name]['key'], entries[name], categorical) for name in names}
+    instrumentation.rows_read(schema['rows'], path)
+    return pd.DataFrame(frame, index=pd.RangeIndex(schema['rows']))
+
+
+def write_table(df, path):
+    """
+    Write a table in the format given by the path's extension.
+
+    .npz tables are written uncompressed, one member per column (or per column
+    part), under a temporary name and renamed into place so readers never see
+    a half-written file.
+    """
+    fmt = table_format(path)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    df = df.reset_index(drop=True)
+    instrumentation.rows_written(len(df), path)
+    if fmt == 'csv':
+        df.to_csv(path, sep='\t', index=False)
+        return
+    if fmt == 'parquet':
+        df.to_parquet(path, index=False)
+        return
+
+    arrays = {}
+    schema = {'rows': len(df), 'columns': []}
+    for i, name in enumerate(df.columns):
+        key = f'c{i}'
+        column_arrays, entry = _encode_column(df[name], key)
+        arrays.update(column_arrays)
+        schema['columns'].append({'name': str(name), 'key': key, **entry})
+    arrays['schema'] = np.array(json.dumps(schema))
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+
+def benchmark(csv_path, columns=None, formats=('csv', 'npz', 'parquet'), repeats=3, work_dir='output'):
+    """
+    Time full writes, full reads and projected reads of one table in each format.
+
+    Returns:
+        pandas.DataFrame: One row per format with size_mb, write_s, read_s and
+                          read_columns_s (best of `repeats`)
+    """
+    df = pd.read_csv(csv_path, sep='\t')
+    columns = columns or list(df.columns[:4])
+    stem = os.path.join(work_dir, 'columnStore_benchmark')
+    rows = []
+    for fmt in formats:
+        if fmt == 'parquet' and not _has_pyarrow():
+            print("Skipping parquet: pyarrow is not installed")
+            continue
+        path = f'{stem}.{fmt}'
+        timings = {'write_s': [], 'read_s': [], 'read_columns_s': []}
+        for _ in range(repeats):
+            start = time.perf_counter()
+            write_table(df, path)
+            timings['write_s'].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            read_table(path)
+            timings['read_s'].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            read_table(path, columns)
+            timings['read_columns_s'].append(time.perf_counter() - start)
+        rows.append({'format': fmt, 'rows': len(df), 'size_mb': os.path.getsize(path) / 1e6,
+                     **{name: min(values) for name, values in timings.items()}})
+        os.remove(path)
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Typed columnar tables for pipeline intermediates')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    convert = subparsers.add_parser('convert', help='Convert a table between formats, e.g. .npz to .csv')
+    convert.add_argument('source', type=str, help='Input table (.csv, .npz or .parquet)')
+    convert.add_argument('target', type=str, help='Output table; format from the extension')
+    convert.add_argument('--columns', type=str, nargs='+', help='Only these columns')
+
+    info = subparsers.add_parser('info', help='Columns, dtypes and row count of a table')
+    info.add_argument('path', type=str)
+
+    bench = subparsers.add_parser('benchmark', help='Read/write time and size against tab-separated CSV')
+    bench.add_argument('csv', type=str, nargs='+', help='Tab-separated tables to benchmark')
+    bench.add_argument('--columns', type=str, nargs='+', help='Columns for the projected read (default: first 4)')
+    bench.add_argument('--scale', type=int, default=1, help='Repeat each table this many times (default: 1)')
+    bench.add_argument('--repeats', type=int, default=3, help='Timing repeats, best is reported (default: 3)')
+    bench.add_argument('--output', type=str, help='Also write the results as JSON')
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        df = read_table(args.source, args.columns)
+        write_table(df, args.target)
+        print(f"Wrote {len(df)} rows x {len(df.columns)} columns to {args.target}")
+    elif args.command == 'info':
+        df = read_table(args.path)
+        print(f"{resolve_table(args.path)}: {len(df)} rows")
+        print(df.dtypes.to_string())
+    else:
+        results = []
+        for csv_path in args.csv:
+            source = csv_path
+            if args.scale > 1:
+                source = os.path.join('output', 'columnStore_scaled.csv')
+                pd.concat([pd.read_csv(csv_path, sep='\t')] * args.scale, ignore_index=True) \
+                    .to_csv(source, sep='\t', index=False)
+            table = benchmark(source, args.columns, repeats=args.repeats).assign(table=csv_path, scale=args.scale)
+            if source != csv_path:
+                os.remove(source)
+            print(f"\n{csv_path} (x{args.scale})")
+            print(table.drop(columns=['table', 'scale']).to_string(index=False, float_format=lambda x: f'{x:.4f}'))
+            results.append(table)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(pd.concat(results).to_dict(orient='records'), f, indent=1)
+            print(f"\nResults saved to {args.output}")
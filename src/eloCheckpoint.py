@@ -0,0 +1,218 @@
+import numpy as np
+import pandas as pd
+import argparse
+import json
+import os
+import time
+
+from columnStore import read_table, table_columns
+from eloEngine import EloEngine, game_arrays, GAME_COLUMNS
+from rankingBuilder import build_rankings, write_legacy_export, LEGACY_EXPORTS
+
+
+class EloState:
+    """
+    Persistent single-pass Elo ratings that can be brought up to date with new games.
+
+    The state directory holds `state.npz` (current ratings, the key of the last
+    processed game and every processed game_id) and `checkpoints/<game_date>.npz`,
+    the ratings after the last game of each date. A game that arrives late, dated
+    before games that were already processed, rewinds to the newest checkpoint
+    before it and replays forward from there.
+    """
+
+    def __init__(self, state_dir, params, teams=None, ratings=None, last_key=None, processed=None):
+        self.state_dir = state_dir
+        self.params = dict(params, max_passes=1, threshold=None)
+        self.teams = list(teams or [])
+        self.ratings = np.asarray(ratings if ratings is not None else [], dtype=float)
+        self.last_key = tuple(last_key) if last_key is not None else None
+        self.processed = set(processed or [])
+
+    @property
+    def checkpoint_dir(self):
+        return os.path.join(self.state_dir, 'checkpoints')
+
+    @classmethod
+    def load(cls, state_dir):
+        with np.load(os.path.join(state_dir, 'state.npz')) as data:
+            last_key = tuple(data['last_key'].tolist()) if data['last_key'].size else None
+            return cls(state_dir, json.loads(str(data['params'])), data['teams'].tolist(), data['ratings'],
+                       last_key, data['processed'].tolist())
+
+    def save(self):
+        os.makedirs(self.state_dir, exist_ok=True)
+        _save_npz(os.path.join(self.state_dir, 'state.npz'), params=json.dumps(self.params),
+                  teams=np.array(self.teams, dtype=str), ratings=self.ratings,
+                  last_key=np.array(self.last_key or [], dtype=str),
+                  processed=np.array(sorted(self.processed), dtype=str))
+
+    def engine(self):
+        return EloEngine(**self.params)
+
+    def apply(self, games_df):
+        """
+        Apply games newer than the last processed game, writing a checkpoint per date.
+
+        Args:
+            games_df (pandas.DataFrame): Team-game rows, all dated after last_key
+
+        Returns:
+            int: Number of games applied
+        """
+        games_df = games_df.drop_duplicates('game_id').sort_values(['game_date', 'game_id'], kind='stable')
+        if games_df.empty:
+            return 0
+        engine = self.engine()
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        for game_date, day in games_df.groupby('game_date', sort=True):
+            games = game_arrays(day, teams=self.teams)
+            self.ratings, _ = engine.run(games, ratings=self.ratings)
+            self.teams = games.teams
+            self.last_key = (str(game_date), str(games.game_id[-1]))
+            self.processed.update(map(str, games.game_id))
+            _save_npz(os.path.join(self.checkpoint_dir, f'{game_date}.npz'),
+                      teams=np.array(self.teams, dtype=str), ratings=self.ratings,
+                      last_key=np.array(self.last_key, dtype=str))
+        return len(games_df)
+
+    def rewind(self, before_date):
+        """
+        Restore the newest checkpoint dated before `before_date`, or an empty state.
+
+        Checkpoints on or after that date are deleted, since they will be rebuilt.
+
+        Returns:
+            str or None: Date of the restored checkpoint
+        """
+        dates = sorted(name[:-4] for name in os.listdir(self.checkpoint_dir) if name.endswith('.npz'))
+        earlier = [date for date in dates if date < before_date]
+        for date in dates:
+            if date >= before_date:
+                os.remove(os.path.join(self.checkpoint_dir, f'{date}.npz'))
+
+        if earlier:
+            with np.load(os.path.join(self.checkpoint_dir, f'{earlier[-1]}.npz')) as data:
+                self.teams = data['teams'].tolist()
+                self.ratings = data['ratings']
+                self.last_key = tuple(data['last_key'].tolist())
+        else:
+            self.teams, self.ratings, self.last_key = [], np.array([]), None
+        return earlier[-1] if earlier else None
+
+    def update(self, df):
+        """
+        Bring the state up to date with every game in a team-game file.
+
+        Only games whose game_id has not been processed are applied, unless a late
+        game forces a rewind, in which case every game from the restored checkpoint
+        onwards is replayed.
+
+        Returns:
+            dict: Summary with new, replayed and rewound_to entries
+        """
+        ids = df['game_id'].astype(str)
+        new = df[~ids.isin(self.processed)]
+        summary = {'new': int(new['game_id'].nunique()), 'replayed': 0, 'rewound_to': None}
+        if new.empty:
+            return summary
+
+        earliest = min(zip(new['game_date'].astype(str), new['game_id'].astype(str)))
+        if self.last_key is not None and earliest < self.last_key:
+            summary['rewound_to'] = self.rewind(earliest[0])
+            keys = list(zip(df['game_date'].astype(str), ids))
+            after = [self.last_key is None or key > self.last_key for key in keys]
+            new = df[after]
+            summary['replayed'] = int(new['game_id'].nunique()) - summary['new']
+
+        self.apply(new)
+        self.processed.update(new['game_id'].astype(str))
+        self.save()
+        return summary
+
+    def replay_matches(self, df, tolerance=1e-9):
+        """
+        Check the incremental ratings against a full replay of the same games.
+
+        Returns:
+            float: Largest absolute rating difference
+        """
+        games = game_arrays(df[df['game_id'].astype(str).isin(self.processed)])
+        ratings, _ = self.engine().run(games)
+        replayed = dict(zip(games.teams, ratings))
+        incremental = dict(zip(self.teams, self.ratings))
+        if set(replayed) != set(incremental):
+            return float('inf')
+        return max((abs(replayed[team] - incremental[team]) for team in replayed), default=0.0)
+
+
+def _save_npz(path, **arrays):
+    """Write an .npz file under a temporary name and rename it into place."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+
+def write_region_ranking(teams, ratings, regions_path="data/team_region_groups.csv",
+                         output_path="output/regionGroupEloRanking.csv"):
+    """Write Elo ratings for the region teams in the same layout as regionGroupElo.py."""
+    regions = pd.read_csv(regions_path, sep='\t')
+    rankings, _ = build_rankings({'elo': pd.DataFrame({'team': teams, 'score': ratings})}, regions)
+    write_legacy_export(rankings, 'elo', output_path, LEGACY_EXPORTS['elo'][1])
+
+
+def read_games(path):
+    df = read_table(path, [col for col in table_columns(path) if col in GAME_COLUMNS])
+    if pd.api.types.is_datetime64_any_dtype(df['game_date']):
+        # Tables from streamIngest.py hold parsed dates; checkpoints are named by ISO date
+        df['game_date'] = df['game_date'].dt.strftime('%Y-%m-%d')
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Incremental Elo ratings with checkpointed state')
+    parser.add_argument('command', choices=['init', 'update', 'verify'],
+                        help='init: build state from scratch; update: apply new games; '
+                             'verify: compare the state with a full replay')
+    parser.add_argument('--games', type=str, default='data/merged_team_games.npz',
+                        help='Team-game table (default: data/merged_team_games.npz)')
+    parser.add_argument('--state', type=str, default='data/eloState', help='State directory (default: data/eloState)')
+    parser.add_argument('--regions', type=str, default='data/team_region_groups.csv', help='Region groups file')
+    parser.add_argument('--output', type=str, default='output/regionGroupEloRanking.csv', help='Region ranking output')
+    parser.add_argument('--k', type=float, default=32, help='K-factor (default: 32)')
+    parser.add_argument('--initial-rating', type=float, default=1500, help='Initial rating (default: 1500)')
+    parser.add_argument('--home-advantage', type=float, default=0.0, help='Home-court bonus in rating points')
+    parser.add_argument('--margin-of-victory', type=float, nargs='?', const=1.0, default=0.0,
+                        help='Scale updates by score margin, optionally with an exponent (default: off)')
+    args = parser.parse_args()
+
+    df = read_games(args.games)
+
+    if args.command == 'verify':
+        state = EloState.load(args.state)
+        diff = state.replay_matches(df)
+        print(f"Largest difference from a full replay: {diff:.3g}")
+        raise SystemExit(0 if diff < 1e-9 else 1)
+
+    start = time.perf_counter()
+    if args.command == 'init':
+        state = EloState(args.state, {'k': args.k, 'initial_rating': args.initial_rating,
+                                      'home_advantage': args.home_advantage,
+                                      'margin_of_victory': args.margin_of_victory})
+        if os.path.isdir(state.checkpoint_dir):
+            for name in os.listdir(state.checkpoint_dir):
+                os.remove(os.path.join(state.checkpoint_dir, name))
+        summary = state.update(df)
+    else:
+        state = EloState.load(args.state)
+        summary = state.update(df)
+    elapsed = time.perf_counter() - start
+
+    message = f"Applied {summary['new']} new game(s)"
+    if summary['rewound_to'] is not None or summary['replayed']:
+        message += f", rewound to {summary['rewound_to'] or 'the start'} and replayed {summary['replayed']}"
+    print(f"{message} in {elapsed:.3f}s; last game {state.last_key}")
+
+    write_region_ranking(state.teams, state.ratings, args.regions, args.output)
+    print(f"Saved region rankings to {args.output}")
@@ -0,0 +1,348 @@
+import numpy as np
+import pandas as pd
+import argparse
+import json
+import math
+import time
+from dataclasses import dataclass
+
+from columnStore import read_table, write_table
+
+LEGACY_PARAMS = {
+    'k': 32,
+    'initial_rating': 1500,
+    'home_advantage': 0.0,
+    'margin_of_victory': 0.0,
+    'max_passes': 100,
+    'threshold': None,
+    'regression': 0.0,
+}
+
+# Defaults of EloEngine and of the elo command
+DEFAULT_PARAMS = {
+    'k': 32,
+    'initial_rating': 1500,
+    'home_advantage': 0.0,
+    'margin_of_victory': 0.0,
+    'max_passes': 100,
+    'threshold': 0.1,
+    'regression': 0.0,
+}
+
+
+@dataclass
+class GameArrays:
+    """
+    Games as parallel integer/float arrays, one entry per update.
+
+    `team` and `opponent` are integer ids into `teams`; `home` is the team's
+    home_away_NS value (1 home, -1 away, 0 neutral).
+    """
+    teams: list
+    team: np.ndarray
+    opponent: np.ndarray
+    score: np.ndarray
+    margin: np.ndarray
+    home: np.ndarray
+    game_id: np.ndarray
+    game_date: np.ndarray
+
+    def __len__(self):
+        return len(self.team)
+
+
+# Every column game_arrays can use; readers that only need Elo inputs read just these
+GAME_COLUMNS = ['game_id', 'game_date', 'team', 'opponent_team', 'Win', 'team_score', 'opponent_team_score',
+                'home_away_NS']
+
+
+def game_arrays(df, per_game=True, teams=None):
+    """
+    Convert team-game rows into GameArrays.
+
+    Args:
+        df (pandas.DataFrame): Rows with team, opponent_team, Win and, when present,
+                               game_id, game_date, team_score, opponent_team_score
+                               and home_away_NS
+        per_game (bool): Keep one row per game_id, sorted by game_date then game_id.
+                         When False every row is kept in file order, which is how
+                         the original eloRating.py visited games (each one twice).
+        teams (list of str, optional): Existing team id order to extend
+
+    Returns:
+        GameArrays: The games
+    """
+    df = df.dropna(subset=['team', 'opponent_team'])
+    if per_game:
+        df = df.drop_duplicates('game_id').sort_values(['game_date', 'game_id'], kind='stable')
+
+    teams = list(teams) if teams is not None else []
+    team_ids = {team: i for i, team in enumerate(teams)}
+    for name in pd.unique(pd.concat([df['team'], df['opponent_team']], ignore_index=True)):
+        if name not in team_ids:
+            team_ids[name] = len(teams)
+            teams.append(name)
+
+    if 'team_score' in df and 'opponent_team_score' in df:
+        margin = (df['team_score'] - df['opponent_team_score']).abs().to_numpy(dtype=float)
+    else:
+        margin = np.ones(len(df))
+    n = len(df)
+    return GameArrays(
+        teams=teams,
+        team=df['team'].map(team_ids).to_numpy(dtype=np.int64),
+        opponent=df['opponent_team'].map(team_ids).to_numpy(dtype=np.int64),
+        score=df['Win'].to_numpy(dtype=float),
+        margin=margin,
+        home=df['home_away_NS'].fillna(0).to_numpy(dtype=float) if 'home_away_NS' in df else np.zeros(n),
+        game_id=df['game_id'].to_numpy() if 'game_id' in df else np.arange(n),
+        game_date=df['game_date'].to_numpy() if 'game_date' in df else np.zeros(n),
+    )
+
+
+def _run_passes(team, opponent, score, margin, home, ratings, expected,
+                k, home_advantage, margin_of_victory, max_passes, threshold, regression, initial_rating):
+    """
+    Elo update loop over games held in arrays (or lists).
+
+    Returns the number of passes run. `ratings` is updated in place and `expected`
+    holds each game's pre-game win expectancy from the last pass.
+    """
+    passes = 0
+    for pass_num in range(max_passes):
+        previous = [ratings[t] for t in range(len(ratings))]
+        if pass_num > 0 and regression > 0:
+            for t in range(len(ratings)):
+                ratings[t] = initial_rating + (1 - regression) * (ratings[t] - initial_rating)
+        for g in range(len(team)):
+            a = team[g]
+            b = opponent[g]
+            rating_team = ratings[a] + home_advantage * home[g]
+            rating_opponent = ratings[b]
+
+            # Same arithmetic as calc_expected_score in eloRating.py
+            expected_team = 1 / (1 + 10 ** ((rating_opponent - rating_team) / 400))
+            expected_opponent = 1 / (1 + 10 ** ((rating_team - rating_opponent) / 400))
+            expected[g] = expected_team
+
+            multiplier = 1.0
+            if margin_of_victory > 0:
+                # FiveThirtyEight-style scaling, damped when the favourite wins big
+                winner_diff = rating_team - rating_opponent if score[g] > 0.5 else rating_opponent - rating_team
+                multiplier = (math.log(margin[g] + 1) * 2.2 / (winner_diff * 0.001 + 2.2)) ** margin_of_victory
+
+            elo_change_team = k * multiplier * (score[g] - expected_team)
+            elo_change_opponent = k * multiplier * ((1 - score[g]) - expected_opponent)
+            ratings[a] += elo_change_team
+            ratings[b] += elo_change_opponent
+        passes += 1
+
+        # Net change over the whole pass; single updates stay large with a constant K. Teams that never
+        # won or never lost keep drifting, so without regression per-game ratings never fall below it
+        max_change = 0.0
+        for t in range(len(ratings)):
+            max_change = max(max_change, abs(ratings[t] - previous[t]))
+        if threshold is not None and max_change < threshold:
+            break
+    return passes
+
+
+_compiled_run_passes = None
+
+
+def compiled_run_passes():
+    """
+    The update loop compiled with numba, or None when numba is not installed.
+
+    numba is optional and imported on first use, so commands that never run the
+    loop do not pay for importing it; without it the same loop runs as plain
+    Python over lists.
+    """
+    global _compiled_run_passes
+    if _compiled_run_passes is None:
+        try:
+            from numba import njit
+        except ImportError:
+            _compiled_run_passes = False
+        else:
+            _compiled_run_passes = njit(cache=True)(_run_passes)
+    return _compiled_run_passes or None
+
+
+class EloEngine:
+    """
+    Elo ratings stored in a NumPy array indexed by team id.
+
+    Args:
+        k (float): K-factor
+        initial_rating (float): Rating of a team before its first game
+        home_advantage (float): Rating points added to the home team (home_away_NS = 1)
+                                and taken from the away team (home_away_NS = -1)
+        margin_of_victory (float): Exponent on the margin-of-victory multiplier;
+                                   0 (or False) disables it, 1 (or True) is the
+                                   standard scaling
+        max_passes (int): Maximum passes over the games
+        threshold (float, optional): Stop once no team's rating moved by more than
+                                     this over a whole pass; None always runs
+                                     max_passes
+        regression (float): Fraction of each rating's distance from initial_rating
+                            removed before every pass after the first
+    """
+
+    def __init__(self, k=DEFAULT_PARAMS['k'], initial_rating=DEFAULT_PARAMS['initial_rating'],
+                 home_advantage=DEFAULT_PARAMS['home_advantage'], margin_of_victory=DEFAULT_PARAMS['margin_of_victory'],
+                 max_passes=DEFAULT_PARAMS['max_passes'], threshold=DEFAULT_PARAMS['threshold'],
+                 regression=DEFAULT_PARAMS['regression']):
+        self.k = k
+        self.initial_rating = initial_rating
+        self.home_advantage = home_advantage
+        self.margin_of_victory = margin_of_victory
+        self.max_passes = max_passes
+        self.threshold = threshold
+        self.regression = regression
+        self.passes_run = 0
+
+    def params(self):
+        return {
+            'k': self.k,
+            'initial_rating': self.initial_rating,
+            'home_advantage': self.home_advantage,
+            'margin_of_victory': self.margin_of_victory,
+            'max_passes': self.max_passes,
+            'threshold': self.threshold,
+            'regression': self.regression,
+        }
+
+    def run(self, games, ratings=None, use_numba=True):
+        """
+        Run the Elo passes over games.
+
+        Args:
+            games (GameArrays): Games to process, in order
+            ratings (numpy.ndarray, optional): Starting ratings by team id (default:
+                                               initial_rating for every team)
+            use_numba (bool): Use the compiled loop when numba is installed
+
+        Returns:
+            tuple: (ratings, expected) arrays; expected is each game's pre-game win
+                   expectancy for `team` in the final pass
+        """
+        n_teams = len(games.teams)
+        if ratings is None:
+            ratings = np.full(n_teams, float(self.initial_rating))
+        else:
+            ratings = np.concatenate([np.asarray(ratings, dtype=float),
+                                      np.full(max(0, n_teams - len(ratings)), float(self.initial_rating))])
+        expected = np.zeros(len(games))
+        threshold = self.threshold
+
+        compiled = compiled_run_passes() if use_numba else None
+        if compiled is not None:
+            self.passes_run = compiled(
+                games.team, games.opponent, games.score, games.margin, games.home, ratings, expected,
+                float(self.k), float(self.home_advantage), float(self.margin_of_victory), int(self.max_passes),
+                -1.0 if threshold is None else float(threshold), float(self.regression), float(self.initial_rating))
+        else:
+            # Plain lists index far faster than NumPy scalars in an interpreted loop
+            ratings_list, expected_list = ratings.tolist(), expected.tolist()
+            self.passes_run = _run_passes(
+                games.team.tolist(), games.opponent.tolist(), games.score.tolist(), games.margin.tolist(),
+                games.home.tolist(), ratings_list, expected_list, self.k, self.home_advantage,
+                float(self.margin_of_victory), self.max_passes, threshold, self.regression, self.initial_rating)
+            ratings, expected = np.array(ratings_list), np.array(expected_list)
+        return ratings, expected
+
+
+def ratings_frame(teams, ratings):
+    """Final ratings as a DataFrame with team and final_elo columns."""
+    return pd.DataFrame({'team': teams, 'final_elo': ratings})
+
+
+def legacy_elo(df, max_passes=100, k=32, initial_elo=1500):
+    """
+    The original iterrows loop from Archived/eloRating.py, kept as a reference for
+    checking EloEngine's results and speed.
+    """
+    from collections import defaultdict
+    elo_dict = defaultdict(lambda: initial_elo)
+    for pass_num in range(max_passes):
+        for index, row in df.iterrows():
+            team = row['team']
+            opponent = row['opponent_team']
+            win = row['Win']
+            rating_team = elo_dict[team]
+            rating_opponent = elo_dict[opponent]
+            expected_team = 1 / (1 + 10 ** ((rating_opponent - rating_team) / 400))
+            expected_opponent = 1 / (1 + 10 ** ((rating_team - rating_opponent) / 400))
+            elo_dict[team] += k * (win - expected_team)
+            elo_dict[opponent] += k * ((1 - win) - expected_opponent)
+    return dict(elo_dict)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compute Elo ratings from team-game rows')
+    parser.add_argument('--games', type=str, default='data/merged_team_games.npz',
+                        help='Team-game table (default: data/merged_team_games.npz)')
+    parser.add_argument('--output', type=str, default='data/merged_team_games_with_elo.npz',
+                        help='Games with a final_elo column, as read by regionGroupElo.py')
+    parser.add_argument('--k', type=float, default=DEFAULT_PARAMS['k'],
+                        help=f"K-factor (default: {DEFAULT_PARAMS['k']})")
+    parser.add_argument('--initial-rating', type=float, default=DEFAULT_PARAMS['initial_rating'],
+                        help=f"Initial rating (default: {DEFAULT_PARAMS['initial_rating']})")
+    parser.add_argument('--home-advantage', type=float, default=DEFAULT_PARAMS['home_advantage'],
+                        help='Home-court bonus in rating points')
+    parser.add_argument('--margin-of-victory', type=float, nargs='?', const=1.0,
+                        default=DEFAULT_PARAMS['margin_of_victory'],
+                        help='Scale updates by score margin, optionally with an exponent (default: off)')
+    parser.add_argument('--passes', type=int, default=DEFAULT_PARAMS['max_passes'],
+                        help=f"Maximum passes (default: {DEFAULT_PARAMS['max_passes']})")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_PARAMS['threshold'],
+                        help='Stop when no rating moved by more than this over a pass '
+                             f"(default: {DEFAULT_PARAMS['threshold']})")
+    parser.add_argument('--regression', type=float, default=DEFAULT_PARAMS['regression'],
+                        help='Regression toward the initial rating between passes (default: 0)')
+    parser.add_argument('--config', type=str,
+                        help='JSON file of engine parameters, such as the best config from eloSweep.py; '
+                             'overrides the options above')
+    parser.add_argument('--legacy', action='store_true',
+                        help='Reproduce eloRating.py: every row in file order, K=32, 100 passes, no early stop')
+    parser.add_argument('--no-numba', action='store_true', help='Use the pure Python loop')
+    parser.add_argument('--compare-legacy', type=int, metavar='PASSES',
+                        help='Also run the original iterrows loop for PASSES passes and compare results and speed')
+    args = parser.parse_args()
+
+    df = read_table(args.games)
+    if args.legacy:
+        engine = EloEngine(**LEGACY_PARAMS)
+    elif args.config:
+        with open(args.config) as f:
+            engine = EloEngine(**json.load(f))
+    else:
+        engine = EloEngine(args.k, args.initial_rating, args.home_advantage, args.margin_of_victory,
+                           args.passes, args.threshold, args.regression)
+    games = game_arrays(df, per_game=not args.legacy)
+
+    start = time.perf_counter()
+    ratings, _ = engine.run(games, use_numba=not args.no_numba)
+    elapsed = time.perf_counter() - start
+    print(f"Processed {len(games)} games x {engine.passes_run} pass(es) for {len(games.teams)} teams in {elapsed:.3f}s")
+
+    final_elos = ratings_frame(games.teams, ratings)
+    write_table(df.drop(columns=['final_elo'], errors='ignore').merge(final_elos, on='team', how='left'),
+                args.output)
+    print(f"Saved games with final Elo ratings to {args.output}")
+
+    if args.compare_legacy:
+        legacy_engine = EloEngine(**{**LEGACY_PARAMS, 'max_passes': args.compare_legacy})
+        legacy_games = game_arrays(df, per_game=False)
+        start = time.perf_counter()
+        new_ratings, _ = legacy_engine.run(legacy_games, use_numba=not args.no_numba)
+        new_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        reference = legacy_elo(df, max_passes=args.compare_legacy)
+        legacy_elapsed = time.perf_counter() - start
+
+        diff = max(abs(reference[team] - rating) for team, rating in zip(legacy_games.teams, new_ratings))
+        print(f"Legacy loop: {legacy_elapsed:.3f}s, engine: {new_elapsed:.4f}s "
+              f"({legacy_elapsed / new_elapsed:.0f}x faster), max rating difference {diff:.3g}")
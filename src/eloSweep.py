@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import instrumentation
+from columnStore import read_table, table_columns
+from eloEngine import EloEngine, game_arrays, GAME_COLUMNS
+
+# Clip predictions away from 0 and 1 so a single confident miss cannot make log-loss infinite
+EPSILON = 1e-15
+
+
+def score_predictions(expected, score):
+    """
+    Log-loss and Brier score of pre-game win expectancies.
+
+    Args:
+        expected (numpy.ndarray): Predicted probability that `team` wins
+        score (numpy.ndarray): 1 if `team` won, else 0
+
+    Returns:
+        tuple: (log_loss, brier)
+    """
+    p = np.clip(expected, EPSILON, 1 - EPSILON)
+    log_loss = -np.mean(score * np.log(p) + (1 - score) * np.log(1 - p))
+    brier = np.mean((expected - score) ** 2)
+    return float(log_loss), float(brier)
+
+
+def evaluate_config(games, config):
+    """
+    Run one Elo configuration chronologically and score its pre-game predictions.
+
+    Predictions come from the final pass. With a single pass they are strictly
+    out-of-sample; with more passes, later passes start from ratings that have
+    already seen the season, so their scores are in-sample.
+    """
+    engine = EloEngine(**config)
+    _, expected = engine.run(games)
+    log_loss, brier = score_predictions(expected, games.score)
+    return {**config, 'log_loss': log_loss, 'brier': brier, 'passes_run': engine.passes_run}
+
+
+# Game arrays for the worker, set once by the pool initializer instead of pickled per task
+_worker_games = None
+
+
+def _init_worker(games):
+    global _worker_games
+    _worker_games = games
+    # Compile (or load the cached) Elo loop once per worker rather than inside the first task
+    EloEngine(max_passes=1).run(game_arrays(pd.DataFrame({'team': ['a'], 'opponent_team': ['b'], 'Win': [1]}),
+                                            per_game=False))
+
+
+def _evaluate_in_worker(config):
+    return evaluate_config(_worker_games, config)
+
+
+def grid_configs(k_values, home_values, mov_values, regression_values, passes_values, initial_rating=1500):
+    """Every combination of the given parameter values."""
+    return [
+        {'k': k, 'initial_rating': initial_rating, 'home_advantage': home, 'margin_of_victory': mov,
+         'max_passes': passes, 'threshold': None, 'regression': regression}
+        for k, home, mov, regression, passes
+        in itertools.product(k_values, home_values, mov_values, regression_values, passes_values)
+    ]
+
+
+def random_configs(n, k_range, home_range, mov_range, regression_range, passes_values, seed=42,
+                   initial_rating=1500):
+    """`n` configurations sampled uniformly from the given (low, high) ranges."""
+    rng = np.random.default_rng(seed)
+    return [
+        {'k': float(rng.uniform(*k_range)), 'initial_rating': initial_rating,
+         'home_advantage': float(rng.uniform(*home_range)), 'margin_of_victory': float(rng.uniform(*mov_range)),
+         'max_passes': int(rng.choice(passes_values)), 'threshold': None,
+         'regression': float(rng.uniform(*regression_range))}
+        for _ in range(n)
+    ]
+
+
+def run_sweep(games, configs, n_workers=None):
+    """
+    Evaluate configurations across a process pool.
+
+    Returns:
+        pandas.DataFrame: Leaderboard sorted by log-loss, then Brier score
+    """
+    n_workers = n_workers or os.cpu_count() or 1
+    if n_workers == 1:
+        results = [evaluate_config(games, config) for config in configs]
+    else:
+        with ProcessPoolExecutor(n_workers, initializer=_init_worker, initargs=(games,)) as pool:
+            results = list(pool.map(_evaluate_in_worker, configs, chunksize=max(1, len(configs) // (4 * n_workers))))
+    leaderboard = pd.DataFrame(results).sort_values(['log_loss', 'brier'], kind='stable').reset_index(drop=True)
+    leaderboard.insert(0, 'rank', np.arange(1, len(leaderboard) + 1))
+    return leaderboard
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Sweep Elo parameters and score them by chronological log-loss')
+    parser.add_argument('--games', type=str, default='data/merged_team_games.npz',
+                        help='Team-game table (default: data/merged_team_games.npz)')
+    parser.add_argument('--k', type=float, nargs='+', default=[16, 24, 32, 40, 48], help='K-factor values')
+    parser.add_argument('--home-advantage', type=float, nargs='+', default=[0, 25, 50, 75, 100],
+                        help='Home-court bonus values')
+    parser.add_argument('--margin-of-victory', type=float, nargs='+', default=[0, 0.5, 1],
+                        help='Margin-of-victory exponents (0 disables it)')
+    parser.add_argument('--regression', type=float, nargs='+', default=[0.0],
+                        help='Regression toward the initial rating between passes')
+    parser.add_argument('--passes', type=int, nargs='+', default=[1],
+                        help='Pass counts; scores for more than one pass are in-sample')
+    parser.add_argument('--random', type=int, metavar='N',
+                        help='Sample N configurations from the min/max of each list instead of the full grid')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for --random (default: 42)')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: CPU count)')
+    parser.add_argument('--output', type=str, default='output/eloSweep.csv', help='Leaderboard output')
+    parser.add_argument('--best-config', type=str, default='output/eloBestConfig.json',
+                        help='Best configuration, readable by eloEngine.py --config')
+    args = parser.parse_args()
+
+    df = read_table(args.games, [col for col in table_columns(args.games) if col in GAME_COLUMNS])
+    games = game_arrays(df)
+
+    if args.random:
+        configs = random_configs(
+            args.random, (min(args.k), max(args.k)), (min(args.home_advantage), max(args.home_advantage)),
+            (min(args.margin_of_victory), max(args.margin_of_victory)),
+            (min(args.regression), max(args.regression)), args.passes, args.seed)
+    else:
+        configs = grid_configs(args.k, args.home_advantage, args.margin_of_victory, args.regression, args.passes)
+
+    start = time.perf_counter()
+    leaderboard = run_sweep(games, configs, args.workers)
+    elapsed = time.perf_counter() - start
+
+    leaderboard.to_csv(args.output, sep='\t', index=False)
+    instrumentation.rows_written(len(leaderboard), args.output)
+    best = leaderboard.iloc[0]
+    best_config = {key: best[key].item() if hasattr(best[key], 'item') else best[key]
+                   for key in configs[0]}
+    with open(args.best_config, 'w') as f:
+        json.dump(best_config, f, indent=1)
+
+    print(leaderboard.head(10).to_string(index=False))
+    print(f"\nEvaluated {len(configs)} configurations on {len(games)} games in {elapsed:.2f}s")
+    print(f"Leaderboard saved to {args.output}; best config saved to {args.best_config}")
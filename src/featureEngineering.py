@@ -0,0 +1,190 @@
+import numpy as np
+import pandas as pd
+import argparse
+import time
+
+from columnStore import read_table, write_table
+
+# Opponent column -> column of the opponent's row it is gathered from
+OPPONENT_COLUMNS = {
+    'opponent_team': 'team',
+    'opponent_FGA2': 'FGA_2',
+    'opponent_FGA3': 'FGA_3',
+    'opponent_FTA': 'FTA',
+    'opponent_OREB': 'OREB',
+    'opponent_TOV': 'TOV',
+    'opponent_TOV_team': 'TOV_team',
+}
+
+
+def game_pair_index(game_id):
+    """
+    Row -> opponent row index for team-game rows.
+
+    Every game should have exactly two rows, one per team. Rows of games with
+    any other number of rows get -1 instead of a wrong opponent.
+
+    Args:
+        game_id (array-like): Game id of each row, in any order
+
+    Returns:
+        tuple: (partner, bad_games) where partner is an int64 array of opponent
+               row positions and bad_games maps each malformed game_id to its
+               row count
+    """
+    codes, uniques = pd.factorize(np.asarray(game_id))
+    counts = np.bincount(codes, minlength=len(uniques))
+    order = np.argsort(codes, kind='stable')
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+    partner = np.full(len(codes), -1, dtype=np.int64)
+    paired = starts[counts == 2]
+    first, second = order[paired], order[paired + 1]
+    partner[first] = second
+    partner[second] = first
+
+    bad = counts != 2
+    return partner, dict(zip(uniques[bad], counts[bad].tolist()))
+
+
+def gather(values, partner):
+    """values[partner], with NaN where a row has no opponent."""
+    gathered = pd.Series(values).take(np.where(partner >= 0, partner, 0)).to_numpy()
+    if (partner < 0).any():
+        gathered = gathered.astype(object if gathered.dtype.kind in 'OUS' else float)
+        gathered[partner < 0] = np.nan
+    return gathered
+
+
+def engineer_features(df):
+    """
+    Opponent columns and every derived column in one pass.
+
+    Rows are ordered by game_id, keeping file order within a game (the original
+    scripts' unstable sort left it arbitrary). The game-pair index is built
+    once, each opponent column is a single fancy-indexed gather, and Win,
+    Point_Differential, Possessions, the rate columns, games_played and numwins
+    are computed on whole arrays.
+
+    Returns:
+        tuple: (features, bad_games) with bad_games as returned by game_pair_index
+    """
+    df = df.sort_values('game_id', kind='stable').reset_index(drop=True)
+    partner, bad_games = game_pair_index(df['game_id'])
+
+    for column, source in OPPONENT_COLUMNS.items():
+        values = gather(df[source].to_numpy(), partner)
+        df[column] = values if column == 'opponent_team' else values.astype(float)
+
+    team_score = df['team_score'].to_numpy()
+    opponent_score = df['opponent_team_score'].to_numpy()
+    win = (team_score > opponent_score).astype(int)
+    df['Win'] = win
+    df['Point_Differential'] = team_score - opponent_score
+
+    fga_2, fga_3, fta = (df[col].to_numpy(dtype=float) for col in ('FGA_2', 'FGA_3', 'FTA'))
+    oreb, tov, ast = (df[col].to_numpy(dtype=float) for col in ('OREB', 'TOV', 'AST'))
+    opp_fga = df['opponent_FGA2'].to_numpy() + df['opponent_FGA3'].to_numpy()
+    possessions = 0.5 * (fga_2 + fga_3 + opp_fga) + 0.4 * (fta + df['opponent_FTA'].to_numpy()) \
+        - oreb - df['opponent_OREB'].to_numpy() + tov + df['opponent_TOV'].to_numpy()
+    df['Possessions'] = possessions
+    with np.errstate(divide='ignore', invalid='ignore'):
+        df['AST%'] = ast / (ast + tov)
+        df['BLK%'] = df['BLK'].to_numpy() / opp_fga
+        df['TOV%'] = tov / possessions
+        df['TOV_team%'] = df['TOV_team'].to_numpy() / possessions
+        df['STL%'] = df['STL'].to_numpy() / possessions
+
+    team_codes, _ = pd.factorize(df['team'])
+    df['games_played'] = np.bincount(team_codes)[team_codes]
+    df['numwins'] = np.bincount(team_codes, weights=win).astype(int)[team_codes]
+    return df, bad_games
+
+
+def legacy_features(df):
+    """
+    The original opponentTeam.py and AddedColumns.py steps (Archived/), kept as a
+    reference for checking engineer_features.
+
+    opponent_FTA, opponent_OREB, opponent_TOV and opponent_TOV_team were only
+    shifted down, so the first row of every game got NaN for them.
+    """
+    df = df.sort_values(by='game_id')
+    df['opponent_team'] = df.groupby('game_id')['team'].shift(1)
+    df['opponent_team'] = df['opponent_team'].fillna(df.groupby('game_id')['team'].shift(-1))
+    df['opponent_FGA2'] = df.groupby('game_id')['FGA_2'].shift(1)
+    df['opponent_FGA3'] = df.groupby('game_id')['FGA_3'].shift(1)
+    df['opponent_FGA2'] = df['opponent_FGA2'].fillna(df.groupby('game_id')['FGA_2'].shift(-1))
+    df['opponent_FGA3'] = df['opponent_FGA3'].fillna(df.groupby('game_id')['FGA_3'].shift(-1))
+    df['opponent_FTA'] = df.groupby('game_id')['FTA'].shift(1)
+    df['opponent_OREB'] = df.groupby('game_id')['OREB'].shift(1)
+    df['opponent_TOV'] = df.groupby('game_id')['TOV'].shift(1)
+    df['opponent_TOV_team'] = df.groupby('game_id')['TOV_team'].shift(1)
+
+    df["Win"] = (df["team_score"] > df["opponent_team_score"]).astype(int)
+    df['Point_Differential'] = df["team_score"] - df["opponent_team_score"]
+    df['Possessions'] = 0.5 * (df['FGA_2'] + df['FGA_3'] + df['opponent_FGA2'] + df['opponent_FGA3']) \
+        + 0.4 * (df['FTA'] + df['opponent_FTA']) - df['OREB'] - df['opponent_OREB'] + df['TOV'] + df['opponent_TOV']
+    df['AST%'] = df['AST'] / (df['AST'] + df['TOV'])
+    df['BLK%'] = df['BLK'] / (df['opponent_FGA2'] + df['opponent_FGA3'])
+    df['TOV%'] = df['TOV'] / df['Possessions']
+    df['TOV_team%'] = df['TOV_team'] / df['Possessions']
+    df['STL%'] = df['STL'] / df['Possessions']
+    df['games_played'] = df['team'].map(df['team'].value_counts())
+    df['numwins'] = df['Win'].eq(1).groupby(df['team']).transform('sum')
+    return df.reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Opponent columns and derived features for team-game rows')
+    parser.add_argument('--input', type=str, default='data/merged_team_games.csv',
+                        help='Raw team-game table (default: data/merged_team_games.csv)')
+    parser.add_argument('--output', type=str, default='data/merged_team_games.npz',
+                        help='Feature table read by the later stages (default: data/merged_team_games.npz)')
+    parser.add_argument('--strict', action='store_true',
+                        help='Fail if any game does not have exactly two rows')
+    parser.add_argument('--compare-legacy', action='store_true',
+                        help='Also run the original two-script computation and report differences')
+    args = parser.parse_args()
+
+    df = read_table(args.input)
+    start = time.perf_counter()
+    features, bad_games = engineer_features(df)
+    elapsed = time.perf_counter() - start
+    print(f"Built features for {len(features)} rows in {elapsed * 1000:.1f}ms")
+
+    if bad_games:
+        listed = ', '.join(f"{game} ({count} rows)" for game, count in list(bad_games.items())[:10])
+        print(f"{len(bad_games)} game(s) do not have exactly two rows; their opponent columns are left empty: "
+              f"{listed}{' ...' if len(bad_games) > 10 else ''}")
+        if args.strict:
+            raise SystemExit(1)
+
+    write_table(features, args.output)
+    print(f"Saved features to {args.output}")
+
+    if args.compare_legacy:
+        start = time.perf_counter()
+        legacy = legacy_features(df)
+        legacy_elapsed = time.perf_counter() - start
+        print(f"Legacy steps: {legacy_elapsed * 1000:.1f}ms ({legacy_elapsed / elapsed:.0f}x slower)")
+        if list(legacy.columns) != list(features.columns):
+            print("Column order differs from the legacy output")
+        # The legacy sort was not stable, so rows within a game are matched on team
+        key = ['game_id', 'team']
+        features = features.sort_values(key, kind='stable').reset_index(drop=True)
+        legacy = legacy.sort_values(key, kind='stable').reset_index(drop=True)
+        differences = 0
+        for column in features.columns:
+            new, old = features[column], legacy[column]
+            both_missing = new.isna() & old.isna()
+            if new.dtype.kind in 'fiub' and old.dtype.kind in 'fiub':
+                same = np.isclose(new.to_numpy(dtype=float), old.to_numpy(dtype=float)) | both_missing
+            else:
+                same = (new == old) | both_missing
+            if not same.all():
+                filled = (old.isna() & new.notna()).sum()
+                print(f"  {column}: {(~same).sum()} row(s) differ, {filled} of them missing in the legacy output")
+                differences += 1
+        if not differences:
+            print("All columns match the legacy output")
@@ -0,0 +1,321 @@
+"""
+Per-stage instrumentation: what each run cost and how much data it moved.
+
+Every `bbpredict` command runs inside a StageRun, which appends one JSON line
+per run to output/metrics/stages.jsonl. The line has wall and CPU time for
+the stage's process and for the worker processes it waited on, peak resident
+memory, optionally the tracemalloc peak, and the counters the shared modules
+record while the stage runs: rows read and written (through columnStore, and
+by the scripts that read or write CSV directly), Optuna trials, SHAP rows
+explained and SHAP cache hits. Commands started by another command (the
+pipeline's stages) inherit its run id, so one pipeline run can be picked out
+of the file.
+
+Counters are per process. Pool workers return `since(snapshot)` with their
+results and the parent `merge`s them.
+
+`--profile` wraps a stage in cProfile (a .prof file for pstats or snakeviz) or
+in a sampling profiler that records the main thread's stack every few
+milliseconds (collapsed stacks for flamegraph.pl or speedscope), with no change
+to the stage's code. Either one only sees the stage's own process, so work
+done in pool workers shows up as time spent waiting on them.
+
+Only the standard library is imported here, so lightweight commands stay light.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+try:
+    import resource
+except ImportError:  # Windows: no rusage, so peak memory is not recorded
+    resource = None
+
+DEFAULT_METRICS = 'output/metrics/stages.jsonl'
+DEFAULT_PROFILE_DIR = 'output/profiles'
+PROFILERS = ('cprofile', 'sample')
+# Set for the commands a command starts, so they record under the same run id
+RUN_ID_ENV = 'BBPREDICT_RUN_ID'
+
+_counters = Counter()
+_tables = {'read': Counter(), 'written': Counter()}
+
+
+def count(name, n=1):
+    """Add `n` to one of this process's counters."""
+    _counters[name] += n
+
+
+def rows_read(rows, path=None):
+    count('rows_in', rows)
+    if path:
+        _tables['read'][os.path.normpath(path)] += rows
+
+
+def rows_written(rows, path=None):
+    count('rows_out', rows)
+    if path:
+        _tables['written'][os.path.normpath(path)] += rows
+
+
+def counters():
+    """Snapshot of this process's counters."""
+    return dict(_counters)
+
+
+def since(before):
+    """Counters added since `before` (a `counters()` snapshot), e.g. for a pool worker to return."""
+    return {name: value - before.get(name, 0) for name, value in _counters.items()
+            if value != before.get(name, 0)}
+
+
+def merge(counts):
+    """Add counters recorded in another process."""
+    _counters.update(counts)
+
+
+def _peak_mb(maxrss):
+    # ru_maxrss is KB on Linux and bytes on macOS
+    return maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+class CProfiler:
+    """Deterministic profile of every Python call, written as a pstats file."""
+    suffix = '.prof'
+
+    def __init__(self):
+        import cProfile
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def save(self, path):
+        self.profile.dump_stats(path)
+
+    def summary(self, limit=20):
+        import io
+        import pstats
+        out = io.StringIO()
+        pstats.Stats(self.profile, stream=out).sort_stats('cumulative').print_stats(limit)
+        return out.getvalue()
+
+
+class SamplingProfiler:
+    """
+    Samples the main thread's stack every `interval` seconds from a background
+    thread, so the overhead does not grow with the number of calls. A sample
+    cannot be taken while C code holds the GIL; that time is charged to the
+    Python line that made the call.
+    """
+    suffix = '.collapsed'
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+
+    def start(self):
+        import threading
+        self._target = threading.get_ident()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name='bbpredict-sampler', daemon=True)
+        self._thread.start()
+
+    def _sample(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def save(self, path):
+        # One "outermost;...;innermost count" line per distinct stack
+        with open(path, 'w') as f:
+            for stack, samples in self.stacks.most_common():
+                f.write(f'{stack} {samples}\n')
+
+    def summary(self, limit=20):
+        own, total = Counter(), Counter()
+        for stack, samples in self.stacks.items():
+            frames = stack.split(';')
+            own[frames[-1]] += samples
+            for frame in set(frames):
+                total[frame] += samples
+        n = max(sum(self.stacks.values()), 1)
+        lines = [f"{n} samples every {self.interval * 1000:g}ms", f"{'own':>7} {'total':>7}  function"]
+        for frame, samples in own.most_common(limit):
+            lines.append(f"{samples / n:>7.1%} {total[frame] / n:>7.1%}  {frame}")
+        return '\n'.join(lines) + '\n'
+
+
+def make_profiler(kind, interval=0.005):
+    if kind == 'cprofile':
+        return CProfiler()
+    if kind == 'sample':
+        return SamplingProfiler(interval)
+    raise ValueError(f"Unknown profiler '{kind}'; use one of {', '.join(PROFILERS)}")
+
+
+class StageRun:
+    """
+    Measures one command while it runs, and on exit (including failures and
+    sys.exit) appends its record to `metrics_path` and saves its profile.
+
+    Args:
+        command (str): Command name, e.g. 'composites'
+        args (list): The command's arguments, recorded as given
+        metrics_path (str, optional): JSON-lines file; None records nothing
+        profile (str, optional): 'cprofile' or 'sample'
+        profile_dir (str): Where profiles are written
+        profile_interval (float): Seconds between samples of the sampling profiler
+        trace_memory (bool): Also record the tracemalloc peak (slows allocation-heavy stages)
+    """
+
+    def __init__(self, command, args=(), metrics_path=DEFAULT_METRICS, profile=None,
+                 profile_dir=DEFAULT_PROFILE_DIR, profile_interval=0.005, trace_memory=False):
+        self.command = command
+        self.args = list(args)
+        self.metrics_path = metrics_path
+        self.profile = profile
+        self.profile_dir = profile_dir
+        self.profile_interval = profile_interval
+        self.trace_memory = trace_memory
+        self.profiler = None
+        self.record = None
+
+    def __enter__(self):
+        self.run_id = os.environ.get(RUN_ID_ENV) or f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        os.environ[RUN_ID_ENV] = self.run_id
+        self.started = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self._counters = counters()
+        self._tables = {kind: Counter(tables) for kind, tables in _tables.items()}
+        self._children = resource.getrusage(resource.RUSAGE_CHILDREN) if resource else None
+        if self.trace_memory:
+            import tracemalloc
+            tracemalloc.start()
+        if self.profile:
+            self.profiler = make_profiler(self.profile, self.profile_interval)
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        if self.profiler:
+            self.profiler.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.profiler:
+            self.profiler.stop()
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+
+        status, exit_code, error = 'ok', 0, None
+        if exc_type is SystemExit:
+            code = exc.code
+            exit_code = code if isinstance(code, int) else (0 if code is None else 1)
+            status = 'ok' if exit_code == 0 else 'error'
+        elif exc_type is KeyboardInterrupt:
+            status, exit_code = 'interrupted', 130
+        elif exc_type is not None:
+            status, exit_code, error = 'error', 1, f'{exc_type.__name__}: {exc}'
+
+        added = since(self._counters)
+        record = {'run_id': self.run_id, 'command': self.command, 'args': self.args, 'started': self.started,
+                  'pid': os.getpid(), 'status': status, 'exit_code': exit_code, 'wall_seconds': round(wall, 4),
+                  'cpu_seconds': round(cpu, 4)}
+        if error:
+            record['error'] = error
+        if resource:
+            children = resource.getrusage(resource.RUSAGE_CHILDREN)
+            record['children_cpu_seconds'] = round(max(children.ru_utime + children.ru_stime - self._children.ru_utime
+                                                       - self._children.ru_stime, 0.0), 4)
+            record['peak_rss_mb'] = round(_peak_mb(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss), 1)
+            record['children_peak_rss_mb'] = round(_peak_mb(children.ru_maxrss), 1)
+        if self.trace_memory:
+            import tracemalloc
+            record['tracemalloc_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+            tracemalloc.stop()
+        record['rows_in'] = added.pop('rows_in', 0)
+        record['rows_out'] = added.pop('rows_out', 0)
+        record['counters'] = added
+        record['tables'] = {kind: {path: rows - self._tables[kind].get(path, 0) for path, rows in tables.items()
+                                   if rows != self._tables[kind].get(path, 0)}
+                            for kind, tables in _tables.items()}
+
+        if self.profiler:
+            name = f"{self.command}-{self.started.replace(':', '').replace('-', '')}-{os.getpid()}"
+            path = os.path.join(self.profile_dir, name + self.profiler.suffix)
+            try:
+                os.makedirs(self.profile_dir, exist_ok=True)
+                self.profiler.save(path)
+                record['profile'] = path
+                sys.stderr.write(f"\n{self.profile} profile of '{self.command}' saved to {path}\n"
+                                 f"{self.profiler.summary()}")
+            except OSError as e:
+                sys.stderr.write(f"Could not save the profile of '{self.command}': {e}\n")
+
+        self.record = record
+        if self.metrics_path:
+            try:
+                os.makedirs(os.path.dirname(self.metrics_path) or '.', exist_ok=True)
+                # One write per line, so concurrent stages appending to the same file do not interleave
+                with open(self.metrics_path, 'a') as f:
+                    f.write(json.dumps(record) + '\n')
+            except OSError as e:
+                sys.stderr.write(f"Could not record metrics for '{self.command}' in {self.metrics_path}: {e}\n")
+        return False
+
+
+def read_records(path=DEFAULT_METRICS):
+    records = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+    return records
+
+
+def format_records(records):
+    """One line per record: status, time, memory, rows and the non-row counters."""
+    lines = [f"{'command':<16} {'status':<8} {'wall s':>8} {'cpu s':>8} {'child cpu':>9} {'peak MB':>8} "
+             f"{'rows in':>10} {'rows out':>10}  counters"]
+    for record in records:
+        peak = max(record.get('peak_rss_mb', 0), record.get('children_peak_rss_mb', 0))
+        counts = ', '.join(f'{name}={value}' for name, value in sorted(record['counters'].items()))
+        lines.append(f"{record['command']:<16} {record['status']:<8} {record['wall_seconds']:>8.2f} "
+                     f"{record['cpu_seconds']:>8.2f} {record.get('children_cpu_seconds', 0):>9.2f} {peak:>8.0f} "
+                     f"{record['rows_in']:>10} {record['rows_out']:>10}  {counts}")
+    return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Show recorded stage metrics, by default those of the last run')
+    parser.add_argument('--metrics', type=str, default=os.environ.get('BBPREDICT_METRICS') or DEFAULT_METRICS,
+                        help=f'Metrics file (default: the one bbpredict records to, {DEFAULT_METRICS})')
+    parser.add_argument('--run', type=str, help='Run id to show (default: the most recent run)')
+    parser.add_argument('--command', type=str, help='Only records of this command, from every run')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.metrics):
+        sys.exit(f"No metrics recorded yet in {args.metrics}")
+    # Runs of this viewer (`bbpredict metrics`) are recorded too, but never shown
+    records = [record for record in read_records(args.metrics) if record['command'] != 'metrics']
+    if args.command:
+        records = [record for record in records if record['command'] == args.command]
+    else:
+        run_id = args.run or (records[-1]['run_id'] if records else None)
+        records = [record for record in records if record['run_id'] == run_id]
+        print(f"Run {run_id}")
+    print(format_records(records))
@@ -0,0 +1,479 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+
+from bbpredict import COMMANDS
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = '.pipeline_cache'
+
+
+@dataclass
+class Stage:
+    """
+    One pipeline step: a bbpredict command plus the files it reads and writes.
+
+    `params` are passed to the command as --name value options and are part of
+    the cache key, together with the command's code and the content of every
+    input. An `optional` stage (and everything after it) is skipped when one of
+    its source files does not exist, unless it is asked for by name. `studies`
+    names the Optuna models whose stored studies the stage resumes; their
+    trials are part of the key too, since they decide the tuned parameters.
+    """
+    name: str
+    command: str
+    inputs: list
+    outputs: list
+    params: dict = field(default_factory=dict)
+    extra_args: list = field(default_factory=list)
+    optional: bool = False
+    studies: list = field(default_factory=list)
+
+    def args(self):
+        args = list(self.extra_args)
+        for name, value in self.params.items():
+            option = '--' + name.replace('_', '-')
+            if value is True:
+                args.append(option)
+            elif value is not False and value is not None:
+                args.extend([option, str(value)])
+        return args
+
+
+# Tuning and SHAP settings of the SHAP stages, spelled out so they are part of the cache key
+TUNING_PARAMS = {'trials': 50, 'storage': 'sqlite:///data/optuna.db', 'shap_cache': 'data/shap_cache'}
+
+
+# Stages in pipeline order. Several scripts rewrite the same file in place; the
+# runner orders them by declaration and keeps every version of a file in its
+# content-addressed cache, so any stage can be rerun against the exact input
+# version it saw before.
+STAGES = [
+    Stage('features', 'features', ['data/merged_team_games.csv'], ['data/merged_team_games.npz']),
+    Stage('composites', 'composites', ['data/merged_team_games.npz'], ['data/SHAP/RaptorMerged.npz'],
+          params=dict(TUNING_PARAMS), studies=['efg', 'pem', 'rebf']),
+    Stage('raptor', 'raptor', ['data/SHAP/RaptorMerged.npz'], ['data/SHAP/RaptorMerged.npz'],
+          params=dict(TUNING_PARAMS), studies=['raptor']),
+    Stage('rank-shap', 'rank', ['data/SHAP/RaptorMerged.npz', 'data/team_region_groups.csv'],
+          ['output/shapRankings.csv', 'output/SHAPRanking.csv'],
+          extra_args=['--source', 'Avg RaptorScore=data/SHAP/RaptorMerged.npz:Raptor_Score',
+                      '--output', 'output/shapRankings.csv']),
+    Stage('elo', 'elo', ['data/merged_team_games.npz'], ['data/merged_team_games_with_elo.npz'],
+          params={'k': 32, 'initial_rating': 1500, 'home_advantage': 0.0, 'passes': 100, 'threshold': 0.1},
+          extra_args=['--games', 'data/merged_team_games.npz', '--output', 'data/merged_team_games_with_elo.npz']),
+    Stage('elo-rank', 'rank', ['data/merged_team_games_with_elo.npz', 'data/team_region_groups.csv'],
+          ['output/eloRankings.csv', 'output/regionGroupEloRanking.csv'],
+          extra_args=['--source', 'elo=data/merged_team_games_with_elo.npz:final_elo',
+                      '--output', 'output/eloRankings.csv']),
+    Stage('matrix', 'matrix', ['output/SHAPRanking.csv', 'output/regionGroupEloRanking.csv',
+                               'data/team_region_groups.csv'],
+          ['output/probabilityMatrix.npy', 'output/probabilityMatrix.json']),
+    # Scores the slate in data/matchups.csv (team1, team2[, SHAP_weight]) when there is one
+    Stage('predict', 'predict', ['data/matchups.csv', 'output/SHAPRanking.csv', 'output/regionGroupEloRanking.csv'],
+          ['output/predictions.csv'], params={'SHAP_weight': 0.5},
+          extra_args=['--batch', 'data/matchups.csv', '--output', 'output/predictions.csv'], optional=True),
+]
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def study_fingerprint(storage, models, root='.'):
+    """
+    Hash of every finished trial (number, state and value) of the stored Optuna
+    studies of `models` (studies are named <model>-<data fingerprint>), or a
+    marker when there is no persistent storage to read.
+    """
+    if not storage:
+        return 'in-memory'
+    if not storage.startswith('sqlite:///'):
+        # Other databases are not read here; the URL alone is part of the key
+        return storage
+    path = storage[len('sqlite:///'):]
+    path = path if os.path.isabs(path) else os.path.join(root, path)
+    if not os.path.exists(path):
+        return 'empty'
+    import sqlite3
+
+    connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        rows = []
+        for model in models:
+            rows += connection.execute(
+                "SELECT s.study_name, t.number, t.state, v.value FROM studies s "
+                "JOIN trials t ON t.study_id = s.study_id "
+                "LEFT JOIN trial_values v ON v.trial_id = t.trial_id AND v.objective = 0 "
+                "WHERE s.study_name LIKE ? AND t.state != 'RUNNING' ORDER BY s.study_name, t.number",
+                (model + '-%',)).fetchall()
+    except sqlite3.Error:
+        # Not an Optuna database (yet): fall back to its content
+        return file_hash(path)
+    finally:
+        connection.close()
+    return hashlib.sha256(json.dumps(rows).encode()).hexdigest()
+
+
+_LOCAL_IMPORT = re.compile(r'^\s*(?:from\s+(\w+)\s+import|import\s+(\w+))', re.MULTILINE)
+
+
+def code_hash(script, seen=None):
+    """Hash of a script plus every module in src/ it imports, followed recursively."""
+    seen = set() if seen is None else seen
+    seen.add(os.path.abspath(script))
+    digest = hashlib.sha256(open(script, 'rb').read())
+    for match in _LOCAL_IMPORT.finditer(open(script).read()):
+        module = match.group(1) or match.group(2)
+        for directory in (os.path.dirname(script), SRC_DIR):
+            path = os.path.abspath(os.path.join(directory, module + '.py'))
+            if os.path.exists(path) and path not in seen:
+                digest.update(code_hash(path, seen).encode())
+                break
+    return digest.hexdigest()
+
+
+def build_dependencies(stages):
+    """
+    Dependencies between stages from the files they share, in declaration order.
+
+    A stage depends on the previous writer of each file it reads or writes, and a
+    writer also depends on every stage that read the version it replaces, so two
+    stages that can run at the same time never touch different versions of the
+    same file.
+
+    Returns:
+        tuple: (dependencies, input_writers) where dependencies maps a stage to the
+               set of stages it waits for and input_writers maps (stage, path) to
+               the stage that wrote the version it reads (None for source files)
+    """
+    dependencies = {stage.name: set() for stage in stages}
+    input_writers = {}
+    last_writer = {}
+    readers_since_write = {}
+    for stage in stages:
+        for path in stage.inputs:
+            writer = last_writer.get(path)
+            input_writers[(stage.name, path)] = writer
+            if writer:
+                dependencies[stage.name].add(writer)
+            readers_since_write.setdefault(path, set()).add(stage.name)
+        for path in stage.outputs:
+            if last_writer.get(path):
+                dependencies[stage.name].add(last_writer[path])
+            dependencies[stage.name] |= readers_since_write.get(path, set()) - {stage.name}
+            last_writer[path] = stage.name
+            readers_since_write[path] = set()
+    return dependencies, input_writers
+
+
+class PipelineRunner:
+    """
+    Runs stages in dependency order, in parallel where possible, skipping every
+    stage whose cache key (code, parameters and input content hashes) is unchanged.
+
+    Each output version is stored under .pipeline_cache/objects/<sha256> and each
+    run under stages/<stage>/<key>.json, so switching a parameter back to an earlier
+    value is a cache hit. Before a stage runs, its inputs are restored to the
+    versions its upstream stages produced.
+    """
+
+    def __init__(self, stages, root='.', jobs=None, force=(), dry_run=False):
+        self.stages = {stage.name: stage for stage in stages}
+        self.order = [stage.name for stage in stages]
+        self.root = root
+        self.jobs = jobs or os.cpu_count() or 1
+        self.force = set(force)
+        self.dry_run = dry_run
+        self.cache_dir = os.path.join(root, CACHE_DIR)
+        self.dependencies, self.input_writers = build_dependencies(stages)
+        self.versions = {}       # (stage, path) -> hash of each output version
+        self.on_disk = {}        # path -> hash currently in the working tree
+        self.written = {path for stage in stages for path in stage.outputs}
+        self.sources = self._load_sources()
+        self.lock = threading.Lock()
+
+    def _path(self, relative):
+        return os.path.join(self.root, relative)
+
+    def _record_path(self, name, key):
+        return os.path.join(self.cache_dir, 'stages', name, f'{key}.json')
+
+    def _object_path(self, digest):
+        return os.path.join(self.cache_dir, 'objects', digest)
+
+    def _load_sources(self):
+        try:
+            with open(os.path.join(self.cache_dir, 'sources.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_sources(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(os.path.join(self.cache_dir, 'sources.json.tmp'), 'w') as f:
+            json.dump(self.sources, f, indent=1)
+        os.replace(os.path.join(self.cache_dir, 'sources.json.tmp'), os.path.join(self.cache_dir, 'sources.json'))
+
+    def source_version(self, path):
+        """
+        Hash of the original content of a source file.
+
+        A source that stages rewrite in place holds a pipeline-produced version
+        after a run; that version maps back to the
+        source it was produced from, so an unchanged source stays cached.
+        """
+        digest = self._disk_hash(path)
+        if digest is None:
+            return None
+        if path not in self.written:
+            return digest
+        record = self.sources.get(path)
+        if record and digest in record['produced']:
+            return record['source']
+        if not self.dry_run:
+            self._store(path)
+            self.sources[path] = {'source': digest, 'produced': []}
+            self._save_sources()
+        return digest
+
+    def _disk_hash(self, path):
+        if path not in self.on_disk:
+            full_path = self._path(path)
+            self.on_disk[path] = file_hash(full_path) if os.path.exists(full_path) else None
+        return self.on_disk[path]
+
+    def _store(self, path):
+        digest = file_hash(self._path(path))
+        target = self._object_path(digest)
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(self._path(path), target + '.tmp')
+            os.replace(target + '.tmp', target)
+        self.on_disk[path] = digest
+        return digest
+
+    def _materialize(self, path, digest):
+        """Put a stored version of a file in the working tree if it is not already there."""
+        if self._disk_hash(path) == digest:
+            return
+        if not os.path.exists(self._object_path(digest)):
+            raise FileNotFoundError(f"Cached version {digest[:12]} of {path} is missing; rerun with --force")
+        os.makedirs(os.path.dirname(self._path(path)) or '.', exist_ok=True)
+        shutil.copyfile(self._object_path(digest), self._path(path) + '.tmp')
+        os.replace(self._path(path) + '.tmp', self._path(path))
+        self.on_disk[path] = digest
+
+    def input_versions(self, name):
+        stage = self.stages[name]
+        versions = {}
+        for path in stage.inputs:
+            writer = self.input_writers[(name, path)]
+            if writer:
+                versions[path] = self.versions[(writer, path)]
+            else:
+                digest = self.source_version(path)
+                if digest is None:
+                    raise FileNotFoundError(f"Stage {name} needs {path}, which does not exist")
+                versions[path] = digest
+        return versions
+
+    def missing_sources(self, name):
+        """Source files (read but not written by an earlier stage) of a stage that do not exist."""
+        return [path for path in self.stages[name].inputs
+                if self.input_writers[(name, path)] is None and not os.path.exists(self._path(path))]
+
+    def cache_key(self, name, inputs):
+        stage = self.stages[name]
+        payload = {
+            'command': stage.command,
+            'code': code_hash(os.path.join(self.root, COMMANDS[stage.command][0])),
+            'args': stage.args(),
+            'inputs': inputs,
+        }
+        if stage.studies:
+            payload['studies'] = study_fingerprint(stage.params.get('storage'), stage.studies, self.root)
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def _cached_record(self, name, key):
+        try:
+            with open(self._record_path(name, key)) as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not all(os.path.exists(self._object_path(digest)) for digest in record['outputs'].values()):
+            return None
+        return record
+
+    def prepare(self, name):
+        """Decide whether a ready stage can be skipped; returns (key, inputs, record or None)."""
+        with self.lock:
+            inputs = self.input_versions(name)
+            key = self.cache_key(name, inputs)
+            record = None if name in self.force else self._cached_record(name, key)
+            if record is not None:
+                for path, digest in record['outputs'].items():
+                    self.versions[(name, path)] = digest
+            elif not self.dry_run:
+                for path, digest in inputs.items():
+                    self._materialize(path, digest)
+            return key, inputs, record
+
+    def execute(self, name, key):
+        stage = self.stages[name]
+        if self.dry_run:
+            # Pretend outputs change so downstream stages show as affected
+            for path in stage.outputs:
+                self.versions[(name, path)] = f'pending:{name}'
+            return 0.0
+
+        log_path = os.path.join(self.cache_dir, 'logs', f'{name}.log')
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        start = time.perf_counter()
+        with open(log_path, 'w') as log:
+            completed = subprocess.run(
+                [sys.executable, os.path.join(SRC_DIR, 'bbpredict.py'), '--root', self.root, stage.command]
+                + stage.args(),
+                cwd=self.root, stdout=log, stderr=subprocess.STDOUT,
+            )
+        elapsed = time.perf_counter() - start
+        if completed.returncode != 0:
+            raise RuntimeError(f"Stage {name} failed with exit code {completed.returncode}; see {log_path}")
+        missing = [path for path in stage.outputs if not os.path.exists(self._path(path))]
+        if missing:
+            raise RuntimeError(f"Stage {name} did not write {', '.join(missing)}; see {log_path}")
+
+        with self.lock:
+            for path in stage.outputs:
+                self.on_disk.pop(path, None)
+                self.versions[(name, path)] = self._store(path)
+                if path in self.sources and self.versions[(name, path)] not in self.sources[path]['produced']:
+                    self.sources[path]['produced'].append(self.versions[(name, path)])
+            self._save_sources()
+            keys = [key]
+            if stage.studies:
+                # The run added its trials to the studies; the next run sees them, so file it under that key too
+                keys.append(self.cache_key(name, self.input_versions(name)))
+            os.makedirs(os.path.dirname(self._record_path(name, key)), exist_ok=True)
+            for record_key in dict.fromkeys(keys):
+                with open(self._record_path(name, record_key), 'w') as f:
+                    json.dump({'key': record_key, 'seconds': elapsed,
+                               'outputs': {path: self.versions[(name, path)] for path in stage.outputs}}, f,
+                              indent=1)
+        return elapsed
+
+    def run(self, targets=None):
+        """
+        Run the targets (default: every stage) and everything upstream of them.
+
+        Returns:
+            list: (stage, status, seconds) in completion order
+        """
+        wanted = set(targets or self.order)
+        pending = list(wanted)
+        while pending:
+            for dependency in self.dependencies[pending.pop()]:
+                if dependency not in wanted:
+                    wanted.add(dependency)
+                    pending.append(dependency)
+
+        done, running, report, skipped = set(), {}, [], set()
+        with ThreadPoolExecutor(self.jobs) as pool:
+            while len(done) < len(wanted):
+                for name in self.order:
+                    if name in wanted and name not in done and name not in running \
+                            and self.dependencies[name] <= done:
+                        missing = self.missing_sources(name) if self.stages[name].optional \
+                            and name not in (targets or []) else []
+                        if missing or self.dependencies[name] & skipped:
+                            done.add(name)
+                            skipped.add(name)
+                            report.append((name, 'skipped', 0.0))
+                            print(f"[skipped] {name}: " + (f"no {', '.join(missing)}" if missing
+                                                           else 'an upstream stage was skipped'))
+                            continue
+                        key, _, record = self.prepare(name)
+                        if record is not None:
+                            done.add(name)
+                            report.append((name, 'cached', record.get('seconds', 0.0)))
+                            print(f"[cached] {name}")
+                        else:
+                            print(f"[{'would run' if self.dry_run else 'run'}] {name}")
+                            running[name] = pool.submit(self.execute, name, key)
+                if not running:
+                    continue
+                finished, _ = wait(running.values(), return_when=FIRST_COMPLETED)
+                for name, future in list(running.items()):
+                    if future in finished:
+                        seconds = future.result()
+                        del running[name]
+                        done.add(name)
+                        report.append((name, 'would run' if self.dry_run else 'ran', seconds))
+                        if not self.dry_run:
+                            print(f"[done] {name} in {seconds:.1f}s")
+
+        if not self.dry_run:
+            # Leave the final version of every file in the working tree
+            for name in self.order:
+                if name in wanted and name not in skipped:
+                    for path in self.stages[name].outputs:
+                        self._materialize(path, self.versions[(name, path)])
+        return report
+
+
+def apply_overrides(stages, overrides):
+    """Apply STAGE.PARAM=VALUE overrides to stage parameters."""
+    by_name = {stage.name: stage for stage in stages}
+    for override in overrides:
+        target, _, value = override.partition('=')
+        name, _, param = target.partition('.')
+        if name not in by_name or not param or not value:
+            raise ValueError(f"Override must look like STAGE.PARAM=VALUE with a known stage, got '{override}'")
+        by_name[name].params[param] = json.loads(value) if value in ('true', 'false') else value
+    return stages
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run pipeline stages with content-hash caching')
+    parser.add_argument('targets', nargs='*', help='Stages to bring up to date (default: all)')
+    parser.add_argument('--root', type=str, default='.', help='Project root (default: the working directory)')
+    parser.add_argument('--jobs', type=int, help='Stages run at the same time (default: CPU count)')
+    parser.add_argument('--set', type=str, action='append', default=[], metavar='STAGE.PARAM=VALUE',
+                        help='Override a stage parameter, e.g. --set elo.k=20')
+    parser.add_argument('--force', type=str, action='append', default=[], metavar='STAGE',
+                        help='Rerun a stage even if its cache is valid')
+    parser.add_argument('--dry-run', action='store_true', help='Show which stages would run')
+    parser.add_argument('--list', action='store_true', help='List stages with their inputs and outputs')
+    args = parser.parse_args()
+
+    stages = apply_overrides(STAGES, args.set)
+    if args.list:
+        dependencies, _ = build_dependencies(stages)
+        for stage in stages:
+            print(f"{stage.name:<18} after: {', '.join(sorted(dependencies[stage.name])) or '-'}")
+            print(f"{'':<18} reads: {', '.join(stage.inputs)}")
+            print(f"{'':<18} writes: {', '.join(stage.outputs)}" + (' (optional)' if stage.optional else ''))
+        raise SystemExit(0)
+
+    runner = PipelineRunner(stages, os.path.abspath(args.root), args.jobs, args.force, args.dry_run)
+    start = time.perf_counter()
+    try:
+        report = runner.run(args.targets)
+    except (RuntimeError, FileNotFoundError) as error:
+        raise SystemExit(str(error))
+    cached = [name for name, status, _ in report if status == 'cached']
+    skipped = [name for name, status, _ in report if status == 'skipped']
+    print(f"\n{len(report) - len(cached) - len(skipped)} stage(s) {'would run' if args.dry_run else 'ran'}, "
+          f"{len(cached)} cached, {len(skipped)} skipped, in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,267 @@
+import asyncio
+import argparse
+import http
+import json
+import os
+import random
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qs
+
+from predictwinners import RatingIndex, normalize_team_name, DEFAULT_SHAP_PATH, DEFAULT_ELO_PATH
+
+
+class RatingStore:
+    """
+    Keeps a RatingIndex resident and swaps in a new one when the rating files change.
+
+    The current (version, index) pair is replaced with a single assignment, so a
+    request that already picked up a snapshot finishes against it while new
+    requests see the reloaded ratings.
+    """
+
+    def __init__(self, SHAP_path=DEFAULT_SHAP_PATH, elo_path=DEFAULT_ELO_PATH):
+        self.SHAP_path = SHAP_path
+        self.elo_path = elo_path
+        self.snapshot = (self._file_version(), RatingIndex.load(SHAP_path, elo_path))
+
+    def _file_version(self):
+        return f"{os.stat(self.SHAP_path).st_mtime_ns}-{os.stat(self.elo_path).st_mtime_ns}"
+
+    async def watch(self, interval=1.0):
+        """Poll the rating files' mtimes and reload them off the event loop when they change."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                version = self._file_version()
+                if version == self.snapshot[0]:
+                    continue
+                index = await loop.run_in_executor(None, RatingIndex.load, self.SHAP_path, self.elo_path)
+                # A writer may still have been mid-save; only publish if nothing changed while loading
+                if self._file_version() == version:
+                    self.snapshot = (version, index)
+                    print(f"Reloaded ratings (version {version}, {len(index)} teams)")
+            except Exception as e:
+                print(f"Error reloading rating files, keeping version {self.snapshot[0]}: {e}")
+
+
+class PredictionCache:
+    """LRU cache of matchup results keyed by ratings version, teams and SHAP weight."""
+
+    def __init__(self, maxsize=65536):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        result = self.entries.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return result
+
+    def put(self, key, result):
+        self.entries[key] = result
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+
+class PredictionServer:
+    """
+    Minimal asyncio HTTP/1.1 server answering matchup queries from resident ratings.
+
+    Endpoints:
+        GET  /predict?team1=...&team2=...[&SHAP_weight=0.5]
+        POST /batch   {"matchups": [[team1, team2(, SHAP_weight)], ...], "SHAP_weight": 0.5}
+        GET  /health
+    """
+
+    def __init__(self, store, cache_size=65536):
+        self.store = store
+        self.cache = PredictionCache(cache_size)
+
+    def predict(self, team1, team2, SHAP_weight=0.5):
+        version, index = self.store.snapshot
+        # Cached and answered under normalized names, so every spelling of a matchup gets the same entry
+        team1, team2 = normalize_team_name(team1), normalize_team_name(team2)
+        key = (version, team1, team2, SHAP_weight)
+        result = self.cache.get(key)
+        if result is None:
+            probabilities = index.get_match_probabilities(team1, team2, SHAP_weight)
+            if probabilities is None:
+                return 404, {'error': 'team not found', 'unknown_teams': [t for t in (team1, team2) if t not in index]}
+            result = {
+                'team1': team1,
+                'team2': team2,
+                'SHAP_weight': SHAP_weight,
+                'team1_win_probability': probabilities[0],
+                'team2_win_probability': probabilities[1],
+                'version': version,
+            }
+            self.cache.put(key, result)
+        return 200, result
+
+    def batch(self, payload):
+        version, index = self.store.snapshot
+        default_weight = float(payload.get('SHAP_weight', 0.5))
+        matchups = payload.get('matchups', [])
+        team1s = [m[0] for m in matchups]
+        team2s = [m[1] for m in matchups]
+        weights = [float(m[2]) if len(m) > 2 else default_weight for m in matchups]
+        results, unknown_teams = index.batch_probabilities(team1s, team2s, weights)
+        results = results.astype(object).where(results.notna(), None)
+        return 200, {'results': results.to_dict(orient='records'), 'unknown_teams': unknown_teams, 'version': version}
+
+    def route(self, method, target, body):
+        url = urlsplit(target)
+        if method == 'GET' and url.path == '/predict':
+            query = parse_qs(url.query)
+            if 'team1' not in query or 'team2' not in query:
+                return 400, {'error': 'team1 and team2 are required'}
+            return self.predict(query['team1'][0], query['team2'][0], float(query.get('SHAP_weight', ['0.5'])[0]))
+        if method == 'POST' and url.path == '/batch':
+            return self.batch(json.loads(body or b'{}'))
+        if method == 'GET' and url.path == '/health':
+            version, index = self.store.snapshot
+            return 200, {'version': version, 'teams': len(index),
+                         'cache': {'size': len(self.cache.entries), 'hits': self.cache.hits,
+                                   'misses': self.cache.misses}}
+        return 404, {'error': f'no route for {method} {url.path}'}
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                headers, body = {}, None
+                try:
+                    request_line, *header_lines = head.decode('latin-1').split('\r\n')
+                    method, target, _ = request_line.split(' ', 2)
+                    for line in header_lines:
+                        if ':' in line:
+                            name, value = line.split(':', 1)
+                            headers[name.strip().lower()] = value.strip()
+                    length = int(headers.get('content-length', 0))
+                    if length < 0:
+                        raise ValueError(f'invalid Content-Length {length}')
+                    body = await reader.readexactly(length)
+                    status, payload = self.route(method, target, body)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except Exception as e:
+                    # A malformed request line or header leaves the stream unparseable, so close after answering
+                    status, payload = 400, {'error': str(e)}
+                    if body is None:
+                        headers['connection'] = 'close'
+
+                data = json.dumps(payload).encode()
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                writer.write(
+                    f"HTTP/1.1 {status} {http.HTTPStatus(status).phrase}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+
+async def serve(args):
+    store = RatingStore(args.SHAP_file, args.elo_file)
+    server = PredictionServer(store, args.cache_size)
+    if args.unix:
+        listener = await asyncio.start_unix_server(server.handle_connection, path=args.unix)
+        where = args.unix
+    else:
+        listener = await asyncio.start_server(server.handle_connection, args.host, args.port)
+        where = f"http://{args.host}:{args.port}"
+    print(f"Serving {len(store.snapshot[1])} teams (version {store.snapshot[0]}) on {where}")
+    watcher = asyncio.create_task(store.watch(args.reload_interval))
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        watcher.cancel()
+
+
+async def _load_test_worker(args, targets, latencies, deadline_count):
+    if args.unix:
+        reader, writer = await asyncio.open_unix_connection(args.unix)
+    else:
+        reader, writer = await asyncio.open_connection(args.host, args.port)
+    try:
+        while deadline_count[0] > 0:
+            deadline_count[0] -= 1
+            target = random.choice(targets)
+            start = time.perf_counter()
+            writer.write(f"GET {target} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+            await writer.drain()
+            head = await reader.readuntil(b'\r\n\r\n')
+            length = int(head.lower().split(b'content-length:')[1].split(b'\r\n')[0])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def load_test(args):
+    """
+    Replay single-matchup queries over keep-alive connections and report QPS and latency.
+
+    Pairs are drawn from a pool of `--pairs` matchups, so after the first pass
+    every request is answered from the cache.
+    """
+    teams = RatingIndex.load(args.SHAP_file, args.elo_file).teams
+    rng = random.Random(args.seed)
+    targets = [f"/predict?team1={a}&team2={b}&SHAP_weight=0.5"
+               for a, b in (rng.sample(teams, 2) for _ in range(args.pairs))]
+
+    latencies = []
+    remaining = [args.requests]
+    start = time.perf_counter()
+    await asyncio.gather(*(_load_test_worker(args, targets, latencies, remaining) for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000
+
+    print(f"Requests: {len(latencies):,} over {args.concurrency} connection(s) in {elapsed:.2f}s")
+    print(f"QPS: {len(latencies) / elapsed:,.0f}")
+    print(f"Latency ms: p50={percentile(50):.3f} p90={percentile(90):.3f} "
+          f"p99={percentile(99):.3f} max={latencies[-1] * 1000:.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Local prediction server with warm ratings cache')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Host (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8765, help='Port (default: 8765)')
+    parser.add_argument('--unix', type=str, help='Listen on / connect to a Unix socket instead of TCP')
+    parser.add_argument('--SHAP-file', type=str, default=DEFAULT_SHAP_PATH, help='Tab-delimited SHAP ranking file')
+    parser.add_argument('--elo-file', type=str, default=DEFAULT_ELO_PATH, help='Tab-delimited Elo ranking file')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subparsers.add_parser('serve', help='Run the server')
+    serve_parser.add_argument('--cache-size', type=int, default=65536, help='LRU cache entries (default: 65536)')
+    serve_parser.add_argument('--reload-interval', type=float, default=1.0,
+                              help='Seconds between rating file mtime checks (default: 1)')
+
+    load_parser = subparsers.add_parser('loadtest', help='Benchmark a running server')
+    load_parser.add_argument('--requests', type=int, default=20000, help='Total requests (default: 20000)')
+    load_parser.add_argument('--concurrency', type=int, default=8, help='Concurrent connections (default: 8)')
+    load_parser.add_argument('--pairs', type=int, default=200, help='Distinct matchups to cycle through (default: 200)')
+    load_parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args) if args.command == 'serve' else load_test(args))
+    except KeyboardInterrupt:
+        pass
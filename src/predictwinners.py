@@ -1,7 +1,178 @@
 import pandas as pd
-import math
+import numpy as np
+import argparse
+import sys
 
-def get_match_probabilities(team1_name, team2_name, SHAP_weight=0.5):
+import instrumentation
+
+DEFAULT_SHAP_PATH = "output/SHAPRanking.csv"
+DEFAULT_ELO_PATH = "output/regionGroupEloRanking.csv"
+DEFAULT_FORM_COLUMN = "NRtg_ewm3"
+
+
+def normalize_team_name(name):
+    """Standardize a team name for lookup (strip whitespace, lowercase)."""
+    return str(name).strip().lower()
+
+
+class RatingIndex:
+    """
+    SHAP scores and Elo ratings for every team, loaded once and indexed by team name.
+
+    Team names are normalized with `normalize_team_name` and mapped to integer ids
+    that index into NumPy arrays of ratings, so looking up a slate of games is a
+    hash lookup per team followed by a single vectorized probability pass.
+    """
+
+    def __init__(self, teams, SHAP_scores, elo_ratings, form=None):
+        """
+        Args:
+            teams (list of str): Normalized team names, in id order
+            SHAP_scores (array-like): SHAP score for each team
+            elo_ratings (array-like): Elo rating for each team
+            form (array-like, optional): Recent-form value for each team (NaN if unknown)
+        """
+        self.teams = list(teams)
+        self.SHAP = np.asarray(SHAP_scores, dtype=float)
+        self.elo = np.asarray(elo_ratings, dtype=float)
+        self.form = np.asarray(form, dtype=float) if form is not None else None
+        self.team_ids = {team: i for i, team in enumerate(self.teams)}
+
+    @classmethod
+    def load(cls, SHAP_path=DEFAULT_SHAP_PATH, elo_path=DEFAULT_ELO_PATH, form_path=None,
+             form_column=DEFAULT_FORM_COLUMN):
+        """
+        Load the tab-delimited SHAP ranking and Elo ranking files.
+
+        Only teams present in both files are indexed; if a name appears more than
+        once in a file, its first row is used.
+
+        Args:
+            SHAP_path (str): Path to SHAPRanking.csv
+            elo_path (str): Path to regionGroupEloRanking.csv
+            form_path (str, optional): Path to team_form_latest.csv from teamForm.py
+            form_column (str): Form column to load, e.g. NRtg_ewm3 or Point_Differential_last5
+
+        Returns:
+            RatingIndex: The loaded index
+        """
+        SHAP_df = pd.read_csv(SHAP_path, delimiter='\t', header=0, usecols=['Team', 'Avg RaptorScore'])
+        elo_df = pd.read_csv(elo_path, delimiter='\t', header=0, usecols=['team', 'elo'])
+
+        SHAP_df['key'] = SHAP_df['Team'].str.strip().str.lower()
+        elo_df['key'] = elo_df['team'].str.strip().str.lower()
+        SHAP_df = SHAP_df.drop_duplicates('key')
+        elo_df = elo_df.drop_duplicates('key')
+
+        # Keep the SHAP file's team order for stable ids
+        merged = SHAP_df.merge(elo_df, on='key', how='inner', sort=False)
+        if form_path is None:
+            return cls(merged['key'], merged['Avg RaptorScore'], merged['elo'])
+
+        form_df = pd.read_csv(form_path, delimiter='\t', header=0, usecols=['team', form_column])
+        form_df['key'] = form_df['team'].str.strip().str.lower()
+        form_df = form_df.drop_duplicates('key')[['key', form_column]]
+        merged = merged.merge(form_df, on='key', how='left', sort=False)
+        return cls(merged['key'], merged['Avg RaptorScore'], merged['elo'], merged[form_column])
+
+    def __len__(self):
+        return len(self.teams)
+
+    def __contains__(self, team_name):
+        return normalize_team_name(team_name) in self.team_ids
+
+    def lookup(self, team_names):
+        """
+        Map team names to integer ids.
+
+        Args:
+            team_names (iterable of str): Team names (any case/whitespace)
+
+        Returns:
+            numpy.ndarray: Team ids, with -1 for teams not in the index
+        """
+        get = self.team_ids.get
+        return np.fromiter((get(normalize_team_name(name), -1) for name in team_names), dtype=np.int64)
+
+    def get_match_probabilities(self, team1_name, team2_name, SHAP_weight=0.5):
+        """
+        Calculate the win probabilities for a single matchup.
+
+        Returns:
+            tuple: (team1_win_probability, team2_win_probability), or None if either
+                   team is not in the index
+        """
+        team1_id = self.team_ids.get(normalize_team_name(team1_name))
+        team2_id = self.team_ids.get(normalize_team_name(team2_name))
+        if team1_id is None or team2_id is None:
+            return None
+
+        team1_win_prob = float(probability_from_ratings(
+            self.SHAP[team1_id], self.SHAP[team2_id], self.elo[team1_id], self.elo[team2_id], SHAP_weight
+        ))
+        return team1_win_prob, 1.0 - team1_win_prob
+
+    def batch_probabilities(self, team1_names, team2_names, SHAP_weight=0.5, form_weight=0.0):
+        """
+        Calculate win probabilities for many matchups in one vectorized pass.
+
+        Args:
+            team1_names (sequence of str): First team of each matchup
+            team2_names (sequence of str): Second team of each matchup
+            SHAP_weight (float or array-like, optional): Weight given to SHAP scores,
+                                     either one value for every matchup or one per
+                                     matchup. Defaults to 0.5.
+            form_weight (float, optional): Rating points per unit of form difference
+                                     when the index has form values. Defaults to 0.
+
+        Returns:
+            tuple: (results, unknown_teams) where results is a DataFrame with columns
+                   team1, team2, SHAP_weight, team1_win_probability and
+                   team2_win_probability (NaN where a team is unknown), plus
+                   team1_form and team2_form when the index has form values, and
+                   unknown_teams is the sorted list of names not in the index
+        """
+        team1_names = list(team1_names)
+        team2_names = list(team2_names)
+        if len(team1_names) != len(team2_names):
+            raise ValueError("team1_names and team2_names must have the same length")
+
+        team1_ids = self.lookup(team1_names)
+        team2_ids = self.lookup(team2_names)
+        weights = np.broadcast_to(np.asarray(SHAP_weight, dtype=float), team1_ids.shape)
+
+        known = (team1_ids >= 0) & (team2_ids >= 0)
+        form_diff = np.zeros(team1_ids.shape)
+        if self.form is not None:
+            team1_form = np.where(team1_ids >= 0, self.form[team1_ids], np.nan)
+            team2_form = np.where(team2_ids >= 0, self.form[team2_ids], np.nan)
+            # A team without form data contributes no form difference
+            form_diff = np.nan_to_num(team1_form - team2_form)
+        team1_win_prob = np.full(team1_ids.shape, np.nan)
+        team1_win_prob[known] = probability_from_ratings(
+            self.SHAP[team1_ids[known]], self.SHAP[team2_ids[known]],
+            self.elo[team1_ids[known]], self.elo[team2_ids[known]],
+            weights[known], form_diff[known], form_weight
+        )
+
+        unknown_teams = sorted(
+            {name for name, i in zip(team1_names, team1_ids) if i < 0}
+            | {name for name, i in zip(team2_names, team2_ids) if i < 0}
+        )
+        results = pd.DataFrame({
+            'team1': team1_names,
+            'team2': team2_names,
+            'SHAP_weight': weights,
+            'team1_win_probability': team1_win_prob,
+            'team2_win_probability': 1.0 - team1_win_prob,
+        })
+        if self.form is not None:
+            results['team1_form'] = team1_form
+            results['team2_form'] = team2_form
+        return results, unknown_teams
+
+
+def get_match_probabilities(team1_name, team2_name, SHAP_weight=0.5, index=None):
     """
     Calculate the win probabilities for two teams based on their SHAP scores and Elo ratings.
     
@@ -11,59 +182,34 @@ def get_match_probabilities(team1_name, team2_name, SHAP_weight=0.5):
         SHAP_weight (float, optional): Weight given to SHAP scores vs Elo ratings.
                                      0 means only use Elo, 1 means only use SHAP.
                                      Defaults to 0.5 (equal weighting).
+        index (RatingIndex, optional): Preloaded ratings. When omitted the rating
+                                     files are read for this call only; pass an
+                                     index when scoring more than one matchup.
     
     Returns:
         tuple: (team1_win_probability, team2_win_probability)
     """
     # Load the tab-delimited files
-    try:
-        SHAP_df = pd.read_csv("output/SHAPRanking.csv", delimiter='\t', header=0)
-        elo_df = pd.read_csv("output/regionGroupEloRanking.csv", delimiter='\t', header=0)
-    except Exception as e:
-        print(f"Error loading CSV files: {e}")
-        return None
-    
-    # Get team name columns - using exact names from the files
-    SHAP_team_col = 'Team'  # First column in SHAPRanking.csv
-    elo_team_col = 'team'    # First column in regionGroupEloRanking.csv
-    
-    # Standardize team names for lookup (convert to lowercase)
-    SHAP_df[SHAP_team_col] = SHAP_df[SHAP_team_col].str.strip().str.lower()
-    elo_df[elo_team_col] = elo_df[elo_team_col].str.strip().str.lower()
-    
-    team1_name_lower = team1_name.strip().lower()
-    team2_name_lower = team2_name.strip().lower()
-    
-    # Find the teams in both datasets
-    team1_SHAP_data = SHAP_df[SHAP_df[SHAP_team_col] == team1_name_lower]
-    team2_SHAP_data = SHAP_df[SHAP_df[SHAP_team_col] == team2_name_lower]
-    team1_elo_data = elo_df[elo_df[elo_team_col] == team1_name_lower]
-    team2_elo_data = elo_df[elo_df[elo_team_col] == team2_name_lower]
+    if index is None:
+        try:
+            index = RatingIndex.load()
+        except Exception as e:
+            print(f"Error loading CSV files: {e}")
+            return None
     
     # Check if teams are found in both datasets
-    if team1_SHAP_data.empty or team2_SHAP_data.empty or team1_elo_data.empty or team2_elo_data.empty:
-        if team1_SHAP_data.empty or team1_elo_data.empty:
+    result = index.get_match_probabilities(team1_name, team2_name, SHAP_weight)
+    if result is None:
+        if team1_name not in index:
             print(f"Team '{team1_name}' not found in one or both datasets.")
-        if team2_SHAP_data.empty or team2_elo_data.empty:
+        if team2_name not in index:
             print(f"Team '{team2_name}' not found in one or both datasets.")
         return None
     
-    # Get the SHAP scores and Elo ratings using exact column names from files
-    SHAP_score_col = 'Avg RaptorScore'  # From SHAPRanking.csv
-    elo_rating_col = 'elo'               # From regionGroupEloRanking.csv
-    
-    team1_SHAP = float(team1_SHAP_data[SHAP_score_col].values[0])
-    team2_SHAP = float(team2_SHAP_data[SHAP_score_col].values[0])
-    team1_elo = float(team1_elo_data[elo_rating_col].values[0])
-    team2_elo = float(team2_elo_data[elo_rating_col].values[0])
-    
-    # Calculate the probability using the combined ratings
-    team1_win_prob = probability_from_ratings(team1_SHAP, team2_SHAP, team1_elo, team2_elo, SHAP_weight)
-    team2_win_prob = 1.0 - team1_win_prob
-    
-    return team1_win_prob, team2_win_prob
+    return result
 
-def probability_from_ratings(team1_SHAP, team2_SHAP, team1_elo, team2_elo, SHAP_weight=0.5):
+def probability_from_ratings(team1_SHAP, team2_SHAP, team1_elo, team2_elo, SHAP_weight=0.5,
+                             form_diff=0.0, form_weight=0.0):
     """
     Calculate the probability of team1 winning against team2 based on their SHAP scores and Elo ratings.
     
@@ -75,9 +221,13 @@ def probability_from_ratings(team1_SHAP, team2_SHAP, team1_elo, team2_elo, SHAP_
         SHAP_weight (float, optional): Weight given to SHAP scores vs Elo ratings.
                                      0 means only use Elo, 1 means only use SHAP.
                                      Defaults to 0.5 (equal weighting).
+        form_diff (float, optional): Recent-form difference, team1 minus team2
+        form_weight (float, optional): Rating points added per unit of form_diff.
+                                     Defaults to 0 (form not used).
     
     Returns:
-        float: Probability of team1 winning against team2 (between 0 and 1)
+        float: Probability of team1 winning against team2 (between 0 and 1).
+               Array arguments are broadcast and give an array of probabilities.
     """
     # Calculate the difference in SHAP scores
     SHAP_diff = team1_SHAP - team2_SHAP
@@ -86,15 +236,70 @@ def probability_from_ratings(team1_SHAP, team2_SHAP, team1_elo, team2_elo, SHAP_
     elo_diff = team1_elo - team2_elo
     
     # Combine the differences using the specified weight
-    combined_diff = SHAP_weight * SHAP_diff + (1 - SHAP_weight) * elo_diff
+    combined_diff = SHAP_weight * SHAP_diff + (1 - SHAP_weight) * elo_diff + form_weight * form_diff
     
     # Convert combined difference to win probability using logistic function
-    probability = 1.0 / (1.0 + math.pow(10, -combined_diff / 400))
+    probability = 1.0 / (1.0 + np.power(10.0, -combined_diff / 400))
     
     return probability
 
+def read_matchups(csv_path):
+    """
+    Read a matchup slate with columns team1, team2 and an optional SHAP_weight.
+
+    Both comma- and tab-delimited files are accepted.
+    """
+    matchups = pd.read_csv(csv_path, sep=None, engine='python')
+    instrumentation.rows_read(len(matchups), csv_path)
+    missing = {'team1', 'team2'} - set(matchups.columns)
+    if missing:
+        raise ValueError(f"Matchup file is missing column(s): {', '.join(sorted(missing))}")
+    return matchups
+
+
+def batch_mode(args):
+    """Score every matchup in a CSV file with a single load of the rating files"""
+    index = RatingIndex.load(args.SHAP_file, args.elo_file, args.form_file, args.form_column)
+    matchups = read_matchups(args.batch)
+
+    SHAP_weight = matchups['SHAP_weight'].fillna(args.SHAP_weight) if 'SHAP_weight' in matchups else args.SHAP_weight
+    results, unknown_teams = index.batch_probabilities(matchups['team1'], matchups['team2'], SHAP_weight,
+                                                       args.form_weight)
+
+    if unknown_teams:
+        print(f"{len(unknown_teams)} team(s) not found in one or both datasets: {', '.join(unknown_teams)}",
+              file=sys.stderr)
+
+    instrumentation.rows_written(len(results), args.output)
+    if args.output:
+        results.to_csv(args.output, sep='\t', index=False)
+        print(f"Scored {len(results)} matchups; results saved to {args.output}")
+    else:
+        results.to_csv(sys.stdout, sep='\t', index=False)
+
+
 # Example usage
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Predict win probabilities from SHAP scores and Elo ratings')
+    parser.add_argument('--batch', type=str, help='CSV of matchups with columns team1, team2[, SHAP_weight]')
+    parser.add_argument('--output', type=str, help='Output file for batch results (default: stdout)')
+    parser.add_argument('--SHAP-weight', type=float, default=0.5,
+                        help='SHAP weight for rows without their own (default: 0.5)')
+    parser.add_argument('--SHAP-file', type=str, default=DEFAULT_SHAP_PATH, help='Tab-delimited SHAP ranking file')
+    parser.add_argument('--elo-file', type=str, default=DEFAULT_ELO_PATH, help='Tab-delimited Elo ranking file')
+    parser.add_argument('--form-file', type=str,
+                        help='Current team form from teamForm.py (e.g. output/team_form_latest.csv); '
+                             'adds team1_form and team2_form to batch results')
+    parser.add_argument('--form-column', type=str, default=DEFAULT_FORM_COLUMN,
+                        help=f'Form column to use (default: {DEFAULT_FORM_COLUMN})')
+    parser.add_argument('--form-weight', type=float, default=0.0,
+                        help='Rating points per unit of form difference (default: 0, reported only)')
+    args = parser.parse_args()
+
+    if args.batch:
+        batch_mode(args)
+        sys.exit(0)
+
     # Example team names from the datasets
     team1 = "south_carolina_gamecocks"
     team2 = "ucf_knights"
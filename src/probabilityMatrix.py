@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+import argparse
+import hashlib
+import json
+import os
+import time
+
+from predictwinners import RatingIndex, normalize_team_name, DEFAULT_SHAP_PATH, DEFAULT_ELO_PATH
+
+DEFAULT_MATRIX_PATH = "output/probabilityMatrix.npy"
+DEFAULT_SHAP_WEIGHTS = (0.0, 0.25, 0.5, 0.75, 1.0)
+
+
+def sidecar_path(matrix_path):
+    """Path of the JSON file holding the team ids and SHAP weights for a matrix file."""
+    return os.path.splitext(matrix_path)[0] + ".json"
+
+
+def matrix_digest(matrix):
+    """Hash of a matrix's values, recorded in its sidecar to pair the two files."""
+    return hashlib.blake2b(np.ascontiguousarray(matrix), digest_size=16).hexdigest()
+
+
+def build_probability_matrix(teams, index, SHAP_weights=DEFAULT_SHAP_WEIGHTS, out=None, block_size=1024):
+    """
+    Calculate P(team i beats team j) for every pair of teams and every SHAP weight.
+
+    Uses the same formula as `probability_from_ratings`, broadcast over blocks of
+    rows so that memory stays bounded by block_size x N per weight.
+
+    Args:
+        teams (list of str): Teams to include, in matrix order
+        index (RatingIndex): Loaded SHAP scores and Elo ratings
+        SHAP_weights (sequence of float): SHAP weights to precompute
+        out (numpy.ndarray, optional): Array of shape (len(SHAP_weights), N, N) to fill,
+                                       for example a writable memmap
+        block_size (int): Rows computed per broadcast
+
+    Returns:
+        numpy.ndarray: Probability matrix of shape (len(SHAP_weights), N, N). Rows and
+                       columns of teams that are not in the index are NaN.
+    """
+    ids = index.lookup(teams)
+    known = ids >= 0
+    SHAP = np.where(known, index.SHAP[ids], np.nan)
+    elo = np.where(known, index.elo[ids], np.nan)
+
+    n = len(teams)
+    if out is None:
+        out = np.empty((len(SHAP_weights), n, n), dtype=np.float64)
+
+    for w, SHAP_weight in enumerate(SHAP_weights):
+        # Combine the per-team ratings once, so each pair only needs a subtraction
+        combined = SHAP_weight * SHAP + (1 - SHAP_weight) * elo
+        for start in range(0, n, block_size):
+            stop = min(start + block_size, n)
+            combined_diff = combined[start:stop, None] - combined[None, :]
+            out[w, start:stop] = 1.0 / (1.0 + np.power(10.0, -combined_diff / 400))
+    return out
+
+
+def write_probability_matrix(teams, index, matrix_path=DEFAULT_MATRIX_PATH, SHAP_weights=DEFAULT_SHAP_WEIGHTS):
+    """
+    Build the probability matrix directly into a .npy file plus its JSON sidecar.
+
+    Both files are written under temporary names and renamed into place, so readers
+    that already have the old matrix mapped keep a consistent view. The two renames
+    are separate, so the sidecar records the matrix's digest for readers to check.
+    """
+    SHAP_weights = [float(w) for w in SHAP_weights]
+    tmp_path = matrix_path + ".tmp"
+    matrix = np.lib.format.open_memmap(
+        tmp_path, mode='w+', dtype=np.float64, shape=(len(SHAP_weights), len(teams), len(teams))
+    )
+    build_probability_matrix(teams, index, SHAP_weights, out=matrix)
+    matrix.flush()
+    digest = matrix_digest(matrix)
+    del matrix
+
+    metadata = {
+        'teams': list(teams),
+        'SHAP_weights': SHAP_weights,
+        'missing_teams': [team for team in teams if team not in index],
+        'digest': digest,
+    }
+    tmp_sidecar = sidecar_path(matrix_path) + ".tmp"
+    with open(tmp_sidecar, 'w') as f:
+        json.dump(metadata, f, indent=1)
+
+    os.replace(tmp_path, matrix_path)
+    os.replace(tmp_sidecar, sidecar_path(matrix_path))
+    return metadata
+
+
+class ProbabilityMatrix:
+    """
+    Read-only, memory-mapped view of a precomputed probability matrix.
+
+    The matrix is opened with mmap, so any number of processes can share the same
+    pages without copying them. Its digest must match the sidecar's; a reader that
+    opens the two files while a new matrix is being swapped in reads them again.
+    """
+
+    def __init__(self, matrix_path=DEFAULT_MATRIX_PATH, attempts=5):
+        for attempt in range(attempts):
+            with open(sidecar_path(matrix_path)) as f:
+                metadata = json.load(f)
+            matrix = np.load(matrix_path, mmap_mode='r')
+            if 'digest' not in metadata:
+                raise ValueError(f"{sidecar_path(matrix_path)} has no matrix digest; "
+                                 "rebuild it with probabilityMatrix.py")
+            if metadata['digest'] == matrix_digest(matrix):
+                break
+            time.sleep(0.05)
+        else:
+            raise ValueError(f"{matrix_path} does not match the teams in {sidecar_path(matrix_path)}")
+        self.teams = metadata['teams']
+        self.SHAP_weights = metadata['SHAP_weights']
+        self.team_ids = {normalize_team_name(team): i for i, team in enumerate(self.teams)}
+        self.matrix = matrix
+
+    def weight_index(self, SHAP_weight):
+        """Position of a precomputed SHAP weight in the matrix."""
+        for i, w in enumerate(self.SHAP_weights):
+            if np.isclose(w, SHAP_weight):
+                return i
+        raise KeyError(f"SHAP weight {SHAP_weight} was not precomputed (available: {self.SHAP_weights})")
+
+    def lookup(self, team_names):
+        """Map team names to matrix ids, with -1 for unknown teams."""
+        get = self.team_ids.get
+        return np.fromiter((get(normalize_team_name(name), -1) for name in team_names), dtype=np.int64)
+
+    def probability(self, team1_name, team2_name, SHAP_weight=0.5):
+        """
+        Probability that team1 beats team2, or None if either team is unknown.
+        """
+        team1_id = self.team_ids.get(normalize_team_name(team1_name))
+        team2_id = self.team_ids.get(normalize_team_name(team2_name))
+        if team1_id is None or team2_id is None:
+            return None
+        return float(self.matrix[self.weight_index(SHAP_weight), team1_id, team2_id])
+
+    def weight_slice(self, SHAP_weight=0.5):
+        """The N x N matrix for one SHAP weight, as a zero-copy view."""
+        return self.matrix[self.weight_index(SHAP_weight)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Precompute win probabilities for every pair of teams')
+    parser.add_argument('--teams', type=str, default='data/team_region_groups.csv',
+                        help='Tab-delimited file with a team column (default: data/team_region_groups.csv)')
+    parser.add_argument('--weights', type=float, nargs='+', default=list(DEFAULT_SHAP_WEIGHTS),
+                        help='SHAP weights to precompute (default: 0 0.25 0.5 0.75 1)')
+    parser.add_argument('--output', type=str, default=DEFAULT_MATRIX_PATH, help='Output .npy file')
+    parser.add_argument('--SHAP-file', type=str, default=DEFAULT_SHAP_PATH, help='Tab-delimited SHAP ranking file')
+    parser.add_argument('--elo-file', type=str, default=DEFAULT_ELO_PATH, help='Tab-delimited Elo ranking file')
+    args = parser.parse_args()
+
+    teams = pd.read_csv(args.teams, sep='\t')['team'].drop_duplicates().tolist()
+    index = RatingIndex.load(args.SHAP_file, args.elo_file)
+    metadata = write_probability_matrix(teams, index, args.output, args.weights)
+
+    print(f"Saved {len(args.weights)} x {len(teams)} x {len(teams)} probability matrix to {args.output}")
+    if metadata['missing_teams']:
+        print(f"{len(metadata['missing_teams'])} team(s) have no ratings: {', '.join(metadata['missing_teams'])}")
@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+import argparse
+import os
+
+import instrumentation
+from columnStore import read_table, resolve_table
+
+# Legacy per-source layouts still read by predictwinners.py
+LEGACY_EXPORTS = {
+    'elo': ('output/regionGroupEloRanking.csv', {'team': 'team', 'region': 'region', 'score': 'elo', 'rank': 'rank'}),
+    'Avg RaptorScore': ('output/SHAPRanking.csv',
+                        {'team': 'Team', 'region': 'Region', 'score': 'Avg RaptorScore', 'rank': 'Rank'}),
+}
+
+DEFAULT_SOURCES = [
+    'elo=data/merged_team_games_with_elo.npz:final_elo',
+    'Avg RaptorScore=data/SHAP/RaptorMerged.npz:Raptor_Score',
+]
+
+
+def read_source(path, column, team_col='team'):
+    """Read only the team and score columns of a table."""
+    return read_table(path, [team_col, column]).rename(columns={team_col: 'team', column: 'score'})
+
+
+def build_rankings(sources, regions):
+    """
+    Rank teams within each region by every score source in one pass.
+
+    All sources are stacked into a single long table, averaged per (source, team)
+    with one groupby, and joined to the region table on team. Teams are ranked
+    within each region from highest to lowest score; tied scores share the lower
+    rank ('min' method) and are listed alphabetically.
+
+    Args:
+        sources (dict): Source name -> DataFrame with team and score columns. Rows
+                        may be per team or per game; per-game rows are averaged.
+        regions (pandas.DataFrame): Table with team and region columns
+
+    Returns:
+        tuple: (rankings, missing) where rankings has columns source, region, rank,
+               team, score, games and missing maps each source name to the region
+               teams it has no score for
+    """
+    long = pd.concat(
+        [frame[['team', 'score']].assign(source=name) for name, frame in sources.items()],
+        ignore_index=True
+    )
+    long['source'] = pd.Categorical(long['source'], categories=list(sources))
+    scores = long.groupby(['source', 'team'], observed=True, sort=False)['score'].agg(['mean', 'count']).reset_index()
+    scores = scores.rename(columns={'mean': 'score', 'count': 'games'})
+
+    region_table = regions[['team', 'region']].drop_duplicates('team')
+    rankings = scores.merge(region_table, on='team', how='inner')
+
+    rankings = rankings.sort_values(['source', 'region', 'score', 'team'], ascending=[True, True, False, True],
+                                    kind='stable')
+    rankings['rank'] = rankings.groupby(['source', 'region'], observed=True)['score'] \
+        .rank(method='min', ascending=False).astype(int)
+    rankings = rankings[['source', 'region', 'rank', 'team', 'score', 'games']].reset_index(drop=True)
+
+    missing = {}
+    for name in sources:
+        ranked = set(rankings.loc[rankings['source'] == name, 'team'])
+        missing[name] = sorted(set(region_table['team']) - ranked)
+    return rankings, missing
+
+
+def write_legacy_export(rankings, source, path, columns):
+    """Write one source's rankings in the layout of its original ranking script."""
+    table = rankings[rankings['source'] == source].sort_values(['region', 'score', 'team'],
+                                                               ascending=[True, False, True])
+    table = table[list(columns)].rename(columns=columns)
+    table.to_csv(path, sep='\t', index=False)
+    instrumentation.rows_written(len(table), path)
+
+
+def parse_source(spec):
+    """Parse a NAME=PATH:COLUMN source specification."""
+    name, _, location = spec.partition('=')
+    path, _, column = location.rpartition(':')
+    if not name or not path or not column:
+        raise ValueError(f"Source must look like NAME=PATH:COLUMN, got '{spec}'")
+    return name, path, column
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build region rankings from any set of per-team score sources')
+    parser.add_argument('--source', type=str, action='append',
+                        help='NAME=PATH:COLUMN, a table (.npz, .parquet or tab-separated .csv) with a team '
+                             'column and a score column; may be repeated (default: Elo and Avg RaptorScore)')
+    parser.add_argument('--regions', type=str, default='data/team_region_groups.csv', help='Region groups file')
+    parser.add_argument('--output', type=str, default='output/rankings.csv', help='Unified rankings output')
+    parser.add_argument('--no-legacy-exports', action='store_true',
+                        help='Skip rewriting regionGroupEloRanking.csv and SHAPRanking.csv')
+    args = parser.parse_args()
+
+    sources = {}
+    for spec in args.source or DEFAULT_SOURCES:
+        name, path, column = parse_source(spec)
+        if not args.source and not os.path.exists(resolve_table(path)):
+            print(f"Skipping source {name}: {path} not found")
+            continue
+        sources[name] = read_source(path, column)
+    if not sources:
+        raise SystemExit("No score sources found")
+
+    regions = pd.read_csv(args.regions, sep='\t')
+    rankings, missing = build_rankings(sources, regions)
+    rankings.to_csv(args.output, sep='\t', index=False)
+    instrumentation.rows_written(len(rankings), args.output)
+    print(f"Ranked {rankings['team'].nunique()} teams in {rankings['region'].nunique()} regions "
+          f"by {len(sources)} source(s); saved to {args.output}")
+
+    for name, teams in missing.items():
+        if teams:
+            print(f"{len(teams)} team(s) have no {name} score: {', '.join(teams)}")
+
+    if not args.no_legacy_exports:
+        for name, (path, columns) in LEGACY_EXPORTS.items():
+            if name in sources:
+                write_legacy_export(rankings, name, path, columns)
+                print(f"Saved {name} rankings to {path}")
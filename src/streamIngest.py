@@ -0,0 +1,218 @@
+import numpy as np
+import pandas as pd
+import argparse
+import glob
+import os
+import resource
+import shutil
+import time
+
+import instrumentation
+from columnStore import read_table, write_table
+from featureEngineering import engineer_features
+
+# Explicit dtypes for raw game files: categorical strings, small ints for box-score
+# counts, nullable ints/floats for columns with missing values
+RAW_DTYPES = {
+    'game_id': 'str',
+    'team': 'category',
+    'home_away': 'category',
+    'notD1_incomplete': 'boolean',
+    'home_away_NS': 'int8',
+    'largest_lead': 'Int16',
+    'rest_days': 'Int16',
+    'attendance': 'Int32',
+    'OT_length_min_tot': 'float32',
+    'tz_dif_H_E': 'float32',
+    'prev_game_dist': 'float32',
+    'travel_dist': 'float32',
+    **{col: 'int16' for col in ['FGA_2', 'FGM_2', 'FGA_3', 'FGM_3', 'FTA', 'FTM', 'AST', 'BLK', 'STL', 'TOV',
+                                'TOV_team', 'DREB', 'OREB', 'F_tech', 'F_personal', 'team_score',
+                                'opponent_team_score']},
+}
+
+
+def season_of(game_date):
+    """Season label of each date: games from July onwards count toward the next year's season."""
+    return (game_date.dt.year + (game_date.dt.month >= 7)).astype(int)
+
+
+def read_raw_chunks(path, chunk_rows, sep=None):
+    """
+    Read a raw game file in chunks of `chunk_rows` rows with the RAW_DTYPES map.
+
+    The separator is taken from the header line (comma for games_2022 V2.csv,
+    tab for merged_team_games.csv) unless given.
+    """
+    if sep is None:
+        with open(path) as f:
+            header = f.readline()
+        sep = '\t' if header.count('\t') > header.count(',') else ','
+        columns = header.rstrip('\n').split(sep)
+    else:
+        columns = pd.read_csv(path, sep=sep, nrows=0).columns
+    dtypes = {col: dtype for col, dtype in RAW_DTYPES.items() if col in columns}
+    return pd.read_csv(path, sep=sep, chunksize=chunk_rows, dtype=dtypes, parse_dates=['game_date'],
+                       na_values=['NA'])
+
+
+def split_complete_games(rows):
+    """
+    Split rows into games with both halves present and rows still waiting for theirs.
+
+    Returns:
+        tuple: (complete, pending) where complete holds every game with at least two
+               rows (games with more are reported by engineer_features) and pending
+               holds single rows of games that may continue in the next chunk
+    """
+    counts = rows['game_id'].map(rows['game_id'].value_counts())
+    return rows[counts >= 2], rows[counts == 1]
+
+
+class SeasonWriter:
+    """
+    Writes engineered rows as per-season parts, data/seasons/<season>/part-NNNNN.npz,
+    and keeps per-team game and win totals for each season in memory (one row per
+    team), so games_played and numwins can be filled in once the season is complete.
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.parts = {}
+        self.totals = {}
+
+    def write(self, features):
+        features = features.assign(season=season_of(features['game_date']))
+        for season, rows in features.groupby('season', sort=True):
+            season_dir = os.path.join(self.output_dir, str(season))
+            os.makedirs(season_dir, exist_ok=True)
+            part = self.parts.get(season, 0)
+            write_table(rows.drop(columns=['season']), os.path.join(season_dir, f'part-{part:05d}.npz'))
+            self.parts[season] = part + 1
+
+            team_totals = rows.groupby('team', observed=True)['Win'].agg(['count', 'sum'])
+            previous = self.totals.get(season)
+            self.totals[season] = team_totals if previous is None else previous.add(team_totals, fill_value=0)
+
+    def finalize(self):
+        """
+        Write each season's team_totals.csv sidecar and fill games_played and numwins
+        in its parts, one part at a time.
+        """
+        for season, team_totals in self.totals.items():
+            season_dir = os.path.join(self.output_dir, str(season))
+            team_totals = team_totals.astype(int).rename(columns={'count': 'games_played', 'sum': 'numwins'})
+            team_totals.rename_axis('team').reset_index().to_csv(
+                os.path.join(season_dir, 'team_totals.csv'), sep='\t', index=False)
+            games_played, numwins = team_totals['games_played'], team_totals['numwins']
+            for path in sorted(glob.glob(os.path.join(season_dir, 'part-*.npz'))):
+                part = read_table(path)
+                team = part['team'].astype(str)
+                part['games_played'] = team.map(games_played).to_numpy()
+                part['numwins'] = team.map(numwins).to_numpy()
+                write_table(part, path)
+
+
+def ingest(paths, output_dir, chunk_rows=50000, regions=None):
+    """
+    Stream raw game files into per-season feature partitions.
+
+    Each chunk is joined with the rows of games left incomplete by the previous
+    chunk, so both halves of a game are always paired together. Opponent and
+    derived columns are computed per chunk; games_played and numwins are filled
+    in from the per-team totals at the end. Memory is bounded by the chunk size
+    plus the rows carried between chunks and one small set of seen game ids.
+
+    Args:
+        paths (list): Raw game files, read in order
+        output_dir (str): Root of the season partitions; replaced if it exists
+        chunk_rows (int): Rows read per chunk
+        regions (pandas.DataFrame, optional): team -> region table to add a region column
+
+    Returns:
+        dict: rows, games, seasons, bad_games (game_id -> row count) and peak_rss_mb
+    """
+    if os.path.isdir(output_dir):
+        shutil.rmtree(output_dir)
+    writer = SeasonWriter(output_dir)
+    region_map = regions.drop_duplicates('team').set_index('team')['region'] if regions is not None else None
+    seen_games = set()
+    bad_games = {}
+    rows = 0
+    carry = None
+
+    def emit(complete):
+        nonlocal rows
+        features, bad = engineer_features(complete)
+        bad_games.update(bad)
+        # Rows of a game that was already written in an earlier chunk
+        repeated = complete['game_id'].isin(seen_games)
+        for game_id in complete.loc[repeated, 'game_id'].unique():
+            bad_games[game_id] = 2 + int((complete['game_id'] == game_id).sum())
+        seen_games.update(features['game_id'].unique())
+        writer.write(features)
+        rows += len(features)
+
+    for path in paths:
+        for chunk in read_raw_chunks(path, chunk_rows):
+            instrumentation.rows_read(len(chunk), path)
+            if region_map is not None:
+                chunk['region'] = chunk['team'].astype(str).map(region_map)
+            if carry is not None and len(carry):
+                chunk = pd.concat([carry, chunk], ignore_index=True)
+                # Concatenating categoricals with different categories falls back to object
+                chunk['team'] = chunk['team'].astype('category')
+            complete, carry = split_complete_games(chunk)
+            if len(complete):
+                emit(complete)
+
+    if carry is not None and len(carry):
+        # Games whose other half never arrived
+        emit(carry)
+    writer.finalize()
+
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {'rows': rows, 'games': len(seen_games), 'seasons': sorted(writer.parts), 'bad_games': bad_games,
+            'peak_rss_mb': peak_kb / 1024}
+
+
+def combine_season(output_dir, season, columns=None):
+    """One season's partitions as a single table, optionally only some columns."""
+    parts = sorted(glob.glob(os.path.join(output_dir, str(season), 'part-*.npz')))
+    if not parts:
+        raise FileNotFoundError(f"No partitions for season {season} in {output_dir}")
+    return pd.concat([read_table(part, columns) for part in parts], ignore_index=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Stream raw game files into per-season feature partitions')
+    parser.add_argument('inputs', type=str, nargs='*', default=['data/games_2022 V2.csv'],
+                        help='Raw game files, comma- or tab-separated (default: data/games_2022 V2.csv)')
+    parser.add_argument('--output-dir', type=str, default='data/seasons',
+                        help='Partition root, one directory per season (default: data/seasons)')
+    parser.add_argument('--chunk-rows', type=int, default=50000, help='Rows read per chunk (default: 50000)')
+    parser.add_argument('--regions', type=str, default='data/team_region_groups.csv',
+                        help="Team region table used to add a region column ('' to skip)")
+    parser.add_argument('--combine', type=int, metavar='SEASON',
+                        help='Also write one season as a single table for the single-season stages')
+    parser.add_argument('--output', type=str, default='data/merged_team_games.npz',
+                        help='Table written by --combine (default: data/merged_team_games.npz)')
+    args = parser.parse_args()
+
+    regions = pd.read_csv(args.regions, sep='\t') if args.regions else None
+    start = time.perf_counter()
+    summary = ingest(args.inputs, args.output_dir, args.chunk_rows, regions)
+    elapsed = time.perf_counter() - start
+    print(f"Ingested {summary['rows']} rows ({summary['games']} games) into season(s) "
+          f"{', '.join(map(str, summary['seasons']))} under {args.output_dir} in {elapsed:.2f}s; "
+          f"peak memory {summary['peak_rss_mb']:.0f} MB")
+
+    if summary['bad_games']:
+        listed = ', '.join(f"{game} ({count} rows)" for game, count in list(summary['bad_games'].items())[:10])
+        print(f"{len(summary['bad_games'])} game(s) do not have exactly two rows: "
+              f"{listed}{' ...' if len(summary['bad_games']) > 10 else ''}")
+
+    if args.combine:
+        table = combine_season(args.output_dir, args.combine)
+        write_table(table, args.output)
+        print(f"Saved season {args.combine} ({len(table)} rows) to {args.output}")
@@ -0,0 +1,210 @@
+"""
+Synthetic seasons shaped like data/games_2022 V2.csv, for scaling tests.
+
+Every game has two rows, one per team, with the raw file's columns and
+dtypes. Teams play round by round on dates spread over a November-March
+season. Box-score counts are overdispersed Poisson draws with the 2022
+season's means and spreads, and makes are binomial in the attempts. Each team
+has a fixed strength that shifts its shooting, attempts, rebounds and
+turnovers, so Elo, the composites and the rankings have a signal to find.
+Scores are made consistent with the makes, and tied games get an overtime
+free throw.
+"""
+import numpy as np
+import pandas as pd
+import argparse
+import os
+import time
+
+RAW_COLUMNS = ['game_id', 'game_date', 'team', 'FGA_2', 'FGM_2', 'FGA_3', 'FGM_3', 'FTA', 'FTM', 'AST', 'BLK',
+               'STL', 'TOV', 'TOV_team', 'DREB', 'OREB', 'F_tech', 'F_personal', 'team_score',
+               'opponent_team_score', 'largest_lead', 'notD1_incomplete', 'OT_length_min_tot', 'rest_days',
+               'attendance', 'tz_dif_H_E', 'prev_game_dist', 'home_away', 'home_away_NS', 'travel_dist']
+
+# count column -> (2022 mean, overdispersion as the std over the Poisson std)
+COUNT_STATS = {
+    'FGA_2': (39.7, 1.3),
+    'FGA_3': (19.0, 1.5),
+    'FTA': (16.1, 1.7),
+    'BLK': (3.2, 1.2),
+    'STL': (7.8, 1.3),
+    'TOV': (15.9, 1.3),
+    'TOV_team': (0.7, 1.1),
+    'DREB': (25.3, 1.1),
+    'OREB': (11.5, 1.3),
+    'F_tech': (0.1, 1.3),
+    'F_personal': (16.4, 1.1),
+}
+# Multiplicative effect of a one-unit strength edge on a count's mean
+STRENGTH_EFFECTS = {'FGA_2': 0.04, 'FGA_3': 0.03, 'FTA': 0.05, 'BLK': 0.1, 'STL': 0.08, 'TOV': -0.08,
+                    'DREB': 0.05, 'OREB': 0.08}
+# make column -> (attempt column, 2022 make rate, rate change per unit of strength edge)
+MAKE_RATES = {'FGM_2': ('FGA_2', 0.445, 0.045), 'FGM_3': ('FGA_3', 0.308, 0.035), 'FTM': ('FTA', 0.705, 0.02)}
+REGIONS = ['North', 'West', 'South']
+# Spread of team strengths, chosen so score spread and margins match 2022
+STRENGTH_SD = 0.45
+# column -> share of rows missing in 2022
+MISSING_RATES = {'rest_days': 0.063, 'attendance': 0.14, 'tz_dif_H_E': 0.086, 'prev_game_dist': 0.11,
+                 'travel_dist': 0.071}
+
+
+def team_names(n):
+    return [f'team_{i:04d}' for i in range(n)]
+
+
+def _counts(rng, mean, dispersion):
+    """Poisson counts with extra spread: std is about `dispersion` times the Poisson std."""
+    mean = np.asarray(mean, dtype=float)
+    if dispersion <= 1:
+        return rng.poisson(mean)
+    # Gamma-Poisson (negative binomial) with variance mean * dispersion**2
+    shape = mean / (dispersion ** 2 - 1)
+    return rng.poisson(rng.gamma(np.maximum(shape, 1e-9), 1 / np.maximum(shape, 1e-9)) * mean)
+
+
+def schedule(rng, n_teams, games_per_team, season):
+    """
+    Pairings and dates for one season: in each round the teams are shuffled and
+    paired off, and the rounds are spread from early November to mid March.
+
+    Returns:
+        pandas.DataFrame: home, away (team indices), game_date and neutral
+    """
+    rounds = []
+    start = pd.Timestamp(f'{season - 1}-11-09')
+    days = (pd.Timestamp(f'{season}-03-13') - start).days
+    for r in range(games_per_team):
+        order = rng.permutation(n_teams)
+        pairs = order[:n_teams // 2 * 2].reshape(-1, 2)
+        offsets = r * days // games_per_team + rng.integers(0, max(days // games_per_team, 1), len(pairs))
+        rounds.append(pd.DataFrame({'home': pairs[:, 0], 'away': pairs[:, 1],
+                                    'game_date': start + pd.to_timedelta(offsets, unit='D')}))
+    games = pd.concat(rounds, ignore_index=True).sort_values('game_date', kind='stable').reset_index(drop=True)
+    games['neutral'] = rng.random(len(games)) < 0.14
+    return games
+
+
+def box_scores(rng, edge):
+    """Counts for one side of every game, given its strength edge over the opponent."""
+    box = {}
+    for column, (mean, dispersion) in COUNT_STATS.items():
+        box[column] = _counts(rng, mean * np.exp(STRENGTH_EFFECTS.get(column, 0) * edge), dispersion)
+    for make, (attempt, rate, effect) in MAKE_RATES.items():
+        box[make] = rng.binomial(box[attempt], np.clip(rate + effect * edge, 0.05, 0.95))
+    box['AST'] = rng.binomial(box['FGM_2'] + box['FGM_3'], 0.55)
+    return box
+
+
+def generate_season(season, n_teams=350, games_per_team=30, strength=None, seed=42):
+    """
+    One synthetic season of team-game rows, two per game, in raw-file order.
+
+    Args:
+        season (int): Season label; games run from November of the year before
+        n_teams (int): Teams in the league
+        games_per_team (int): Rounds played; each team plays once per round
+                              (one team sits out each round if n_teams is odd)
+        strength (numpy.ndarray, optional): Team strengths (default: normal with sd
+                                            STRENGTH_SD)
+        seed (int): Random seed
+
+    Returns:
+        pandas.DataFrame: Columns of data/games_2022 V2.csv
+    """
+    rng = np.random.default_rng([seed, season])
+    strength = STRENGTH_SD * rng.standard_normal(n_teams) if strength is None else strength
+    games = schedule(rng, n_teams, games_per_team, season)
+    n = len(games)
+    home_edge = np.where(games['neutral'], 0.0, 0.15)
+    edge = strength[games['home'].to_numpy()] - strength[games['away'].to_numpy()] + home_edge
+    home, away = box_scores(rng, edge), box_scores(rng, -edge)
+
+    for box in (home, away):
+        box['team_score'] = 2 * box['FGM_2'] + 3 * box['FGM_3'] + box['FTM']
+    # No ties: the home side wins an overtime free throw
+    tied = home['team_score'] == away['team_score']
+    for column in ('FTA', 'FTM', 'team_score'):
+        home[column] = home[column] + tied
+    margin = home['team_score'] - away['team_score']
+
+    names = np.array(team_names(n_teams), dtype=object)
+    attendance = np.minimum(np.exp(rng.normal(6.5, 1.1, n)), 18000).astype(int) + 17
+    incomplete = rng.random(n) < 0.03
+    overtime = np.where(tied | (rng.random(n) < 0.04), 5.0 * (1 + (rng.random(n) < 0.15)), np.nan)
+    sides = []
+    for box, opponent, teams, sign, is_home in ((home, away, games['home'], 1, True),
+                                                (away, home, games['away'], -1, False)):
+        lead = np.maximum(sign * margin, 0) + rng.poisson(3, n)
+        travel = np.zeros(n) if is_home else rng.exponential(650, n).round()
+        side = pd.DataFrame({
+            'game_id': [f'game_{season}_{i + 1}' for i in range(n)],
+            'game_date': games['game_date'].dt.strftime('%Y-%m-%d'),
+            'team': names[teams.to_numpy()],
+            **{column: box[column] for column in RAW_COLUMNS[3:18]},
+            'team_score': box['team_score'],
+            'opponent_team_score': opponent['team_score'],
+            'largest_lead': lead,
+            'notD1_incomplete': incomplete,
+            'OT_length_min_tot': overtime,
+            'rest_days': 1 + _counts(rng, np.full(n, 3.2), 1.8),
+            'attendance': attendance,
+            'tz_dif_H_E': 0 if is_home else np.where(rng.random(n) < 0.1, rng.integers(-3, 4, n), 0),
+            'prev_game_dist': rng.exponential(470, n).round(),
+            'home_away': 'home' if is_home else 'away',
+            'home_away_NS': np.where(games['neutral'], 0, sign),
+            'travel_dist': travel,
+        })
+        sides.append(side)
+    # Interleave so each game's two rows are adjacent, home row first
+    rows = pd.concat(sides, keys=[0, 1]).swaplevel().sort_index(level=0, kind='stable').reset_index(drop=True)
+    for column, rate in MISSING_RATES.items():
+        rows[column] = rows[column].mask(rng.random(len(rows)) < rate)
+    return rows[RAW_COLUMNS]
+
+
+def generate(n_teams=350, games_per_team=30, seasons=1, first_season=2022, seed=42):
+    """
+    `seasons` consecutive synthetic seasons of the same teams. Team strengths
+    drift a little between seasons.
+
+    Returns:
+        tuple: (games, regions) where regions has team and region columns
+    """
+    rng = np.random.default_rng(seed)
+    strength = STRENGTH_SD * rng.standard_normal(n_teams)
+    frames = []
+    for season in range(first_season, first_season + seasons):
+        frames.append(generate_season(season, n_teams, games_per_team, strength, seed))
+        strength = 0.8 * strength + 0.6 * STRENGTH_SD * rng.standard_normal(n_teams)
+    regions = pd.DataFrame({'team': team_names(n_teams), 'region': [REGIONS[i % len(REGIONS)]
+                                                                    for i in range(n_teams)]})
+    return pd.concat(frames, ignore_index=True), regions
+
+
+def write_games(games, path):
+    """Write in the raw file's layout: comma-separated, NA for missing values, TRUE/FALSE flags."""
+    games = games.assign(notD1_incomplete=np.where(games['notD1_incomplete'], 'TRUE', 'FALSE'))
+    games.to_csv(path, index=False, na_rep='NA')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Synthetic seasons shaped like data/games_2022 V2.csv')
+    parser.add_argument('--teams', type=int, default=350, help='Teams (default: 350)')
+    parser.add_argument('--games-per-team', type=int, default=30, help='Games per team per season (default: 30)')
+    parser.add_argument('--seasons', type=int, default=1, help='Consecutive seasons (default: 1)')
+    parser.add_argument('--first-season', type=int, default=2022, help='First season label (default: 2022)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
+    parser.add_argument('--output', type=str, default='data/games_synthetic.csv',
+                        help='Raw game file (default: data/games_synthetic.csv)')
+    parser.add_argument('--regions', type=str, default='data/team_region_groups_synthetic.csv',
+                        help='Team/region table for the synthetic teams '
+                             '(default: data/team_region_groups_synthetic.csv)')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    games, regions = generate(args.teams, args.games_per_team, args.seasons, args.first_season, args.seed)
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    write_games(games, args.output)
+    regions.to_csv(args.regions, sep='\t', index=False)
+    print(f"Generated {len(games)} rows ({len(games) // 2} games, {args.seasons} season(s), {args.teams} teams) "
+          f"in {time.perf_counter() - start:.2f}s; saved to {args.output} and {args.regions}")
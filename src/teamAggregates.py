@@ -0,0 +1,183 @@
+import numpy as np
+import pandas as pd
+import argparse
+import os
+import time
+
+import instrumentation
+from columnStore import read_table, table_columns, write_table
+
+# Per-game stats averaged per team (the columns of the original averageStats.py)
+STAT_COLUMNS = [
+    'FGA_2', 'FGM_2', 'FGA_3', 'FGM_3', 'FTA', 'FTM', 'AST', 'BLK', 'STL',
+    'TOV', 'TOV_team', 'DREB', 'OREB', 'F_tech', 'F_personal', 'team_score',
+    'opponent_team_score', 'largest_lead', 'OT_length_min_tot', 'rest_days',
+    'attendance', 'tz_dif_H_E', 'prev_game_dist', 'travel_dist'
+]
+
+
+def _month(df):
+    """YYYY-MM of each game_date, formatting each distinct month once."""
+    dates = df['game_date']
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates)
+    codes, months = pd.factorize(dates.dt.year.to_numpy() * 100 + dates.dt.month.to_numpy())
+    labels = np.array([f'{month // 100}-{month % 100:02d}' for month in months])
+    return pd.Series(labels[codes], index=df.index)
+
+
+# Optional split keys and how to derive them from team-game rows
+SPLITS = {
+    'home_away': lambda df: df['home_away'].astype(str),
+    'month': _month,
+}
+
+
+def group_totals(df, keys, stats):
+    """
+    Sums, non-missing counts and sums of squares of each stat per group, plus games.
+
+    One groupby over a wide frame of values, indicators and squares.
+
+    Returns:
+        pandas.DataFrame: Indexed by `keys`, columns games, <stat>_sum, <stat>_count
+                          and <stat>_sumsq
+    """
+    values = df[stats].astype(float)
+    present = values.notna()
+    filled = values.fillna(0.0)
+    wide = pd.concat([
+        filled.add_suffix('_sum'),
+        present.astype(np.int64).add_suffix('_count'),
+        (filled ** 2).add_suffix('_sumsq'),
+    ], axis=1)
+    wide['games'] = 1
+    for key in keys:
+        wide[key] = df[key].to_numpy() if key in df else SPLITS[key](df).to_numpy()
+    return wide.groupby(keys, sort=True).sum()
+
+
+class TeamAggregates:
+    """
+    Running per-team (and per-split) totals of every stat, from which means and
+    variances are derived.
+
+    The state directory holds `totals.npz` (the group totals table) and
+    `processed.npy` (every (game_id, team) row already counted), so `update`
+    only touches rows that have not been seen, in O(new rows). Rows are tracked
+    individually because a game's two rows can arrive in different updates.
+    """
+
+    def __init__(self, state_dir, splits=(), stats=STAT_COLUMNS, totals=None, processed=None):
+        self.state_dir = state_dir
+        self.splits = list(splits)
+        self.stats = list(stats)
+        self.totals = totals
+        self.processed = set(map(tuple, processed if processed is not None else []))
+
+    @property
+    def keys(self):
+        return ['team'] + self.splits
+
+    @classmethod
+    def load(cls, state_dir):
+        totals = read_table(os.path.join(state_dir, 'totals.npz'))
+        processed = np.load(os.path.join(state_dir, 'processed.npy'), allow_pickle=False)
+        if processed.ndim != 2:
+            raise ValueError(f"{state_dir} lists counted games rather than team-game rows; rerun with --rebuild")
+        processed = processed.tolist()
+        splits = [col for col in totals.columns if col in SPLITS]
+        stats = [col[:-len('_sum')] for col in totals.columns if col.endswith('_sum')]
+        return cls(state_dir, splits, stats, totals.set_index(['team'] + splits), processed)
+
+    def save(self):
+        os.makedirs(self.state_dir, exist_ok=True)
+        write_table(self.totals.reset_index(), os.path.join(self.state_dir, 'totals.npz'))
+        tmp_path = os.path.join(self.state_dir, 'processed.tmp.npy')
+        np.save(tmp_path, np.array(sorted(self.processed), dtype=str).reshape(-1, 2))
+        os.replace(tmp_path, os.path.join(self.state_dir, 'processed.npy'))
+
+    def update(self, df):
+        """
+        Add every team-game row in `df` that has not been counted yet.
+
+        Returns:
+            int: Number of new team-game rows added
+        """
+        rows = pd.MultiIndex.from_arrays([df['game_id'].astype(str), df['team'].astype(str)])
+        new = df[~rows.isin(self.processed)]
+        if new.empty:
+            return 0
+        partial = group_totals(new, self.keys, self.stats)
+        self.totals = partial if self.totals is None else self.totals.add(partial, fill_value=0)
+        self.processed.update(zip(new['game_id'].astype(str), new['team'].astype(str)))
+        return len(new)
+
+    def averages(self, std=False):
+        """
+        Mean of each stat per group over the games where it was recorded, and
+        optionally the sample standard deviation from the sums of squares.
+        """
+        totals = self.totals
+        result = {}
+        for stat in self.stats:
+            count = totals[f'{stat}_count'].to_numpy(dtype=float)
+            total = totals[f'{stat}_sum'].to_numpy()
+            with np.errstate(divide='ignore', invalid='ignore'):
+                mean = np.where(count > 0, total / count, np.nan)
+                result[stat] = mean
+                if std:
+                    variance = (totals[f'{stat}_sumsq'].to_numpy() - total * mean) / (count - 1)
+                    result[f'{stat}_std'] = np.where(count > 1, np.sqrt(np.maximum(variance, 0.0)), np.nan)
+        averages = pd.DataFrame(result, index=totals.index)
+        averages.insert(0, 'games_played', totals['games'].astype(int).to_numpy())
+        return averages
+
+
+def state_dir_for(root, splits):
+    return os.path.join(root, '-'.join(['team'] + list(splits)))
+
+
+def read_games(path, splits=()):
+    """Only the columns the aggregates need."""
+    available = table_columns(path)
+    needed = ['game_id', 'team'] + [col for col in STAT_COLUMNS if col in available]
+    needed += [{'month': 'game_date'}.get(split, split) for split in splits]
+    return read_table(path, list(dict.fromkeys(needed)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Per-team stat averages from an incrementally updated aggregate store')
+    parser.add_argument('--games', type=str, default='data/merged_team_games.npz',
+                        help='Team-game table (default: data/merged_team_games.npz)')
+    parser.add_argument('--state', type=str, default='data/teamAggregates',
+                        help='Aggregate store root; one directory per split combination')
+    parser.add_argument('--split', type=str, action='append', default=[], choices=list(SPLITS),
+                        help='Also group by this key; may be repeated')
+    parser.add_argument('--rebuild', action='store_true', help='Discard the stored totals and rebuild')
+    parser.add_argument('--std', action='store_true', help='Add a standard deviation column per stat')
+    parser.add_argument('--output', type=str,
+                        help='Averages output (default: output/team_averages.csv, or '
+                             'output/team_averages_<splits>.csv with --split)')
+    args = parser.parse_args()
+
+    state_dir = state_dir_for(args.state, args.split)
+    output = args.output or ('output/team_averages.csv' if not args.split
+                             else f"output/team_averages_{'_'.join(args.split)}.csv")
+
+    df = read_games(args.games, args.split)
+    if args.rebuild or not os.path.exists(os.path.join(state_dir, 'totals.npz')):
+        store = TeamAggregates(state_dir, args.split, [col for col in STAT_COLUMNS if col in df])
+    else:
+        store = TeamAggregates.load(state_dir)
+
+    start = time.perf_counter()
+    added = store.update(df)
+    averages = store.averages(std=args.std)
+    elapsed = time.perf_counter() - start
+    store.save()
+
+    averages.to_csv(output)
+    instrumentation.rows_written(len(averages), output)
+    print(f"Added {added} new team-game row(s) in {elapsed * 1000:.1f}ms; "
+          f"{len(averages)} group(s) saved to {output}")
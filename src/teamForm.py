@@ -0,0 +1,290 @@
+import numpy as np
+import pandas as pd
+import argparse
+import json
+import os
+import time
+
+import instrumentation
+from columnStore import read_table, table_columns, write_table
+
+KEY_COLUMNS = ['game_id', 'team', 'game_date']
+
+# Box-score inputs of the eFG%, PEM and REBF models
+BOX_STATS = ['FGM_2', 'FGA_2', 'FGM_3', 'FGA_3', 'FTM', 'FTA', 'AST', 'TOV', 'STL', 'BLK', 'DREB', 'OREB',
+             'F_tech', 'F_personal']
+
+# Per-game stats written by featureEngineering.py
+FEATURE_STATS = ['Point_Differential', 'Possessions', 'AST%', 'BLK%', 'TOV%', 'TOV_team%', 'STL%']
+
+# Per-game stats derived here. eFG% is the box-score (FGM_2 + 1.5 FGM_3) / FGA, not the
+# SHAP-weighted composite, and NRtg is the per-game net rating of compositeBuilder.py.
+DERIVED_STATS = {
+    'eFG%': lambda df: (df['FGM_2'] + 1.5 * df['FGM_3']) / (df['FGA_2'] + df['FGA_3']),
+    'NRtg': lambda df: 100 * (df['team_score'] - df['opponent_team_score']) / df['Possessions'],
+}
+
+FORM_STATS = BOX_STATS + FEATURE_STATS + list(DERIVED_STATS)
+
+
+def game_stats(df):
+    """
+    Key columns and every FORM_STATS value of each team-game row, as floats.
+
+    Returns:
+        pandas.DataFrame: game_id, team, game_date and one column per stat
+    """
+    stats = pd.DataFrame({
+        'game_id': df['game_id'].astype(str).to_numpy(),
+        'team': df['team'].astype(str).to_numpy(),
+        'game_date': pd.to_datetime(df['game_date']).to_numpy(),
+    })
+    for stat in BOX_STATS + FEATURE_STATS:
+        stats[stat] = df[stat].to_numpy(dtype=float)
+    for stat, derive in DERIVED_STATS.items():
+        with np.errstate(divide='ignore', invalid='ignore'):
+            stats[stat] = derive(df).to_numpy(dtype=float)
+    values = stats[FORM_STATS].to_numpy()
+    values[~np.isfinite(values)] = np.nan
+    stats[FORM_STATS] = values
+    return stats
+
+
+def form_columns(stats=FORM_STATS, windows=(5, 10), halflives=(3,)):
+    """Names of the form columns: <stat>_last<N> and <stat>_ewm<halflife>."""
+    return [f'{stat}_last{window}' for stat in stats for window in windows] \
+        + [f'{stat}_ewm{halflife:g}' for stat in stats for halflife in halflives]
+
+
+def _ewm_prefix(filled, present, halflife):
+    """
+    Exponentially weighted sums over each team's first j games, for every j.
+
+    num[:, j] = sum over k < j of r**(j - 1 - k) * x_k, with r = 0.5 ** (1 / halflife),
+    and den[:, j] the same sum of weights over the games where x was recorded;
+    num / den is the adjusted EWM of pandas (ignore_na=False). The weights come
+    from cumulative sums of x_k / r**k, which are restarted every `block` games
+    from the running totals so r**-k never overflows.
+    """
+    teams, length = filled.shape
+    r = 0.5 ** (1 / halflife)
+    block = max(1, int(600 * halflife))
+    num = np.zeros((teams, length + 1))
+    den = np.zeros((teams, length + 1))
+    for start in range(0, length, block):
+        stop = min(start + block, length)
+        offsets = np.arange(stop - start)
+        decay = r ** (offsets + 1)
+        scale = r ** offsets
+        unscale = r ** -offsets
+        num[:, start + 1:stop + 1] = decay * num[:, start, None] \
+            + scale * np.cumsum(filled[:, start:stop] * unscale, axis=1)
+        den[:, start + 1:stop + 1] = decay * den[:, start, None] \
+            + scale * np.cumsum(present[:, start:stop] * unscale, axis=1)
+    return num, den
+
+
+def _window_mean(sums, recorded, team, end, window):
+    """Mean of the recorded values among games end - window .. end - 1 of each team."""
+    begin = np.maximum(end - window, 0)
+    count = recorded[team, end] - recorded[team, begin]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(count > 0, (sums[team, end] - sums[team, begin]) / count, np.nan)
+
+
+def compute_form(stats, windows=(5, 10), halflives=(3,)):
+    """
+    Leak-free rolling means and EWMs of every stat, per team-game row.
+
+    Rows are sorted by team, game_date and game_id, and each team's games are
+    laid out as one row of a (teams x games) array per stat. Every row's form
+    uses only that team's games dated strictly before it (games on the same
+    date never see each other). Rolling means over the last N prior games are
+    differences of cumulative sums, so no per-row Python runs.
+
+    Args:
+        stats (pandas.DataFrame): Rows from game_stats
+        windows (tuple): Rolling window lengths, in games
+        halflives (tuple): EWM half-lives, in games
+
+    Returns:
+        tuple: (form, latest) where form holds the key columns and form columns
+               of every row, and latest holds each team's form after its last
+               game (for upcoming games), indexed by team
+    """
+    stats = stats.sort_values(['team', 'game_date', 'game_id'], kind='stable').reset_index(drop=True)
+    codes, teams = pd.factorize(stats['team'])
+    counts = np.bincount(codes, minlength=len(teams))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    positions = np.arange(len(stats)) - starts[codes]
+
+    # Number of usable prior games: the position of the first game of the same team and date
+    dates = stats['game_date'].to_numpy()
+    first = np.ones(len(stats), dtype=bool)
+    first[1:] = (codes[1:] != codes[:-1]) | (dates[1:] != dates[:-1])
+    prior = np.maximum.accumulate(np.where(first, np.arange(len(stats)), 0)) - starts[codes]
+
+    team_index = np.arange(len(teams))
+    form = stats[KEY_COLUMNS].copy()
+    latest = {}
+    length = int(counts.max()) if len(counts) else 0
+    for stat in FORM_STATS:
+        dense = np.full((len(teams), length), np.nan)
+        dense[codes, positions] = stats[stat].to_numpy()
+        present = ~np.isnan(dense)
+        filled = np.where(present, dense, 0.0)
+        sums = np.concatenate((np.zeros((len(teams), 1)), np.cumsum(filled, axis=1)), axis=1)
+        recorded = np.concatenate((np.zeros((len(teams), 1)), np.cumsum(present, axis=1)), axis=1)
+
+        for window in windows:
+            column = f'{stat}_last{window}'
+            form[column] = _window_mean(sums, recorded, codes, prior, window)
+            latest[column] = _window_mean(sums, recorded, team_index, counts, window)
+
+        for halflife in halflives:
+            column = f'{stat}_ewm{halflife:g}'
+            num, den = _ewm_prefix(filled, present, halflife)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                form[column] = np.where(den[codes, prior] > 0, num[codes, prior] / den[codes, prior], np.nan)
+                latest[column] = np.where(den[team_index, counts] > 0,
+                                          num[team_index, counts] / den[team_index, counts], np.nan)
+
+    latest = pd.DataFrame(latest, index=pd.Index(teams, name='team'))
+    latest.insert(0, 'games', counts)
+    columns = form_columns(FORM_STATS, windows, halflives)
+    return form[KEY_COLUMNS + columns], latest[['games'] + columns]
+
+
+class TeamForm:
+    """
+    Form columns that can be brought up to date as new games land.
+
+    The state directory holds `history.npz` (the game_stats rows of every
+    processed game), `form.npz` and `latest.npz` (the last results) and
+    `settings.json` (windows and half-lives). An update recomputes only the
+    teams that played in the new games, so games that arrive late are placed
+    in order like any other.
+    """
+
+    def __init__(self, state_dir, windows=(5, 10), halflives=(3,), history=None, form=None, latest=None):
+        self.state_dir = state_dir
+        self.windows = tuple(windows)
+        self.halflives = tuple(halflives)
+        self.history = history
+        self.form = form
+        self.latest = latest
+
+    @classmethod
+    def load(cls, state_dir):
+        with open(os.path.join(state_dir, 'settings.json')) as f:
+            settings = json.load(f)
+        return cls(state_dir, settings['windows'], settings['halflives'],
+                   read_table(os.path.join(state_dir, 'history.npz')),
+                   read_table(os.path.join(state_dir, 'form.npz')),
+                   read_table(os.path.join(state_dir, 'latest.npz')).set_index('team'))
+
+    def save(self):
+        os.makedirs(self.state_dir, exist_ok=True)
+        write_table(self.history, os.path.join(self.state_dir, 'history.npz'))
+        write_table(self.form, os.path.join(self.state_dir, 'form.npz'))
+        write_table(self.latest.reset_index(), os.path.join(self.state_dir, 'latest.npz'))
+        with open(os.path.join(self.state_dir, 'settings.json'), 'w') as f:
+            json.dump({'windows': list(self.windows), 'halflives': list(self.halflives)}, f)
+
+    def update(self, df):
+        """
+        Add every team-game row in `df` whose game_id has not been processed.
+
+        Returns:
+            tuple: (new rows, teams recomputed)
+        """
+        if self.history is not None:
+            df = df[~df['game_id'].astype(str).isin(self.history['game_id'])]
+        if df.empty:
+            return 0, 0
+        new = game_stats(df)
+
+        affected = new['team'].unique()
+        self.history = new if self.history is None else pd.concat([self.history, new], ignore_index=True)
+        form, latest = compute_form(self.history[self.history['team'].isin(affected)], self.windows, self.halflives)
+        if self.form is None:
+            self.form, self.latest = form, latest
+        else:
+            kept = self.form[~self.form['team'].isin(affected)]
+            self.form = pd.concat([kept, form], ignore_index=True) \
+                .sort_values(['team', 'game_date', 'game_id'], kind='stable').reset_index(drop=True)
+            self.latest = pd.concat([self.latest.drop(index=affected, errors='ignore'), latest]).sort_index()
+        return len(new), len(affected)
+
+
+def read_games(path):
+    """Only the columns game_stats needs."""
+    available = table_columns(path)
+    needed = KEY_COLUMNS + BOX_STATS + FEATURE_STATS + ['team_score', 'opponent_team_score']
+    missing = [col for col in needed if col not in available]
+    if missing:
+        raise KeyError(f"{path} has no column(s) {', '.join(missing)}; run `bbpredict features` first")
+    return read_table(path, needed)
+
+
+def attach_form(df, form_path, stats=None):
+    """
+    Join form columns onto team-game rows by game_id and team.
+
+    Args:
+        df (pandas.DataFrame): Rows with game_id and team columns; row order is kept
+        form_path (str): Per-game form table written by teamForm.py
+        stats (list, optional): Only the form columns of these stats
+
+    Returns:
+        tuple: (df with the form columns added, list of the added column names)
+    """
+    available = [col for col in table_columns(form_path) if col not in KEY_COLUMNS]
+    if stats is not None:
+        available = [col for col in available if col.rsplit('_', 1)[0] in stats]
+    form = read_table(form_path, ['game_id', 'team'] + available)
+    keys = pd.DataFrame({'game_id': df['game_id'].astype(str).to_numpy(), 'team': df['team'].astype(str).to_numpy()})
+    joined = keys.merge(form, on=['game_id', 'team'], how='left', validate='many_to_one')
+    df = df.copy()
+    for col in available:
+        df[col] = joined[col].to_numpy()
+    return df, available
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Leak-free rolling and exponentially weighted team-form features')
+    parser.add_argument('--games', type=str, default='data/merged_team_games.npz',
+                        help='Feature table from `bbpredict features` (default: data/merged_team_games.npz)')
+    parser.add_argument('--state', type=str, default='data/teamForm', help='State directory (default: data/teamForm)')
+    parser.add_argument('--window', type=int, action='append',
+                        help='Rolling window in games; may be repeated (default: 5 and 10)')
+    parser.add_argument('--halflife', type=float, action='append',
+                        help='EWM half-life in games; may be repeated (default: 3)')
+    parser.add_argument('--rebuild', action='store_true', help='Discard the stored state and rebuild')
+    parser.add_argument('--output', type=str, default='data/team_form.npz',
+                        help='Per-game form table (default: data/team_form.npz)')
+    parser.add_argument('--latest', type=str, default='output/team_form_latest.csv',
+                        help="Each team's current form, tab-separated (default: output/team_form_latest.csv)")
+    args = parser.parse_args()
+
+    settings_path = os.path.join(args.state, 'settings.json')
+    if not args.rebuild and os.path.exists(settings_path):
+        store = TeamForm.load(args.state)
+        if (args.window and tuple(args.window) != store.windows) or \
+                (args.halflife and tuple(args.halflife) != store.halflives):
+            raise SystemExit(f"{args.state} was built with windows {list(store.windows)} and half-lives "
+                             f"{list(store.halflives)}; use --rebuild to change them")
+    else:
+        store = TeamForm(args.state, args.window or (5, 10), args.halflife or (3,))
+
+    df = read_games(args.games)
+    start = time.perf_counter()
+    added, recomputed = store.update(df)
+    elapsed = time.perf_counter() - start
+    store.save()
+
+    write_table(store.form, args.output)
+    store.latest.to_csv(args.latest, sep='\t')
+    instrumentation.rows_written(len(store.latest), args.latest)
+    print(f"Added {added} new team-game row(s), recomputed {recomputed} team(s) in {elapsed * 1000:.1f}ms; "
+          f"{len(store.form.columns) - len(KEY_COLUMNS)} form column(s) saved to {args.output} and {args.latest}")
@@ -0,0 +1,279 @@
+import numpy as np
+import pandas as pd
+import argparse
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import instrumentation
+
+from predictwinners import RatingIndex, DEFAULT_SHAP_PATH, DEFAULT_ELO_PATH
+from probabilityMatrix import build_probability_matrix, ProbabilityMatrix
+
+# Bracket position of each seed in a 16-team region (1 v 16, 8 v 9, ...)
+SEED_ORDER = [1, 16, 8, 9, 5, 12, 4, 13, 6, 11, 3, 14, 7, 10, 2, 15]
+
+
+def default_bracket(regions_path="data/team_region_groups.csv", ranking_path=DEFAULT_SHAP_PATH,
+                    seeds_per_region=16, play_ins_per_region=1):
+    """
+    Build a bracket from the region groups and a ranking output.
+
+    The top `seeds_per_region` teams of each region get seeds 1..N by rank. Each
+    play-in adds the next-ranked team as a second team on one of the lowest seed
+    lines (the first play-in shares seed N, the next seed N-1, ...).
+
+    Args:
+        regions_path (str): Tab-delimited file with team and region columns
+        ranking_path (str): Tab-delimited ranking file (SHAPRanking.csv or
+                            regionGroupEloRanking.csv)
+        seeds_per_region (int): Seed lines per region, a power of two
+        play_ins_per_region (int): Play-in games per region
+
+    Returns:
+        pandas.DataFrame: Bracket with columns region, seed, team
+    """
+    regions = pd.read_csv(regions_path, sep='\t')
+    ranking = pd.read_csv(ranking_path, sep='\t')
+    ranking.columns = [col.lower() for col in ranking.columns]
+    score_col = 'avg raptorscore' if 'avg raptorscore' in ranking.columns else 'elo'
+
+    ranking = ranking[['team', score_col]].merge(regions[['team', 'region']], on='team', how='inner')
+    ranking = ranking.sort_values(['region', score_col, 'team'], ascending=[True, False, True])
+
+    bracket = []
+    for region, teams in ranking.groupby('region', sort=True):
+        teams = teams['team'].tolist()
+        for seed, team in enumerate(teams[:seeds_per_region], start=1):
+            bracket.append({'region': region, 'seed': seed, 'team': team})
+        for i, team in enumerate(teams[seeds_per_region:seeds_per_region + play_ins_per_region]):
+            bracket.append({'region': region, 'seed': seeds_per_region - i, 'team': team})
+    return pd.DataFrame(bracket, columns=['region', 'seed', 'team'])
+
+
+def bracket_slots(bracket, team_ids):
+    """
+    Convert a bracket table into slot arrays for the simulator.
+
+    Returns:
+        tuple: (regions, slots, play_ins) where slots is an int array of shape
+               (n_regions, seeds_per_region) holding a team id, or -(k + 1) for the
+               k-th play-in game, and play_ins is an int array of shape (n_play_ins, 2)
+    """
+    regions = list(dict.fromkeys(bracket['region']))
+    seeds_per_region = int(bracket['seed'].max())
+    if seeds_per_region & (seeds_per_region - 1):
+        raise ValueError(f"Seeds per region must be a power of two, got {seeds_per_region}")
+    order = SEED_ORDER if seeds_per_region == 16 else _seed_order(seeds_per_region)
+
+    slots = np.zeros((len(regions), seeds_per_region), dtype=np.int64)
+    play_ins = []
+    for r, region in enumerate(regions):
+        region_bracket = bracket[bracket['region'] == region]
+        for position, seed in enumerate(order):
+            teams = region_bracket.loc[region_bracket['seed'] == seed, 'team'].tolist()
+            if len(teams) == 1:
+                slots[r, position] = team_ids[teams[0]]
+            elif len(teams) == 2:
+                play_ins.append((team_ids[teams[0]], team_ids[teams[1]]))
+                slots[r, position] = -len(play_ins)
+            else:
+                raise ValueError(f"Region {region} seed {seed} has {len(teams)} teams (expected 1, or 2 for a play-in)")
+    return regions, slots, np.array(play_ins, dtype=np.int64).reshape(-1, 2)
+
+
+def _seed_order(n):
+    """Standard bracket order for n seeds, n a power of two."""
+    order = [1]
+    while len(order) < n:
+        size = len(order) * 2
+        order = [s for seed in order for s in (seed, size + 1 - seed)]
+    return order
+
+
+def simulate_rounds(probabilities, slots, play_ins, n_sims, rng):
+    """
+    Simulate n_sims tournaments at once.
+
+    Every round is a vectorized draw over all simulations: the teams in adjacent
+    slots meet, and the first advances when a uniform draw falls below its win
+    probability.
+
+    Args:
+        probabilities (numpy.ndarray): N x N matrix of P(row team beats column team)
+        slots (numpy.ndarray): Slot array from `bracket_slots`
+        play_ins (numpy.ndarray): Play-in pairs from `bracket_slots`
+        n_sims (int): Number of tournaments
+        rng (numpy.random.Generator): Random stream
+
+    Returns:
+        numpy.ndarray: Count of wins per round, shape (n_rounds + 1, N); row 0 counts
+                       play-in wins
+    """
+    n_teams = probabilities.shape[0]
+    n_regions, seeds_per_region = slots.shape
+    n_rounds = int(math.log2(seeds_per_region)) + math.ceil(math.log2(n_regions))
+    counts = np.zeros((n_rounds + 1, n_teams), dtype=np.int64)
+
+    field = np.broadcast_to(slots.reshape(1, -1), (n_sims, slots.size)).copy()
+    if len(play_ins):
+        first, second = play_ins[:, 0], play_ins[:, 1]
+        first_wins = rng.random((n_sims, len(play_ins))) < probabilities[first, second]
+        winners = np.where(first_wins, first, second)
+        counts[0] = np.bincount(winners.ravel(), minlength=n_teams)
+        # Play-in slots hold -(k + 1); replace them with the k-th game's winner
+        play_in_slots = np.nonzero(slots.ravel() < 0)[0]
+        field[:, play_in_slots] = winners[:, -slots.ravel()[play_in_slots] - 1]
+
+    # Regional rounds: keep regions separate until one team is left in each
+    field = field.reshape(n_sims, n_regions, seeds_per_region)
+    round_num = 1
+    while field.shape[2] > 1:
+        field = _play_round(probabilities, field, rng)
+        counts[round_num] = np.bincount(field.ravel(), minlength=n_teams)
+        round_num += 1
+
+    # National rounds between region winners; an odd team out gets a bye
+    field = field.reshape(n_sims, n_regions)
+    while field.shape[1] > 1:
+        bye = field[:, -1:] if field.shape[1] % 2 else field[:, :0]
+        paired = field[:, :field.shape[1] - bye.shape[1]]
+        winners = _play_round(probabilities, paired, rng)
+        counts[round_num] = np.bincount(winners.ravel(), minlength=n_teams)
+        counts[round_num] += np.bincount(bye.ravel(), minlength=n_teams)
+        field = np.concatenate([winners, bye], axis=1)
+        round_num += 1
+    return counts
+
+
+def _play_round(probabilities, field, rng):
+    """Play adjacent slots against each other along the last axis."""
+    first, second = field[..., 0::2], field[..., 1::2]
+    first_wins = rng.random(first.shape) < probabilities[first, second]
+    return np.where(first_wins, first, second)
+
+
+# Per-worker state, set once by the pool initializer instead of pickled per task
+_worker_state = {}
+
+
+def _init_worker(probabilities, slots, play_ins):
+    _worker_state.update(probabilities=probabilities, slots=slots, play_ins=play_ins)
+
+
+def _simulate_chunk(seed_sequence, n_sims, batch_size):
+    rng = np.random.default_rng(seed_sequence)
+    counts = None
+    for start in range(0, n_sims, batch_size):
+        batch = simulate_rounds(_worker_state['probabilities'], _worker_state['slots'],
+                                _worker_state['play_ins'], min(batch_size, n_sims - start), rng)
+        counts = batch if counts is None else counts + batch
+    return counts
+
+
+def run_simulation(probabilities, bracket, team_ids, n_sims=1_000_000, n_workers=None, seed=42,
+                   batch_size=100_000):
+    """
+    Run Monte Carlo tournaments across a process pool.
+
+    The simulations are split into one chunk per worker, each with an independent
+    random stream spawned from `seed`, so results are reproducible for a given
+    seed and worker count.
+
+    Args:
+        probabilities (numpy.ndarray): N x N matrix of P(row team beats column team)
+        bracket (pandas.DataFrame): Bracket with columns region, seed, team
+        team_ids (dict): Team name -> row/column of `probabilities`
+        n_sims (int): Number of tournaments
+        n_workers (int, optional): Worker processes (default: CPU count)
+        seed (int): Seed for the random streams
+        batch_size (int): Tournaments simulated per vectorized batch
+
+    Returns:
+        tuple: (odds, stats) where odds is a DataFrame with each bracket team's
+               probability of winning each round and stats reports throughput
+    """
+    regions, slots, play_ins = bracket_slots(bracket, team_ids)
+    n_workers = n_workers or os.cpu_count() or 1
+    n_workers = max(1, min(n_workers, n_sims))
+    chunk_sizes = [n_sims // n_workers + (i < n_sims % n_workers) for i in range(n_workers)]
+    seed_sequences = np.random.SeedSequence(seed).spawn(n_workers)
+
+    start = time.perf_counter()
+    if n_workers == 1:
+        _init_worker(probabilities, slots, play_ins)
+        counts = _simulate_chunk(seed_sequences[0], n_sims, batch_size)
+    else:
+        with ProcessPoolExecutor(n_workers, initializer=_init_worker,
+                                 initargs=(probabilities, slots, play_ins)) as pool:
+            counts = sum(pool.map(_simulate_chunk, seed_sequences, chunk_sizes, [batch_size] * n_workers))
+    elapsed = time.perf_counter() - start
+
+    n_region_rounds = int(math.log2(slots.shape[1]))
+    round_names = [f'round_{r}' for r in range(1, n_region_rounds + 1)]
+    round_names += [f'national_{r}' for r in range(1, counts.shape[0] - n_region_rounds)]
+    round_names[-1] = 'champion'
+
+    odds = bracket.copy()
+    ids = odds['team'].map(team_ids).to_numpy()
+    play_in_teams = set(play_ins.ravel().tolist())
+    odds['play_in'] = [counts[0, i] / n_sims if i in play_in_teams else np.nan for i in ids]
+    for r, name in enumerate(round_names, start=1):
+        odds[name] = counts[r, ids] / n_sims
+
+    stats = {
+        'simulations': n_sims,
+        'workers': n_workers,
+        'seconds': elapsed,
+        'simulations_per_second': n_sims / elapsed if elapsed > 0 else float('inf'),
+    }
+    return odds, stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Monte Carlo tournament advancement odds')
+    parser.add_argument('--bracket', type=str,
+                        help='Tab-delimited bracket with region, seed, team columns; two teams on one '
+                             'seed line play a play-in game (default: built from region groups and rankings)')
+    parser.add_argument('--regions', type=str, default='data/team_region_groups.csv', help='Region groups file')
+    parser.add_argument('--seed-from', type=str, default=DEFAULT_SHAP_PATH,
+                        help='Ranking file used to seed the default bracket')
+    parser.add_argument('--play-ins', type=int, default=1, help='Play-in games per region in the default bracket')
+    parser.add_argument('--matrix', type=str, help='Precomputed probability matrix from probabilityMatrix.py')
+    parser.add_argument('--SHAP-weight', type=float, default=0.5, help='SHAP weight (default: 0.5)')
+    parser.add_argument('--SHAP-file', type=str, default=DEFAULT_SHAP_PATH, help='Tab-delimited SHAP ranking file')
+    parser.add_argument('--elo-file', type=str, default=DEFAULT_ELO_PATH, help='Tab-delimited Elo ranking file')
+    parser.add_argument('--sims', type=int, default=1_000_000, help='Number of tournaments (default: 1000000)')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: CPU count)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
+    parser.add_argument('--output', type=str, default='output/tournamentOdds.csv', help='Output file')
+    args = parser.parse_args()
+
+    if args.bracket:
+        bracket = pd.read_csv(args.bracket, sep='\t')
+    else:
+        bracket = default_bracket(args.regions, args.seed_from, play_ins_per_region=args.play_ins)
+
+    if args.matrix:
+        matrix = ProbabilityMatrix(args.matrix)
+        probabilities = np.asarray(matrix.weight_slice(args.SHAP_weight))
+        team_ids = matrix.team_ids
+    else:
+        index = RatingIndex.load(args.SHAP_file, args.elo_file)
+        teams = bracket['team'].drop_duplicates().tolist()
+        probabilities = build_probability_matrix(teams, index, [args.SHAP_weight])[0]
+        team_ids = {team: i for i, team in enumerate(teams)}
+
+    missing = [team for team in bracket['team'] if team not in team_ids or np.isnan(probabilities[team_ids[team]]).all()]
+    if missing:
+        raise SystemExit(f"No ratings for bracket team(s): {', '.join(missing)}")
+
+    odds, stats = run_simulation(probabilities, bracket, team_ids, args.sims, args.workers, args.seed)
+    odds.to_csv(args.output, sep='\t', index=False)
+    instrumentation.rows_written(len(odds), args.output)
+
+    print(odds.sort_values('champion', ascending=False).head(16).to_string(index=False))
+    print(f"\nSimulated {stats['simulations']:,} tournaments on {stats['workers']} worker(s) in "
+          f"{stats['seconds']:.2f}s ({stats['simulations_per_second']:,.0f} simulations/second)")
+    print(f"Results saved to {args.output}")